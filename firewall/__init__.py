@@ -1 +1,3 @@
 from .periodic_tasks import setup_periodic_tasks
+
+default_app_config = 'firewall.apps.FirewallConfig'
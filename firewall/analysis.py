@@ -0,0 +1,91 @@
+"""
+规则遮蔽与冲突分析。
+
+规则按 rule_id 顺序生效， 协议、源端口、目的端口为空表示任意。
+规则先按 (src_ip, dst_ip, rule_id) 排序， 再逐组扫描， 组内为每条已扫描的规则建立
+“通配维度 + 取值” 的索引， 每条新规则最多查 8 次就能找到覆盖它或与它重叠的更早规则，
+整体复杂度 O(n log n)。
+
+    shadowed  被更早的、动作不同的规则完全覆盖， 永远不会生效
+    redundant 被更早的、动作相同的规则完全覆盖， 可以删除
+    conflicts 与更早的、动作不同的规则部分重叠
+"""
+import itertools
+import time
+from operator import attrgetter
+
+from firewall.matcher import load_rules
+
+DIMENSIONS = ('protocol', 'src_port', 'dst_port')
+_MASKS = [mask for size in range(len(DIMENSIONS) + 1) for mask in itertools.combinations(range(len(DIMENSIONS)), size)]
+
+
+def _concrete(rule):
+    return tuple(i for i, name in enumerate(DIMENSIONS) if getattr(rule, name) is not None)
+
+
+def _values(rule, dims):
+    return tuple(getattr(rule, DIMENSIONS[i]) for i in dims)
+
+
+def _subsets(dims):
+    return [subset for size in range(len(dims) + 1) for subset in itertools.combinations(dims, size)]
+
+
+def _first_other_action(entry, action):
+    others = [rule for rule_action, rule in entry.items() if rule_action != action]
+    return min(others, key=attrgetter('rule_id')) if others else None
+
+
+def _analyze_group(rules, report):
+    # (规则的具体维度 mask, 作为 key 的维度 keyed, keyed 维度取值) -> {action: 最早的规则}
+    index = {}
+    for rule in rules:
+        concrete = set(_concrete(rule))
+
+        covering = []
+        overlapping = None
+        for mask in _MASKS:
+            keyed = tuple(i for i in mask if i in concrete)
+            entry = index.get((mask, keyed, _values(rule, keyed)))
+            if not entry:
+                continue
+            if len(keyed) == len(mask):
+                # 更早的规则在 rule 的所有具体维度上相同或为任意， 完全覆盖 rule
+                covering.extend(entry.values())
+            else:
+                other = _first_other_action(entry, rule.action)
+                if other is not None and (overlapping is None or other.rule_id < overlapping.rule_id):
+                    overlapping = other
+
+        if covering:
+            first = min(covering, key=attrgetter('rule_id'))
+            kind = 'redundant' if first.action == rule.action else 'shadowed'
+            report[kind].append({'rule_id': rule.rule_id, 'by': first.rule_id})
+        elif overlapping is not None:
+            report['conflicts'].append({'rule_id': rule.rule_id, 'with': overlapping.rule_id})
+
+        mask = tuple(sorted(concrete))
+        for keyed in _subsets(mask):
+            index.setdefault((mask, keyed, _values(rule, keyed)), {}).setdefault(rule.action, rule)
+
+
+def analyze(rules):
+    rules = sorted(rules, key=attrgetter('src_ip', 'dst_ip', 'rule_id'))
+    report = {'rule_count': len(rules), 'shadowed': [], 'redundant': [], 'conflicts': []}
+    for _, group in itertools.groupby(rules, key=attrgetter('src_ip', 'dst_ip')):
+        _analyze_group(group, report)
+    for name in ('shadowed', 'redundant', 'conflicts'):
+        report[name].sort(key=lambda item: item['rule_id'])
+    return report
+
+
+def analyze_rules(kind):
+    """
+    分析某类启用的规则， kind 为 'firewall' 或 'whitelist'
+    """
+    start = time.time()
+    report = analyze(load_rules(kind))
+    report['kind'] = kind
+    report['elapsed'] = round(time.time() - start, 3)
+    return report
@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class FirewallConfig(AppConfig):
     name = 'firewall'
+
+    def ready(self):
+        # 注册 signal receivers
+        from django.contrib.auth.models import User
+        from firewall import matcher, modbus, policies, snapshots  # noqa
+        from firewall.bundle import BUNDLE_MODELS
+        from firewall.models import BlackListStrategy, Firewall, PolicyOverride, PolicyTemplate
+        from utils.core.cache import track_model_changes
+        from utils.core.permissions import connect_role_signals
+        track_model_changes(Firewall, User, BlackListStrategy, PolicyTemplate, PolicyOverride,
+                            *(BUNDLE_MODELS + policies.POLICY_MODELS))
+        connect_role_signals()
+        from firewall.search import ensure_index_after_migrate
+        post_migrate.connect(ensure_index_after_migrate, sender=self)
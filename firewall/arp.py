@@ -0,0 +1,132 @@
+"""
+ARP 表与 IP/MAC 绑定的比对和导入。
+
+只按 ARP 表中出现的 IP 和 MAC 分批走索引查询已有绑定（ip 由 unique_together 索引覆盖，
+mac 单独建索引）， 5 万条 ARP 记录约 200 次查询， 不需要把整张绑定表读进内存。
+
+比对结果:
+    matched        已存在相同的 (ip, mac) 绑定
+    new            ip 和 mac 都未绑定， 可以直接导入
+    changed        ip 已绑定到其他 mac
+    ip_conflicts   同一个 ip 在 ARP 表中对应多个 mac
+    mac_conflicts  mac 在 ARP 表中对应多个 ip， 或已绑定到其他 ip
+"""
+import ipaddress
+import re
+
+from django.db import transaction
+
+from firewall import snapshots
+from firewall.ingest import RowError
+from firewall.models import STATUS_ENABLE, IPMacBind
+from utils.core.cache import touch_models
+
+LOOKUP_CHUNK_SIZE = 500
+IMPORT_STRATEGY_NAME = 'ARP导入'
+
+_ARP_LINE = re.compile(
+    r'(?P<ip>\d{1,3}(?:\.\d{1,3}){3}).*?(?P<mac>[0-9A-Fa-f]{2}(?:[:-][0-9A-Fa-f]{2}){5})'
+)
+_MAC = re.compile(r'^[0-9A-F]{2}(?::[0-9A-F]{2}){5}$')
+
+
+def normalize_ip(value):
+    try:
+        return str(ipaddress.ip_address(str(value).strip()))
+    except ValueError:
+        raise RowError('Enter a valid IPv4 or IPv6 address.')
+
+
+def normalize_mac(value):
+    mac = str(value).strip().upper().replace('-', ':')
+    if not _MAC.match(mac):
+        raise RowError('Enter a valid MAC address, for example "12:AD:34:EC:4D:1B".')
+    return mac
+
+
+def parse_arp_table(text):
+    """
+    解析 `arp -an`、`ip neigh`、Windows `arp -a` 等输出， 每行取第一个 IPv4 地址和 MAC
+    """
+    entries = []
+    for line in text.splitlines():
+        match = _ARP_LINE.search(line)
+        if match:
+            entries.append({'ip': match.group('ip'), 'mac': match.group('mac')})
+    return entries
+
+
+def _chunked_lookup(field, values):
+    values = list(values)
+    result = {}
+    for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        for ip, mac in IPMacBind.objects.filter(**{field + '__in': values[i:i + LOOKUP_CHUNK_SIZE]}) \
+                .values_list('ip', 'mac'):
+            key, value = (ip, mac) if field == 'ip' else (mac, ip)
+            result.setdefault(key, set()).add(value)
+    return result
+
+
+def compare(entries):
+    """
+    entries 为 [{'ip': ..., 'mac': ..., 'manufacturer': ...}]， 返回比对报告
+    """
+    errors = []
+    pairs = {}
+    for index, entry in enumerate(entries):
+        try:
+            if not isinstance(entry, dict):
+                raise RowError('Expected an object with ip and mac.')
+            ip = normalize_ip(entry.get('ip'))
+            mac = normalize_mac(entry.get('mac'))
+        except RowError as exc:
+            errors.append({'index': index, 'errors': [str(exc)]})
+            continue
+        pairs.setdefault((ip, mac), entry.get('manufacturer') or '')
+
+    seen_ip_macs = {}
+    seen_mac_ips = {}
+    for ip, mac in pairs:
+        seen_ip_macs.setdefault(ip, set()).add(mac)
+        seen_mac_ips.setdefault(mac, set()).add(ip)
+    bound_ip_macs = _chunked_lookup('ip', seen_ip_macs)
+    bound_mac_ips = _chunked_lookup('mac', seen_mac_ips)
+
+    report = {'matched': [], 'new': [], 'changed': [], 'ip_conflicts': [], 'mac_conflicts': [], 'errors': errors}
+    for (ip, mac), manufacturer in sorted(pairs.items()):
+        bound_macs = bound_ip_macs.get(ip, set())
+        bound_ips = bound_mac_ips.get(mac, set())
+        if mac in bound_macs:
+            report['matched'].append({'ip': ip, 'mac': mac})
+        elif bound_macs:
+            report['changed'].append({'ip': ip, 'mac': mac, 'bound_macs': sorted(bound_macs)})
+        elif not bound_ips and len(seen_ip_macs[ip]) == 1 and len(seen_mac_ips[mac]) == 1:
+            report['new'].append({'ip': ip, 'mac': mac, 'manufacturer': manufacturer})
+
+    for ip, macs in sorted(seen_ip_macs.items()):
+        if len(macs) > 1:
+            report['ip_conflicts'].append({'ip': ip, 'macs': sorted(macs)})
+    for mac, ips in sorted(seen_mac_ips.items()):
+        bound_ips = bound_mac_ips.get(mac, set())
+        if len(ips) > 1 or bound_ips - ips:
+            report['mac_conflicts'].append({'mac': mac, 'ips': sorted(ips), 'bound_ips': sorted(bound_ips)})
+    return report
+
+
+def import_new(report):
+    """
+    把比对结果中的 new 批量写入 IPMacBind， 返回写入数量
+    """
+    bindings = [
+        IPMacBind(strategy_name=IMPORT_STRATEGY_NAME, manufacturer=item['manufacturer'][:64],
+                  ip=item['ip'], mac=item['mac'], status=STATUS_ENABLE)
+        for item in report['new']
+    ]
+    if not bindings:
+        return 0
+    with transaction.atomic():
+        IPMacBind.objects.bulk_create(bindings, batch_size=500)
+        # bulk_create 不发送 signal， 手动生成策略版本， 设备同步增量时才能拿到新绑定
+        snapshots.record_bulk_change()
+        transaction.on_commit(lambda: touch_models(IPMacBind))
+    return len(bindings)
@@ -0,0 +1,211 @@
+"""
+热点路径基准测试， 由 `manage.py run_benchmarks` 调用。
+
+在独立的测试数据库中按固定随机种子生成数据（默认 100 万 SecEvent、10 万条规则、5000 台设备，
+--scale 按比例缩小）， 逐项计时后输出 JSON:
+
+    {"meta": {...}, "results": {"device_list": {"median_ms": ..., "p95_ms": ..., ...}, ...}}
+
+对比模式读取两次运行的 JSON， 中位耗时增加超过阈值的项记为回归。
+"""
+import base64
+import datetime
+import json
+import platform
+import random
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from firewall import matcher
+from firewall.datagen import DataGenerator
+from firewall.ingest import ingest_events
+from firewall.models import Firewall, SecEvent
+from utils.core.cache import touch_models
+
+DEFAULT_SIZES = {
+    'events': 1000000,
+    'rules': 100000,
+    'firewalls': 5000,
+}
+SEED_BATCH_SIZE = 5000
+INGEST_ROWS = 10000
+MATCH_TUPLES = 10000
+PROTOCOLS = ('TCP', 'UDP', 'ICMP', 'MODBUS', 'S7')
+
+
+def scaled_sizes(scale):
+    return {name: max(1, int(size * scale)) for name, size in DEFAULT_SIZES.items()}
+
+
+def _ip(rng, prefix):
+    return '{}.{}.{}'.format(prefix, rng.randint(0, 255), rng.randint(1, 254))
+
+
+def seed_firewalls(count, rng):
+    user = User.objects.create(username='benchmark')
+    devices = [
+        Firewall(dev_code='FW{:06d}'.format(i), dev_name='fw{}'.format(i), dev_location='room{}'.format(i % 50),
+                 ip='10.{}.{}.{}'.format(i // 65025, i // 255 % 255, i % 255 + 1), version='V1.{}'.format(i % 5),
+                 responsible_user=user, register_code='{:08d}'.format(i),
+                 status=rng.choice((Firewall.ONLINE, Firewall.OFFLINE)))
+        for i in range(count)
+    ]
+    Firewall.objects.bulk_create(devices, batch_size=SEED_BATCH_SIZE)
+
+
+def event_rows(count, rng, end=None):
+    end = end or timezone.now()
+    for i in range(count):
+        yield {
+            'src_ip': _ip(rng, '172.16'),
+            'dst_ip': _ip(rng, '192.168'),
+            'protocol': rng.choice(PROTOCOLS),
+            'occurred_time': end - datetime.timedelta(seconds=(count - i) * 2),
+            'status': rng.choice(SecEvent.STATUS_CHOICES)[0],
+            'risk_level': rng.choice(SecEvent.RISK_LEVEL_CHOICES)[0],
+            'action': rng.choice(SecEvent.READ_ACTION_CHOICES)[0],
+            'rule_id': rng.randint(1, 100000),
+        }
+
+
+def seed(sizes, seed_value):
+    rng = random.Random(seed_value)
+    generator = DataGenerator(seed=seed_value)
+    timings = {}
+    for name, func in (('firewalls', lambda count: seed_firewalls(count, rng)),
+                       ('rules', generator.rules),
+                       ('events', lambda count: generator.sec_events(count, days=count * 2 / 86400))):
+        started = time.perf_counter()
+        func(sizes[name])
+        timings[name] = round(time.perf_counter() - started, 3)
+    return timings
+
+
+def measure(func, repeat, setup=None, items=None):
+    """
+    执行 repeat 次， 返回耗时统计（毫秒）； items 为每次处理的条数时同时给出每秒条数
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    result = {
+        'repeat': repeat,
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'mean_ms': round(statistics.mean(samples), 3),
+    }
+    if items:
+        result['items'] = items
+        result['items_per_second'] = round(items / (result['median_ms'] / 1000), 1) if result['median_ms'] else None
+    return result
+
+
+def _cursor(occurred_time, pk):
+    raw = json.dumps({'v': [occurred_time.isoformat(), pk], 'r': 0}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _get(client, url, **params):
+    def request():
+        response = client.get(url, params)
+        assert response.status_code == 200, (url, response.status_code)
+    return request
+
+
+def run_cases(sizes, seed_value, repeat, only=None):
+    client = Client()
+    rng = random.Random(seed_value + 1)
+    device_id = Firewall.objects.order_by('id').values_list('id', flat=True)[sizes['firewalls'] // 2]
+    deep = SecEvent.objects.order_by('-occurred_time', '-id').values_list('occurred_time', 'id')[
+        int(sizes['events'] * 0.9)]
+    tuples = []
+
+    def invalidate_devices():
+        touch_models(Firewall)
+
+    def ingest():
+        result = ingest_events(SecEvent, [dict(row, occurred_time=row['occurred_time'].isoformat())
+                                          for row in event_rows(INGEST_ROWS, rng)])
+        assert result['created'] == INGEST_ROWS, result['failed']
+
+    def new_tuples():
+        # 匹配器会缓存查询过的五元组， 每次使用新的数据
+        tuples[:] = [(_ip(rng, '172.16'), _ip(rng, '192.168'), None, rng.choice((80, 443, 502)),
+                      rng.choice(PROTOCOLS)) for _ in range(MATCH_TUPLES)]
+
+    def compile_rules():
+        matcher.CompiledMatcher(matcher.load_rules(matcher.KIND_FIREWALL))
+
+    cases = (
+        ('device_list', dict(func=_get(client, '/api/v1/firewall/', page=3), setup=invalidate_devices)),
+        ('device_list_cached', dict(func=_get(client, '/api/v1/firewall/', page=3))),
+        ('device_retrieve', dict(func=_get(client, '/api/v1/firewall/{}/'.format(device_id)),
+                                 setup=invalidate_devices)),
+        ('event_first_page', dict(func=_get(client, '/api/v1/firewall/sec-events/'))),
+        ('event_deep_page', dict(func=_get(client, '/api/v1/firewall/sec-events/', cursor=_cursor(*deep)))),
+        ('event_filtered_page', dict(func=_get(client, '/api/v1/firewall/sec-events/', risk_level=2,
+                                               protocol='MODBUS'))),
+        ('event_page_with_count', dict(func=_get(client, '/api/v1/firewall/sec-events/', with_count='true'),
+                                       setup=cache.clear)),
+        ('event_ingest', dict(func=ingest, items=INGEST_ROWS)),
+        ('rule_compile', dict(func=compile_rules, items=sizes['rules'])),
+        ('rule_match', dict(func=lambda: matcher.match_rules(matcher.KIND_FIREWALL, tuples), setup=new_tuples,
+                            items=MATCH_TUPLES)),
+    )
+    # 预热， 编译规则缓存
+    matcher.get_matcher(matcher.KIND_FIREWALL)
+
+    results = {}
+    for name, case in cases:
+        if only and name not in only:
+            continue
+        case_repeat = max(3, repeat // 10) if case.get('items') else repeat
+        results[name] = measure(case['func'], case_repeat, case.get('setup'), case.get('items'))
+    return results
+
+
+def metadata(sizes, seed_value, seed_timings):
+    return {
+        'created': timezone.now().isoformat(),
+        'seed': seed_value,
+        'sizes': sizes,
+        'seed_seconds': seed_timings,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    返回 [{'name', 'baseline_ms', 'current_ms', 'change', 'regression'}]，
+    change 为中位耗时的相对变化， 超过 threshold 记为回归
+    """
+    rows = []
+    for name, result in sorted(current['results'].items()):
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        change = (result['median_ms'] - base['median_ms']) / base['median_ms'] if base['median_ms'] else 0.0
+        rows.append({
+            'name': name,
+            'baseline_ms': base['median_ms'],
+            'current_ms': result['median_ms'],
+            'change': round(change, 4),
+            'regression': change > threshold,
+        })
+    return rows
@@ -0,0 +1,186 @@
+"""
+工业协议策略的二进制打包。
+
+设备需要全量的 Modbus / S7 / 自定义配置 / 默认配置策略， 用 struct 定长记录代替 JSON，
+文本字段放入去重的字符串表， 记录中只保存下标。 所有整数为小端序。
+
+    header    <4sHHII    magic 'BGMP', 格式版本, 段数, 字符串表长度, 其余部分的 CRC32
+    strings   <I 字符串个数， <I*(n+1) 偏移， 之后为 UTF-8 数据
+    sections  每段 <BI 段类型和记录数， 之后为该类型的定长记录（见 SECTIONS）
+
+打包结果只由四个模型的数据决定（不含生成时间和全局的策略版本号）， 相同的数据在任何进程中
+得到相同的 sha256， 设备以 sha256 区分版本。
+结果按 sha256 存入缓存， 并按四个模型的数据版本号记录当前的 sha256， 任何一个模型变更后重新生成。
+下载地址包含内容的 sha256， 同一地址内容永不变化， 可以被客户端和代理长期缓存。
+"""
+import hashlib
+import re
+import struct
+import threading
+import zlib
+
+from django.core.cache import cache
+
+from firewall.models import IndustryProtocolCustomConfStrategy, IndustryProtocolDefaultConfStrategy, \
+    IndustryProtocolModbusStrategy, IndustryProtocolS7Strategy
+from utils.core.cache import get_generation, model_generation_name
+
+MAGIC = b'BGMP'
+FORMAT_VERSION = 3
+HEADER = struct.Struct('<4sHHII')
+SECTION_HEADER = struct.Struct('<BI')
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# 段类型: (模型, 记录格式, 字段)， 以 `$` 结尾的字段为字符串表下标， reg_value 为空时记为 -1
+SECTIONS = {
+    1: (IndustryProtocolModbusStrategy, struct.Struct('<iIBHHiiBB'),
+        ('rule_id', 'rule_name$', 'func_code', 'reg_start', 'reg_end', 'reg_value', 'length', 'action', 'logging')),
+    2: (IndustryProtocolS7Strategy, struct.Struct('<iIIIBB'),
+        ('rule_id', 'rule_name$', 'functype$', 'pdu_type$', 'action', 'status')),
+    3: (IndustryProtocolCustomConfStrategy, struct.Struct('<iIBBBB'),
+        ('id', 'strategy_name$', 'is_read_open', 'read_action', 'is_write_open', 'write_action')),
+    4: (IndustryProtocolDefaultConfStrategy, struct.Struct('<iIBB'),
+        ('id', 'strategy_name$', 'OPC_default_action', 'modbus_default_action')),
+}
+BUNDLE_MODELS = tuple(model for model, _, _ in SECTIONS.values())
+
+
+class BundleError(Exception):
+    pass
+
+
+class StringTable(object):
+
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+
+    def add(self, value):
+        value = value or ''
+        try:
+            return self.index[value]
+        except KeyError:
+            self.index[value] = len(self.strings)
+            self.strings.append(value)
+            return self.index[value]
+
+    def pack(self):
+        data = [value.encode('utf-8') for value in self.strings]
+        offsets = [0]
+        for item in data:
+            offsets.append(offsets[-1] + len(item))
+        return struct.pack('<I{}I'.format(len(offsets)), len(data), *offsets) + b''.join(data)
+
+
+def build_bundle():
+    """
+    返回打包后的 bytes
+    """
+    strings = StringTable()
+    sections = []
+    for section_type, (model, record, fields) in sorted(SECTIONS.items()):
+        names = [field.rstrip('$') for field in fields]
+        text = [field.endswith('$') for field in fields]
+        rows = model.objects.order_by('pk').values_list(*names)
+        packed = []
+        for row in rows.iterator():
+            values = [strings.add(value) if is_text else (-1 if value is None else int(value))
+                      for value, is_text in zip(row, text)]
+            packed.append(record.pack(*values))
+        sections.append(SECTION_HEADER.pack(section_type, len(packed)) + b''.join(packed))
+
+    body = strings.pack() + b''.join(sections)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), len(body) - sum(len(section) for section in sections),
+                         zlib.crc32(body))
+    return header + body
+
+
+def decode_bundle(data):
+    """
+    解析打包结果， 返回 {模型名: [记录字典, ...]}， 用于校验和调试
+    """
+    if len(data) < HEADER.size:
+        raise BundleError('Bundle is truncated.')
+    magic, fmt, section_count, strings_size, checksum = HEADER.unpack_from(data)
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        raise BundleError('Unsupported bundle format.')
+    body = memoryview(data)[HEADER.size:]
+    if zlib.crc32(body) != checksum:
+        raise BundleError('Bundle checksum mismatch.')
+
+    count = struct.unpack_from('<I', body)[0]
+    offsets = struct.unpack_from('<{}I'.format(count + 1), body, 4)
+    base = 4 + 4 * (count + 1)
+    strings = [bytes(body[base + offsets[i]:base + offsets[i + 1]]).decode('utf-8') for i in range(count)]
+
+    result = {}
+    position = strings_size
+    for _ in range(section_count):
+        section_type, records = SECTION_HEADER.unpack_from(body, position)
+        position += SECTION_HEADER.size
+        model, record, fields = SECTIONS[section_type]
+        items = []
+        for values in record.iter_unpack(body[position:position + record.size * records]):
+            item = {}
+            for field, value in zip(fields, values):
+                if field.endswith('$'):
+                    item[field[:-1]] = strings[value]
+                else:
+                    item[field] = None if field == 'reg_value' and value == -1 else value
+            items.append(item)
+        position += record.size * records
+        result[model._meta.model_name] = items
+    return result
+
+
+_local = {}
+_lock = threading.Lock()
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _data_key(digest):
+    return 'policy_bundle:data:{}'.format(digest)
+
+
+def get_bundle():
+    """
+    返回 (bytes, sha256)， 进程内和 cache 中各缓存一份
+    """
+    key = 'policy_bundle:{}'.format(':'.join(str(get_generation(model_generation_name(model)))
+                                             for model in BUNDLE_MODELS))
+    cached = _local.get(key)
+    if cached is not None:
+        return cached
+    with _lock:
+        cached = _local.get(key)
+        if cached is None:
+            digest = cache.get(key)
+            data = cache.get(_data_key(digest)) if digest else None
+            if data is None:
+                data = build_bundle()
+                digest = hashlib.sha256(data).hexdigest()
+                cache.set(_data_key(digest), data, CACHE_TIMEOUT)
+                # 其他进程已经生成时使用先写入的结果， 保证所有进程重定向到同一个地址
+                if not cache.add(key, digest, CACHE_TIMEOUT):
+                    other = cache.get(key)
+                    other_data = cache.get(_data_key(other)) if other else None
+                    if other_data is not None:
+                        data, digest = other_data, other
+                    else:
+                        cache.set(key, digest, CACHE_TIMEOUT)
+            cached = (data, digest)
+            _local.clear()
+            _local[key] = cached
+    return cached
+
+
+def get_bundle_by_digest(digest):
+    """
+    返回 sha256 为 digest 的打包结果， 不是当前版本且已不在缓存中时返回 None
+    """
+    data, current = get_bundle()
+    if digest == current:
+        return data
+    if not _DIGEST.match(digest):
+        return None
+    return cache.get(_data_key(digest))
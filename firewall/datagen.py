@@ -0,0 +1,221 @@
+"""
+批量生成模拟数据， 用于在本地复现大数据量下的性能问题。
+
+每批按列生成（random.choices 带累计权重一次取整批）， 不实例化模型， 直接用 cursor.executemany
+写入， 每 TRANSACTION_ROWS 行提交一次事务。 数据分布:
+
+    源地址       从地址池按 Zipf 分布抽取， 少数地址产生大部分事件
+    发生时间     均匀背景流量叠加随机突发， 整体按时间递增
+    MAC          大写冒号格式， 符合 MAC_VALIDATOR， 按序号生成保证 (ip, mac) 不重复
+    rule_id      从已有最大值之后连续分配
+
+数据直接写入主表， 不经过事件分区和 signal， 生成后需要的话运行 rebuild_search_index 等命令。
+
+    generator = DataGenerator(seed=1)
+    generator.sec_events(1000000, days=30)
+"""
+import datetime
+import itertools
+import random
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from firewall.models import ACTION_CHOICES, STATUS_ENABLE, BaseFirewallStrategy, IPMacBind, SecEvent, SysEvent
+
+BATCH_SIZE = 10000
+TRANSACTION_ROWS = 200000
+
+PROTOCOLS = ('TCP', 'UDP', 'ICMP', 'MODBUS', 'S7', 'DNP3', 'OPC')
+PROTOCOL_WEIGHTS = (40, 25, 5, 15, 8, 4, 3)
+MANUFACTURERS = ('Siemens', 'Schneider', 'Rockwell', 'ABB', 'Honeywell', 'Mitsubishi', 'Omron')
+SYS_EVENT_MESSAGES = (
+    '接口 eth{} 状态变化',
+    '磁盘使用率 {}%',
+    '采集任务 {} 完成',
+    '会话数 {} 超过阈值',
+)
+
+
+def zipf_cum_weights(count, exponent=1.1):
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def insert_rows(model, fields, rows):
+    """
+    用一条 INSERT 语句 executemany 写入， rows 为与 fields 对应的元组列表
+    """
+    opts = model._meta
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(opts.db_table),
+        ', '.join(quote(opts.get_field(name).column) for name in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _choices(model, name):
+    return [value for value, _ in model._meta.get_field(name).flatchoices]
+
+
+class DataGenerator(object):
+
+    def __init__(self, seed=None, batch_size=BATCH_SIZE, source_pool=5000, target_pool=500, progress=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.progress = progress
+        self.source_ips = self._ip_pool(source_pool, ('10.{}.{}', '172.16.{}', '192.168.{}'))
+        self.source_weights = zipf_cum_weights(source_pool)
+        self.target_ips = self._ip_pool(target_pool, ('192.168.{}', '10.200.{}'))
+        self.target_weights = zipf_cum_weights(target_pool, 0.8)
+        self._adapt_datetime = connection.ops.adapt_datetimefield_value
+
+    def _ip_pool(self, size, prefixes):
+        pool = set()
+        while len(pool) < size:
+            prefix = self.rng.choice(prefixes).format(*[self.rng.randint(0, 255) for _ in range(2)])
+            pool.add('{}.{}'.format(prefix, self.rng.randint(1, 254)))
+        return sorted(pool)
+
+    def _write(self, model, fields, total, make_batch):
+        written = 0
+        while written < total:
+            with transaction.atomic():
+                in_transaction = 0
+                while written < total and in_transaction < TRANSACTION_ROWS:
+                    size = min(self.batch_size, total - written)
+                    insert_rows(model, fields, make_batch(written, size))
+                    written += size
+                    in_transaction += size
+            if self.progress:
+                self.progress(model, written, total)
+        return written
+
+    def timestamps(self, count, start, end, burst_ratio=0.3, burst_count=None):
+        """
+        返回 count 个递增的时间（epoch 秒）， burst_ratio 比例的事件集中在随机的突发时段内
+        """
+        rng = self.rng
+        span = end - start
+        burst_count = burst_count or max(1, count // 5000)
+        centers = [start + rng.random() * span for _ in range(burst_count)]
+        widths = [rng.uniform(1, 120) for _ in range(burst_count)]
+        values = []
+        for _ in range(count):
+            if rng.random() < burst_ratio:
+                i = rng.randrange(burst_count)
+                value = centers[i] + rng.gauss(0, widths[i])
+                values.append(min(max(value, start), end))
+            else:
+                values.append(start + rng.random() * span)
+        values.sort()
+        return values
+
+    def _datetimes(self, timestamps):
+        utc = datetime.timezone.utc
+        adapt = self._adapt_datetime
+        return [adapt(datetime.datetime.fromtimestamp(value, utc)) for value in timestamps]
+
+    def _time_windows(self, total, days):
+        """
+        按批均分时间范围， 保证整体按时间递增
+        """
+        end = timezone.now().timestamp()
+        start = end - days * 86400
+        step = (end - start) / max(total, 1)
+
+        def window(offset, size):
+            return start + offset * step, start + (offset + size) * step
+        return window
+
+    def sec_events(self, total, days=30, max_rule_id=None):
+        rng = self.rng
+        max_rule_id = max_rule_id or BaseFirewallStrategy.objects.aggregate(value=Max('rule_id'))['value'] or 1000
+        rule_weights = zipf_cum_weights(max_rule_id, 0.9)
+        rule_ids = range(1, max_rule_id + 1)
+        statuses = _choices(SecEvent, 'status')
+        risk_levels = _choices(SecEvent, 'risk_level')
+        actions = _choices(SecEvent, 'action')
+        window = self._time_windows(total, days)
+        fields = ('src_ip', 'dst_ip', 'protocol', 'occurred_time', 'status', 'risk_level', 'action', 'rule_id')
+
+        def make_batch(offset, size):
+            return list(zip(
+                rng.choices(self.source_ips, cum_weights=self.source_weights, k=size),
+                rng.choices(self.target_ips, cum_weights=self.target_weights, k=size),
+                rng.choices(PROTOCOLS, weights=PROTOCOL_WEIGHTS, k=size),
+                self._datetimes(self.timestamps(size, *window(offset, size))),
+                rng.choices(statuses, weights=(70, 20, 10)[:len(statuses)], k=size),
+                rng.choices(risk_levels, weights=(70, 25, 5)[:len(risk_levels)], k=size),
+                rng.choices(actions, k=size),
+                rng.choices(rule_ids, cum_weights=rule_weights, k=size),
+            ))
+        return self._write(SecEvent, fields, total, make_batch)
+
+    def sys_events(self, total, days=30):
+        rng = self.rng
+        levels = _choices(SysEvent, 'level')
+        event_types = _choices(SysEvent, 'event_type')
+        statuses = _choices(SysEvent, 'status')
+        window = self._time_windows(total, days)
+        fields = ('level', 'event_type', 'content', 'occurred_time', 'status')
+
+        def make_batch(offset, size):
+            return list(zip(
+                rng.choices(levels, k=size),
+                rng.choices(event_types, k=size),
+                [message.format(rng.randint(0, 99)) for message in rng.choices(SYS_EVENT_MESSAGES, k=size)],
+                self._datetimes(self.timestamps(size, *window(offset, size), burst_ratio=0.1)),
+                rng.choices(statuses, k=size),
+            ))
+        return self._write(SysEvent, fields, total, make_batch)
+
+    def rules(self, total):
+        rng = self.rng
+        first = (BaseFirewallStrategy.objects.aggregate(value=Max('rule_id'))['value'] or 0) + 1
+        now = self._adapt_datetime(timezone.now())
+        actions = [value for value, _ in ACTION_CHOICES]
+        ports = (None, 80, 443, 502, 102, 20000, 44818)
+        fields = ('strategy_name', 'created_time', 'edit_time', 'rule_id', 'rule_name', 'src_ip', 'dst_ip',
+                  'src_port', 'dst_port', 'protocol', 'action', 'status')
+
+        def make_batch(offset, size):
+            ids = range(first + offset, first + offset + size)
+            return list(zip(
+                itertools.repeat('generated', size),
+                itertools.repeat(now, size),
+                itertools.repeat(now, size),
+                ids,
+                ['rule{}'.format(rule_id) for rule_id in ids],
+                rng.choices(self.source_ips, cum_weights=self.source_weights, k=size),
+                rng.choices(self.target_ips, cum_weights=self.target_weights, k=size),
+                [rng.randint(1024, 65535) if rng.random() < 0.2 else None for _ in range(size)],
+                rng.choices(ports, weights=(20, 20, 20, 15, 10, 10, 5), k=size),
+                rng.choices(PROTOCOLS + (None,), weights=PROTOCOL_WEIGHTS + (10,), k=size),
+                rng.choices(actions, weights=(30, 70), k=size),
+                itertools.repeat(STATUS_ENABLE, size),
+            ))
+        return self._write(BaseFirewallStrategy, fields, total, make_batch)
+
+    def ip_mac_binds(self, total):
+        rng = self.rng
+        first = (IPMacBind.objects.aggregate(value=Max('id'))['value'] or 0) + 1
+        now = self._adapt_datetime(timezone.now())
+        ouis = ['{:02X}:{:02X}:{:02X}'.format(rng.randrange(0, 256, 4), rng.randint(0, 255), rng.randint(0, 255))
+                for _ in MANUFACTURERS]
+        fields = ('strategy_name', 'created_time', 'edit_time', 'manufacturer', 'ip', 'mac', 'status')
+
+        def make_batch(offset, size):
+            rows = []
+            for serial in range(first + offset, first + offset + size):
+                vendor = rng.randrange(len(MANUFACTURERS))
+                # 序号决定 ip 和 mac 的低位， 保证不重复
+                ip = '10.{}.{}.{}'.format(serial >> 16 & 0xFF, serial >> 8 & 0xFF, serial & 0xFF)
+                mac = '{}:{:02X}:{:02X}:{:02X}'.format(ouis[vendor], serial >> 16 & 0xFF, serial >> 8 & 0xFF,
+                                                       serial & 0xFF)
+                rows.append(('generated', now, now, MANUFACTURERS[vendor], ip, mac, STATUS_ENABLE))
+            return rows
+        return self._write(IPMacBind, fields, total, make_batch)
@@ -0,0 +1,117 @@
+"""
+本地模拟防火墙设备的 HTTP 服务， 用于联调和压测下发、轮询等功能。
+
+监听 0.0.0.0 时， 127.0.0.0/8 内的任意地址都会落到同一个进程， 可以用不同的回环地址模拟大量设备，
+设备按请求连接的本地地址（而不是客户端地址）区分。
+
+    POST /api/config   接收策略（gzip JSON）， 返回 {"version": X-Config-Version}
+    GET  /api/status   返回 {"version": 设备版本号}
+
+测试中可以为单台设备指定依次返回的状态码（statuses）， MALFORMED 表示返回无法解析的响应，
+收到的策略按设备地址保存在 configs 中。
+"""
+import gzip
+import json
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+MALFORMED = 'malformed'
+
+
+class FakeDeviceHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @property
+    def device(self):
+        return self.connection.getsockname()[0]
+
+    def _simulate(self):
+        server = self.server
+        if server.latency:
+            time.sleep(random.uniform(0, server.latency))
+        with server.lock:
+            scripted = server.statuses.get(self.device)
+            code = scripted.pop(0) if scripted else None
+        if code == MALFORMED:
+            self.wfile.write(b'garbage\r\n\r\n')
+            self.close_connection = True
+            return False
+        if code is not None and code != 200:
+            self._reply(code, {'detail': 'scripted failure'})
+            return False
+        if code is None and server.failure_rate and random.random() < server.failure_rate:
+            self._reply(503, {'detail': 'simulated failure'})
+            return False
+        return True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if not self._simulate():
+            return
+        if self.path != '/api/config':
+            self._reply(404, {'detail': 'not found'})
+            return
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        config = json.loads(body.decode('utf-8'))
+        with self.server.lock:
+            self.server.received[self.device] = self.headers.get('X-Config-Version')
+            self.server.configs[self.device] = config
+        self._reply(200, {'version': self.headers.get('X-Config-Version')})
+
+    def do_GET(self):
+        if not self._simulate():
+            return
+        if self.path != '/api/status':
+            self._reply(404, {'detail': 'not found'})
+            return
+        self._reply(200, {'version': self.server.versions.get(self.device, self.server.version)})
+
+
+class FakeDeviceServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, address=('0.0.0.0', 8080), version='V1.0', latency=0, failure_rate=0, statuses=None,
+                 versions=None):
+        super(FakeDeviceServer, self).__init__(address, FakeDeviceHandler)
+        self.version = version
+        self.latency = latency
+        self.failure_rate = failure_rate
+        # {设备地址: [状态码或 MALFORMED, ...]}， 依次返回， 用完后按正常设备处理
+        self.statuses = {device: list(codes) for device, codes in (statuses or {}).items()}
+        self.versions = versions or {}
+        self.received = {}
+        self.configs = {}
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """
+        在后台线程中运行， 返回自身便于测试中使用
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,21 @@
+import django_filters
+
+from firewall.models import SecEvent, SysEvent
+
+
+class SecEventFilter(django_filters.FilterSet):
+    start = django_filters.IsoDateTimeFilter(field_name='occurred_time', lookup_expr='gte')
+    end = django_filters.IsoDateTimeFilter(field_name='occurred_time', lookup_expr='lt')
+
+    class Meta:
+        model = SecEvent
+        fields = ('src_ip', 'dst_ip', 'protocol', 'status', 'risk_level', 'action', 'rule_id', 'start', 'end')
+
+
+class SysEventFilter(django_filters.FilterSet):
+    start = django_filters.IsoDateTimeFilter(field_name='occurred_time', lookup_expr='gte')
+    end = django_filters.IsoDateTimeFilter(field_name='occurred_time', lookup_expr='lt')
+
+    class Meta:
+        model = SysEvent
+        fields = ('level', 'event_type', 'status', 'start', 'end')
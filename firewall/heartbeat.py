@@ -0,0 +1,161 @@
+"""
+设备心跳。
+
+心跳请求只在快速存储中记录设备最后一次上报时间（Redis 有序集合， 测试时可用进程内实现），
+不写数据库； 周期任务按超时时间计算在线设备， 只对状态发生变化的设备批量 UPDATE。
+
+settings.FIREWALL_HEARTBEAT_STORE:
+    'redis://localhost:6379/2'   Redis
+    'local://'                   进程内存储， 仅用于开发和测试
+"""
+import hmac
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from firewall.models import Firewall
+from utils.core.cache import touch_models
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+UPDATE_CHUNK_SIZE = 500
+
+
+class LocalHeartbeatStore(object):
+
+    def __init__(self):
+        self._seen = {}
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def touch(self, device_id, timestamp):
+        with self._lock:
+            self._seen[device_id] = timestamp
+
+    def seen_since(self, timestamp):
+        with self._lock:
+            return {device_id for device_id, seen in self._seen.items() if seen >= timestamp}
+
+    def last_seen(self, device_id):
+        return self._seen.get(device_id)
+
+    def prune(self, before):
+        with self._lock:
+            for device_id in [device_id for device_id, seen in self._seen.items() if seen < before]:
+                del self._seen[device_id]
+
+    def get_code(self, device_id):
+        return self._codes.get(device_id)
+
+    def set_codes(self, codes):
+        with self._lock:
+            self._codes = dict(codes)
+
+
+class RedisHeartbeatStore(object):
+    seen_key = 'firewall:heartbeat:seen'
+    codes_key = 'firewall:heartbeat:codes'
+
+    def __init__(self, url):
+        if redis is None:
+            raise ImproperlyConfigured('redis is required for FIREWALL_HEARTBEAT_STORE={}'.format(url))
+        self.client = redis.StrictRedis.from_url(url)
+
+    def touch(self, device_id, timestamp):
+        self.client.execute_command('ZADD', self.seen_key, timestamp, device_id)
+
+    def seen_since(self, timestamp):
+        return {int(device_id) for device_id in self.client.zrangebyscore(self.seen_key, timestamp, '+inf')}
+
+    def last_seen(self, device_id):
+        return self.client.zscore(self.seen_key, device_id)
+
+    def prune(self, before):
+        self.client.zremrangebyscore(self.seen_key, '-inf', '({}'.format(before))
+
+    def get_code(self, device_id):
+        code = self.client.hget(self.codes_key, device_id)
+        return code.decode('utf-8') if code is not None else None
+
+    def set_codes(self, codes):
+        pipe = self.client.pipeline()
+        pipe.delete(self.codes_key)
+        for device_id, code in codes.items():
+            pipe.hset(self.codes_key, device_id, code)
+        pipe.execute()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                url = getattr(settings, 'FIREWALL_HEARTBEAT_STORE', 'local://')
+                _store = LocalHeartbeatStore() if url.startswith('local://') else RedisHeartbeatStore(url)
+    return _store
+
+
+def record_heartbeat(device_id, register_code, timestamp=None):
+    """
+    校验注册码后记录心跳， 返回是否成功。 注册码优先从存储中读取， 只在未缓存时查一次数据库。
+    """
+    store = get_store()
+    expected = store.get_code(device_id)
+    if expected is None:
+        expected = Firewall.objects.filter(id=device_id).values_list('register_code', flat=True).first()
+        if expected is None:
+            return False
+    if not hmac.compare_digest(str(expected), str(register_code)):
+        return False
+    store.touch(device_id, timestamp or time.time())
+    return True
+
+
+def _update_status(ids, value):
+    for i in range(0, len(ids), UPDATE_CHUNK_SIZE):
+        Firewall.objects.filter(id__in=ids[i:i + UPDATE_CHUNK_SIZE]).update(status=value)
+
+
+def sweep(timeout=None, now=None):
+    """
+    按心跳超时时间更新设备在线状态， 未注册的设备不处理， 同时刷新存储中的注册码。
+    返回 (上线数, 离线数)
+    """
+    timeout = timeout or getattr(settings, 'FIREWALL_HEARTBEAT_TIMEOUT', 90)
+    now = now or time.time()
+    store = get_store()
+    alive = store.seen_since(now - timeout)
+
+    to_online = []
+    to_offline = []
+    codes = {}
+    for device_id, device_status, register_code in Firewall.objects.values_list('id', 'status', 'register_code'):
+        codes[device_id] = register_code
+        if device_status == Firewall.NOT_REGISTERED:
+            continue
+        if device_id in alive:
+            if device_status != Firewall.ONLINE:
+                to_online.append(device_id)
+        elif device_status == Firewall.ONLINE:
+            to_offline.append(device_id)
+
+    with transaction.atomic():
+        _update_status(to_online, Firewall.ONLINE)
+        _update_status(to_offline, Firewall.OFFLINE)
+    if to_online or to_offline:
+        # update() 不发送 signal， 手动使设备列表的响应缓存失效
+        touch_models(Firewall)
+    store.set_codes(codes)
+    # 长期没有心跳的记录没有意义， 避免有序集合无限增长
+    store.prune(now - timeout * 10)
+    return len(to_online), len(to_offline)
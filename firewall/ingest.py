@@ -0,0 +1,193 @@
+"""
+安全事件 / 系统事件批量入库。
+
+设备一次上报成千上万条事件， 逐条走 serializer 和 save() 太慢， 这里按模型字段生成轻量的
+校验函数， 校验通过的行在一个事务中 bulk_create， 校验失败的行按下标返回错误。
+"""
+import ipaddress
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from utils.core.parsers import InvalidLine
+
+INGEST_BATCH_SIZE = 500
+INGEST_MAX_ROWS = getattr(settings, 'EVENT_INGEST_MAX_ROWS', 10000)
+
+
+class RowError(Exception):
+    pass
+
+
+def _convert_ip(field, value):
+    try:
+        return str(ipaddress.ip_address(str(value)))
+    except ValueError:
+        raise RowError('Enter a valid IPv4 or IPv6 address.')
+
+
+def _convert_int(field, value):
+    if isinstance(value, bool):
+        raise RowError('A valid integer is required.')
+    # 1.7 不截断为 1
+    if isinstance(value, float) and not value.is_integer():
+        raise RowError('A valid integer is required.')
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise RowError('A valid integer is required.')
+    # 超出列范围的值会让整批 INSERT 失败， 这里按行拒绝。
+    # 使用各数据库通用的范围， SQLite 的 integer_field_range 不做限制
+    min_value, max_value = BaseDatabaseOperations.integer_field_ranges.get(field.get_internal_type(), (None, None))
+    if min_value is not None and value < min_value:
+        raise RowError('Ensure this value is greater than or equal to {}.'.format(min_value))
+    if max_value is not None and value > max_value:
+        raise RowError('Ensure this value is less than or equal to {}.'.format(max_value))
+    return value
+
+
+def _convert_char(field, value):
+    if not isinstance(value, str):
+        value = str(value)
+    if field.max_length and len(value) > field.max_length:
+        raise RowError('Ensure this field has no more than {} characters.'.format(field.max_length))
+    return value
+
+
+def _convert_datetime(field, value):
+    parsed = None
+    if isinstance(value, str):
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            # 格式正确但日期不存在， 如 2026-02-30
+            raise RowError('Datetime has wrong format.')
+    if parsed is None:
+        raise RowError('Datetime has wrong format.')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+_CONVERTERS = (
+    (models.GenericIPAddressField, _convert_ip),
+    (models.IntegerField, _convert_int),
+    (models.CharField, _convert_char),
+    (models.DateTimeField, _convert_datetime),
+)
+
+
+class RowValidator(object):
+    """
+    根据模型字段生成的行校验器， 只做类型、长度、choices 检查， 不触发任何查询。
+
+    validator = RowValidator(SecEvent)
+    values = validator(row)      # 校验失败抛出 RowError， 参数为 {field: message}
+    """
+
+    def __init__(self, model, fields=None):
+        self.model = model
+        self.fields = []
+        for field in model._meta.concrete_fields:
+            if field.auto_created or isinstance(field, models.AutoField):
+                continue
+            if fields is not None and field.name not in fields:
+                continue
+            converter = self._get_converter(field)
+            choices = frozenset(k for k, _ in field.flatchoices) if field.choices else None
+            required = not field.null and not field.has_default()
+            self.fields.append((field, field.attname, converter, choices, required))
+
+    @staticmethod
+    def _get_converter(field):
+        for field_class, converter in _CONVERTERS:
+            if isinstance(field, field_class):
+                return converter
+        raise TypeError('Unsupported field for ingest: {}'.format(field.name))
+
+    def __call__(self, row):
+        if isinstance(row, InvalidLine):
+            raise RowError({'non_field_errors': [str(row)]})
+        if not isinstance(row, dict):
+            raise RowError({'non_field_errors': ['Expected a JSON object.']})
+
+        values = {}
+        errors = {}
+        for field, attname, converter, choices, required in self.fields:
+            value = row.get(field.name)
+            if value is None or value == '':
+                if required:
+                    errors[field.name] = ['This field is required.']
+                elif field.has_default():
+                    values[attname] = field.get_default()
+                else:
+                    values[attname] = None
+                continue
+            try:
+                value = converter(field, value)
+            except RowError as exc:
+                errors[field.name] = [str(exc)]
+                continue
+            if choices is not None and value not in choices:
+                errors[field.name] = ['"{}" is not a valid choice.'.format(value)]
+                continue
+            values[attname] = value
+        if errors:
+            raise RowError(errors)
+        return values
+
+
+_validators = {}
+
+
+def get_row_validator(model):
+    try:
+        return _validators[model]
+    except KeyError:
+        validator = _validators[model] = RowValidator(model)
+        return validator
+
+
+def validate_rows(model, rows):
+    """
+    返回 (instances, errors)， errors 为 [{'index': 下标, 'errors': {...}}]，
+    NDJSON 上报时另外给出源文件中的行号 line（从 1 开始， 跳过的空行也计数）
+    """
+    validator = get_row_validator(model)
+    line_numbers = getattr(rows, 'line_numbers', None)
+    instances = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            instances.append(model(**validator(row)))
+        except RowError as exc:
+            error = {'index': index, 'errors': exc.args[0]}
+            if line_numbers is not None:
+                error['line'] = line_numbers[index]
+            errors.append(error)
+    return instances, errors
+
+
+def write_events(model, instances):
+    """
+    在一个事务中批量写入已校验的事件， 开启分区时写入对应的分区表。
+    """
+    partitions = getattr(model, 'partitions', None)
+    if partitions is not None and partitions.enabled:
+        return partitions.bulk_create(instances, batch_size=INGEST_BATCH_SIZE)
+    with transaction.atomic():
+        model.objects.bulk_create(instances, batch_size=INGEST_BATCH_SIZE)
+    return len(instances)
+
+
+def ingest_events(model, rows):
+    """
+    校验并写入一批事件， 返回结果摘要:
+    {'created': 写入条数, 'failed': 失败条数, 'errors': [{'index': 下标, 'errors': {...}}, ...]}
+    """
+    instances, errors = validate_rows(model, rows)
+    created = write_events(model, instances) if instances else 0
+    return {'created': created, 'failed': len(errors), 'errors': errors}
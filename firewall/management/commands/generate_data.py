@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from firewall.datagen import BATCH_SIZE, DataGenerator
+
+
+class Command(BaseCommand):
+    help = '批量生成模拟的安全事件、系统事件、防火墙规则和 IP/MAC 绑定'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sec-events', type=int, default=0)
+        parser.add_argument('--sys-events', type=int, default=0)
+        parser.add_argument('--rules', type=int, default=0)
+        parser.add_argument('--ip-mac', type=int, default=0)
+        parser.add_argument('--days', type=float, default=30, help='事件时间分布在最近多少天')
+        parser.add_argument('--seed', type=int, default=None, help='随机种子， 相同种子生成相同数据')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        generator = DataGenerator(seed=options['seed'], batch_size=options['batch_size'], progress=self.progress)
+        # 先生成规则， 事件的 rule_id 从已有规则中抽取
+        jobs = (
+            ('rules', lambda count: generator.rules(count)),
+            ('ip_mac', lambda count: generator.ip_mac_binds(count)),
+            ('sec_events', lambda count: generator.sec_events(count, days=options['days'])),
+            ('sys_events', lambda count: generator.sys_events(count, days=options['days'])),
+        )
+        for name, job in jobs:
+            count = options[name]
+            if not count:
+                continue
+            started = time.perf_counter()
+            job(count)
+            elapsed = time.perf_counter() - started
+            self.stdout.write('{}: {} rows in {:.1f}s ({:.0f} rows/s)'.format(
+                name, count, elapsed, count / elapsed if elapsed else 0))
+
+    def progress(self, model, written, total):
+        self.stderr.write('  {} {}/{}'.format(model.__name__, written, total))
@@ -0,0 +1,31 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from firewall.provisioning import ProvisionError, parse_devices, provision_devices
+
+
+class Command(BaseCommand):
+    help = '从 CSV 或 JSON 文件批量导入防火墙设备'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'json'), help='默认按文件扩展名判断')
+        parser.add_argument('--skip-invalid', action='store_true', help='跳过校验失败的行， 只导入其余设备')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        try:
+            with open(path, encoding='utf-8') as fp:
+                rows = parse_devices(fp.read(), fmt)
+        except (OSError, ProvisionError) as exc:
+            raise CommandError(exc)
+
+        result = provision_devices(rows, skip_invalid=options['skip_invalid'])
+        for error in result['errors']:
+            self.stderr.write('row {}: {}'.format(error['index'], json.dumps(error['errors'], ensure_ascii=False)))
+        self.stdout.write('created {created}, failed {failed}'.format(**result))
+        if result['errors'] and not options['skip_invalid']:
+            raise CommandError('Nothing imported, fix the errors above or use --skip-invalid.')
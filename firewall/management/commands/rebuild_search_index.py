@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from firewall.search import ensure_index, rebuild_index
+
+
+class Command(BaseCommand):
+    help = '重建漏洞黑名单的全文索引'
+
+    def handle(self, *args, **options):
+        if not ensure_index():
+            raise CommandError('Full-text search requires SQLite with FTS5.')
+        rebuild_index()
+        self.stdout.write('search index rebuilt')
@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from firewall import benchmarks
+
+
+class Command(BaseCommand):
+    help = '在独立的测试数据库中运行基准测试， 输出 JSON 结果， 或与之前的结果对比'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help='数据量相对默认规模的比例')
+        parser.add_argument('--seed', type=int, default=20180101)
+        parser.add_argument('--repeat', type=int, default=50, help='每项接口测试的执行次数')
+        parser.add_argument('--only', nargs='*', help='只运行指定的测试项')
+        parser.add_argument('--output', help='结果写入的文件， 默认输出到 stdout')
+        parser.add_argument('--compare', nargs='+', metavar='RESULT',
+                            help='基准结果文件； 给出两个文件时直接对比， 不运行测试')
+        parser.add_argument('--threshold', type=float, default=0.2, help='中位耗时增加超过该比例记为回归')
+
+    def handle(self, *args, **options):
+        compare = options['compare'] or []
+        if len(compare) > 2:
+            raise CommandError('--compare accepts a baseline and an optional current result.')
+        if len(compare) == 2:
+            current = self._load(compare[1])
+        else:
+            current = self.run(options)
+            self._write(current, options['output'])
+        if compare:
+            self.report(self._load(compare[0]), current, options['threshold'])
+
+    def run(self, options):
+        sizes = benchmarks.scaled_sizes(options['scale'])
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stderr.write('seeding {}'.format(sizes))
+            seed_timings = benchmarks.seed(sizes, options['seed'])
+            results = benchmarks.run_cases(sizes, options['seed'], options['repeat'], options['only'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        return {'meta': benchmarks.metadata(sizes, options['seed'], seed_timings), 'results': results}
+
+    def report(self, baseline, current, threshold):
+        rows = benchmarks.compare(baseline, current, threshold)
+        for row in rows:
+            self.stdout.write('{:<24} {:>10.3f} -> {:>10.3f} ms  {:>+7.1%}{}'.format(
+                row['name'], row['baseline_ms'], row['current_ms'], row['change'],
+                '  REGRESSION' if row['regression'] else ''))
+        regressions = [row['name'] for row in rows if row['regression']]
+        if regressions:
+            raise CommandError('Regressions: {}'.format(', '.join(regressions)))
+
+    @staticmethod
+    def _load(path):
+        with open(path) as f:
+            return json.load(f)
+
+    def _write(self, result, path):
+        text = json.dumps(result, indent=2, sort_keys=True)
+        if path:
+            with open(path, 'w') as f:
+                f.write(text + '\n')
+        else:
+            self.stdout.write(text)
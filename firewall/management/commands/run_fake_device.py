@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from firewall.fakedevice import FakeDeviceServer
+
+
+class Command(BaseCommand):
+    help = '运行本地模拟防火墙设备服务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--port', type=int, default=8080)
+        parser.add_argument('--version', dest='device_version', default='V1.0')
+        parser.add_argument('--latency', type=float, default=0, help='最大随机延迟（秒）')
+        parser.add_argument('--failure-rate', type=float, default=0, help='随机失败比例')
+
+    def handle(self, *args, **options):
+        server = FakeDeviceServer((options['host'], options['port']), options['device_version'],
+                                  options['latency'], options['failure_rate'])
+        self.stdout.write('fake device listening on {}:{}'.format(options['host'], options['port']))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
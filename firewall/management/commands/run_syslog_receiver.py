@@ -0,0 +1,46 @@
+import asyncio
+import logging
+
+from django.core.management.base import BaseCommand
+
+from firewall.syslog_receiver import SyslogReceiver, run
+
+
+class Command(BaseCommand):
+    help = '接收防火墙 syslog 并写入安全事件和系统事件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--udp-port', type=int, default=5514)
+        parser.add_argument('--tcp-port', type=int, default=5514)
+        parser.add_argument('--no-udp', action='store_true')
+        parser.add_argument('--no-tcp', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=500, help='每批最多写入条数')
+        parser.add_argument('--flush-interval', type=float, default=1.0, help='最长攒批时间（秒）')
+        parser.add_argument('--queue-size', type=int, default=10000, help='待写入队列长度')
+        parser.add_argument('--stats-interval', type=float, default=60, help='计数日志间隔（秒）')
+
+    def handle(self, *args, **options):
+        logging.getLogger('firewall.syslog_receiver').setLevel(logging.INFO)
+        receiver = SyslogReceiver(
+            host=options['host'],
+            udp_port=None if options['no_udp'] else options['udp_port'],
+            tcp_port=None if options['no_tcp'] else options['tcp_port'],
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+            queue_size=options['queue_size'],
+        )
+        self.stdout.write('syslog receiver listening on {} udp={} tcp={}'.format(
+            options['host'], receiver.udp_port, receiver.tcp_port))
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        task = loop.create_task(run(receiver, options['stats_interval']))
+        try:
+            loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            task.cancel()
+            loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+        finally:
+            self.stdout.write('syslog {}'.format(dict(receiver.counters)))
+            asyncio.set_event_loop(None)
+            loop.close()
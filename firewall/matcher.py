@@ -0,0 +1,234 @@
+"""
+编译后的规则匹配。
+
+把启用的 BaseFirewallStrategy / WhiteListStrategy 规则按
+(src_ip, dst_ip, protocol, dst_port) 建立哈希索引， 协议和端口为空表示任意，
+一个五元组最多查 4 个桶， 每个桶内按 rule_id 排序， 取 rule_id 最小的命中规则。
+
+规则保存/删除的事务提交后本进程增量更新索引， 其他进程通过缓存中的版本号发现变化后整体重建。
+
+    rule = match_rule('firewall', '10.0.0.1', '10.0.0.2', 1024, 502, 'tcp')
+    rules = match_rules('firewall', [(src_ip, dst_ip, src_port, dst_port, protocol), ...])
+"""
+import ipaddress
+import threading
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from firewall.models import ACTION_PERMIT, STATUS_ENABLE, BaseFirewallStrategy, WhiteListStrategy
+from utils.core.cache import bump_generation, get_generation
+
+KIND_FIREWALL = 'firewall'
+KIND_WHITELIST = 'whitelist'
+RULE_MODELS = {
+    KIND_FIREWALL: BaseFirewallStrategy,
+    KIND_WHITELIST: WhiteListStrategy,
+}
+MEMO_SIZE = 100000
+
+Rule = namedtuple('Rule', ('rule_id', 'pk', 'src_ip', 'dst_ip', 'src_port', 'dst_port', 'protocol', 'action'))
+
+
+def normalize_ip(value):
+    return str(ipaddress.ip_address(str(value)))
+
+
+def normalize_protocol(value):
+    if value is None or value == '':
+        return None
+    return str(value).strip().lower() or None
+
+
+def normalize_port(value):
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def rule_from_values(kind, values):
+    """
+    values 为 strategy 的 values() 字典， 白名单没有 action， 按允许处理
+    """
+    return Rule(
+        rule_id=values['rule_id'],
+        pk=values['id'],
+        src_ip=normalize_ip(values['src_ip']),
+        dst_ip=normalize_ip(values['dst_ip']),
+        src_port=normalize_port(values['src_port']),
+        dst_port=normalize_port(values['dst_port']),
+        protocol=normalize_protocol(values['protocol']),
+        action=values.get('action', ACTION_PERMIT),
+    )
+
+
+def load_rules(kind):
+    """
+    读取某类启用的规则， 返回 Rule 列表
+    """
+    model = RULE_MODELS[kind]
+    fields = ['id', 'rule_id', 'src_ip', 'dst_ip', 'src_port', 'dst_port', 'protocol']
+    if kind == KIND_FIREWALL:
+        fields.append('action')
+    values = model.objects.filter(status=STATUS_ENABLE).values(*fields).iterator()
+    return [rule_from_values(kind, row) for row in values]
+
+
+class CompiledMatcher(object):
+
+    def __init__(self, rules=(), generation=None):
+        self.generation = generation
+        self._rules = {}
+        self._index = {}
+        self._memo = {}
+        for rule in rules:
+            self._add(rule)
+        for bucket in self._index.values():
+            bucket.sort()
+
+    def __len__(self):
+        return len(self._rules)
+
+    @staticmethod
+    def _key(rule):
+        return rule.src_ip, rule.dst_ip, rule.protocol, rule.dst_port
+
+    def _add(self, rule):
+        self._rules[rule.pk] = rule
+        self._index.setdefault(self._key(rule), []).append(rule)
+
+    def add(self, rule):
+        self.remove(rule.pk)
+        self._add(rule)
+        self._index[self._key(rule)].sort()
+        self._memo.clear()
+
+    def remove(self, pk):
+        rule = self._rules.pop(pk, None)
+        if rule is None:
+            return
+        key = self._key(rule)
+        bucket = self._index[key]
+        bucket.remove(rule)
+        if not bucket:
+            del self._index[key]
+        self._memo.clear()
+
+    def match(self, src_ip, dst_ip, src_port=None, dst_port=None, protocol=None):
+        """
+        参数需已规范化（见 normalize_*）， 返回命中的 Rule， 没有命中返回 None
+        """
+        best = None
+        index = self._index
+        for key in ((src_ip, dst_ip, protocol, dst_port), (src_ip, dst_ip, None, dst_port),
+                    (src_ip, dst_ip, protocol, None), (src_ip, dst_ip, None, None)):
+            bucket = index.get(key)
+            if not bucket:
+                continue
+            for rule in bucket:
+                if best is not None and rule.rule_id >= best.rule_id:
+                    break
+                if rule.src_port is None or rule.src_port == src_port:
+                    best = rule
+                    break
+        return best
+
+    def match_many(self, tuples):
+        """
+        批量匹配， tuples 为 (src_ip, dst_ip, src_port, dst_port, protocol) 的可迭代对象，
+        返回的生成器与输入一一对应。 重复出现的五元组直接取缓存结果。
+        """
+        memo = self._memo
+        match = self.match
+        for item in tuples:
+            try:
+                yield memo[item]
+            except KeyError:
+                src_ip, dst_ip, src_port, dst_port, protocol = item
+                result = match(normalize_ip(src_ip), normalize_ip(dst_ip), normalize_port(src_port),
+                               normalize_port(dst_port), normalize_protocol(protocol))
+                if len(memo) >= MEMO_SIZE:
+                    memo.clear()
+                memo[item] = result
+                yield result
+
+
+_matchers = {}
+_lock = threading.Lock()
+
+
+def _generation_name(kind):
+    return 'rule_matcher:{}'.format(kind)
+
+
+def get_matcher(kind):
+    """
+    返回某类规则的编译结果， 其他进程修改过规则时重新编译
+    """
+    generation = get_generation(_generation_name(kind))
+    matcher = _matchers.get(kind)
+    if matcher is not None and matcher.generation == generation:
+        return matcher
+    with _lock:
+        matcher = _matchers.get(kind)
+        if matcher is None or matcher.generation != generation:
+            matcher = _matchers[kind] = CompiledMatcher(load_rules(kind), generation)
+    return matcher
+
+
+def match_rule(kind, src_ip, dst_ip, src_port=None, dst_port=None, protocol=None):
+    return get_matcher(kind).match(normalize_ip(src_ip), normalize_ip(dst_ip), normalize_port(src_port),
+                                   normalize_port(dst_port), normalize_protocol(protocol))
+
+
+def match_rules(kind, tuples):
+    return list(get_matcher(kind).match_many(tuples))
+
+
+def _kind_of(sender):
+    for kind, model in RULE_MODELS.items():
+        if model is sender:
+            return kind
+
+
+def _rule_from_instance(kind, instance):
+    values = {field: getattr(instance, field) for field in
+              ('id', 'rule_id', 'src_ip', 'dst_ip', 'src_port', 'dst_port', 'protocol')}
+    if kind == KIND_FIREWALL:
+        values['action'] = instance.action
+    return rule_from_values(kind, values)
+
+
+def _apply_change(kind, pk, rule=None):
+    generation = bump_generation(_generation_name(kind))
+    matcher = _matchers.get(kind)
+    if matcher is None:
+        return
+    if matcher.generation != generation - 1:
+        # 期间有其他进程的修改， 下次使用时整体重建
+        return
+    with _lock:
+        matcher.remove(pk)
+        if rule is not None:
+            matcher.add(rule)
+        matcher.generation = generation
+
+
+# 事务提交后才递增版本号， 否则其他进程可能在提交前按新版本号读到旧数据并一直使用。
+# 规则在 signal 中取值， 提交前对 instance 的修改不影响结果。
+
+@receiver(post_save, sender=BaseFirewallStrategy)
+@receiver(post_save, sender=WhiteListStrategy)
+def rule_saved(sender, instance, **kwargs):
+    kind, pk = _kind_of(sender), instance.pk
+    rule = _rule_from_instance(kind, instance) if instance.status == STATUS_ENABLE else None
+    transaction.on_commit(lambda: _apply_change(kind, pk, rule))
+
+
+@receiver(post_delete, sender=BaseFirewallStrategy)
+@receiver(post_delete, sender=WhiteListStrategy)
+def rule_deleted(sender, instance, **kwargs):
+    kind, pk = _kind_of(sender), instance.pk
+    transaction.on_commit(lambda: _apply_change(kind, pk))
@@ -0,0 +1,235 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:17
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BaseFirewallStrategy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('strategy_name', models.CharField(max_length=32)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('edit_time', models.DateTimeField(auto_now=True)),
+                ('rule_id', models.IntegerField(unique=True, verbose_name='规则ID')),
+                ('rule_name', models.CharField(max_length=64, verbose_name='规则名称')),
+                ('src_ip', models.GenericIPAddressField(verbose_name='源ip')),
+                ('dst_ip', models.GenericIPAddressField(verbose_name='目的ip')),
+                ('src_port', models.IntegerField(null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(65535)], verbose_name='源端口')),
+                ('dst_port', models.IntegerField(null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(65535)], verbose_name='目的端口')),
+                ('protocol', models.CharField(blank=True, max_length=32, null=True, verbose_name='协议')),
+                ('action', models.IntegerField(choices=[(0, '拒绝'), (1, '允许')], verbose_name='动作')),
+                ('status', models.IntegerField(choices=[(0, '关闭'), (1, '开启')], verbose_name='状态')),
+            ],
+            options={
+                'ordering': ('-created_time',),
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BlackListStrategy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('strategy_name', models.CharField(max_length=32)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('edit_time', models.DateTimeField(auto_now=True)),
+                ('vulnerability_name', models.CharField(max_length=1000, verbose_name='漏洞名称')),
+                ('publish_time', models.DateTimeField(verbose_name='发布时间')),
+                ('level', models.IntegerField(verbose_name='风险等级')),
+                ('event_process', models.IntegerField(choices=[(1, '通过'), (2, '告警'), (3, '丢弃'), (4, '阻断')], verbose_name='事件处理')),
+                ('content', models.CharField(max_length=10000, verbose_name='内容')),
+                ('status', models.IntegerField(choices=[(0, '关闭'), (1, '开启')], verbose_name='启用状态')),
+            ],
+            options={
+                'ordering': ('-created_time',),
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ConfStrategy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('strategy_name', models.CharField(max_length=32)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('edit_time', models.DateTimeField(auto_now=True)),
+                ('run_mode', models.IntegerField(choices=[(0, '测试模式'), (1, '离线')], verbose_name='运行模式')),
+                ('default_filter', models.IntegerField(choices=[(0, '开启'), (1, '关闭')], verbose_name='默认禁止')),
+                ('DPI', models.IntegerField(choices=[(0, '开启'), (1, '关闭')], verbose_name='深度检测')),
+            ],
+            options={
+                'ordering': ('-created_time',),
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='IndustryProtocolStrategy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('strategy_name', models.CharField(max_length=32)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('edit_time', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ('-created_time',),
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SecEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('src_ip', models.GenericIPAddressField(verbose_name='源地址')),
+                ('dst_ip', models.GenericIPAddressField(verbose_name='目的地址')),
+                ('protocol', models.CharField(blank=True, max_length=32, null=True, verbose_name='协议')),
+                ('occurred_time', models.DateTimeField(auto_now_add=True, verbose_name='时间')),
+                ('status', models.IntegerField(choices=[(1, '告警'), (2, '丢弃'), (3, '阻断')], verbose_name='事件登记')),
+                ('risk_level', models.IntegerField(choices=[(0, '低'), (1, '中'), (2, '高')], verbose_name='风险登记')),
+                ('action', models.IntegerField(choices=[(0, '未读'), (1, '已读')], verbose_name='状态')),
+                ('rule_id', models.IntegerField(verbose_name='规则ID')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SysEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.IntegerField(choices=[(0, '信息'), (1, '告警'), (3, '信息和告警')], verbose_name='事件等级')),
+                ('event_type', models.IntegerField(choices=[(0, '设备状态'), (1, '接口状态'), (10, '数据采集'), (11, '磁盘清理'), (12, '白名单'), (13, '黑名单'), (14, 'IP MAC'), (15, '无流量监测'), (20, '自定义白名单'), (21, '连接管理'), (22, '工业协议')], verbose_name='事件类型')),
+                ('content', models.CharField(max_length=10000, verbose_name='内容')),
+                ('occurred_time', models.DateTimeField(verbose_name='时间')),
+                ('status', models.IntegerField(choices=[(0, '关闭'), (1, '开启')], verbose_name='事件状态')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WhiteListStrategy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('strategy_name', models.CharField(max_length=32)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('edit_time', models.DateTimeField(auto_now=True)),
+                ('rule_id', models.IntegerField(unique=True, verbose_name='规则ID')),
+                ('rule_name', models.CharField(max_length=64, verbose_name='规则名称')),
+                ('src_ip', models.GenericIPAddressField(verbose_name='源ip')),
+                ('dst_ip', models.GenericIPAddressField(verbose_name='目的ip')),
+                ('src_port', models.IntegerField(null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(65535)], verbose_name='源端口')),
+                ('dst_port', models.IntegerField(null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(65535)], verbose_name='目的端口')),
+                ('protocol', models.CharField(blank=True, max_length=32, null=True, verbose_name='协议')),
+                ('status', models.IntegerField(choices=[(0, '关闭'), (1, '开启')], verbose_name='状态')),
+                ('logging', models.IntegerField(choices=[(0, '关闭'), (1, '开启')], verbose_name='记录日志')),
+            ],
+            options={
+                'ordering': ('-created_time',),
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='IndustryProtocolCustomConfStrategy',
+            fields=[
+                ('industryprotocolstrategy_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='firewall.industryprotocolstrategy')),
+                ('is_read_open', models.BooleanField(default=False, verbose_name='写入开关')),
+                ('read_action', models.IntegerField(choices=[(1, '通过'), (2, '告警'), (3, '丢弃'), (4, '阻断')], verbose_name='写入事件处理')),
+                ('is_write_open', models.BooleanField(default=False, verbose_name='读取开关')),
+                ('write_action', models.IntegerField(choices=[(1, '通过'), (2, '告警'), (3, '丢弃'), (4, '阻断')], verbose_name='读取事件处理')),
+            ],
+            options={
+                'ordering': ('-created_time',),
+                'abstract': False,
+            },
+            bases=('firewall.industryprotocolstrategy',),
+        ),
+        migrations.CreateModel(
+            name='IndustryProtocolDefaultConfStrategy',
+            fields=[
+                ('industryprotocolstrategy_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='firewall.industryprotocolstrategy')),
+                ('OPC_default_action', models.IntegerField(choices=[(0, '关闭'), (1, '开启')], verbose_name='OPC-DA默认动作')),
+                ('modbus_default_action', models.IntegerField(choices=[(0, '关闭'), (1, '开启')], verbose_name='modbus默认动作')),
+            ],
+            options={
+                'ordering': ('-created_time',),
+                'abstract': False,
+            },
+            bases=('firewall.industryprotocolstrategy',),
+        ),
+        migrations.CreateModel(
+            name='IndustryProtocolModbusStrategy',
+            fields=[
+                ('industryprotocolstrategy_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='firewall.industryprotocolstrategy')),
+                ('rule_id', models.IntegerField(unique=True, verbose_name='规则ID')),
+                ('rule_name', models.CharField(max_length=64, verbose_name='规则名称')),
+                ('func_code', models.CharField(max_length=64, verbose_name='功能码')),
+                ('reg_start', models.CharField(max_length=64, verbose_name='开始地址')),
+                ('reg_end', models.CharField(max_length=64, verbose_name='结束地址')),
+                ('reg_value', models.CharField(max_length=64, verbose_name='寄存器值')),
+                ('length', models.IntegerField(verbose_name='长度')),
+                ('action', models.IntegerField(choices=[(0, '拒绝'), (1, '允许')], verbose_name='动作')),
+                ('logging', models.IntegerField(choices=[(0, '关闭'), (1, '开启')], verbose_name='记录日志')),
+            ],
+            options={
+                'ordering': ('-created_time',),
+                'abstract': False,
+            },
+            bases=('firewall.industryprotocolstrategy',),
+        ),
+        migrations.CreateModel(
+            name='IndustryProtocolS7Strategy',
+            fields=[
+                ('industryprotocolstrategy_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='firewall.industryprotocolstrategy')),
+                ('rule_id', models.IntegerField(unique=True, verbose_name='规则ID')),
+                ('rule_name', models.CharField(max_length=64, verbose_name='规则名称')),
+                ('functype', models.CharField(max_length=64, verbose_name='Function type')),
+                ('pdu_type', models.CharField(max_length=64, verbose_name='pdu type')),
+                ('action', models.IntegerField(choices=[(0, '拒绝'), (1, '允许')], verbose_name='动作')),
+                ('status', models.IntegerField(choices=[(0, '关闭'), (1, '开启')], verbose_name='状态')),
+            ],
+            options={
+                'ordering': ('-created_time',),
+                'abstract': False,
+            },
+            bases=('firewall.industryprotocolstrategy',),
+        ),
+        migrations.CreateModel(
+            name='IPMacBind',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('strategy_name', models.CharField(max_length=32)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('edit_time', models.DateTimeField(auto_now=True)),
+                ('manufacturer', models.CharField(max_length=64, verbose_name='设备厂商')),
+                ('ip', models.GenericIPAddressField(verbose_name='ip')),
+                ('mac', models.CharField(max_length=32, validators=[django.core.validators.RegexValidator(message='Enter a valid MAC address, for example "12:AD:34:EC:4D:1B".', regex='^([0-9A-F]{2}:){5}[0-9A-F]{2}$')], verbose_name='mac')),
+                ('status', models.IntegerField(choices=[(0, '关闭'), (1, '开启')], verbose_name='启用状态')),
+            ],
+            options={
+                'ordering': ('-created_time',),
+                'unique_together': {('ip', 'mac')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Firewall',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dev_code', models.CharField(max_length=32, verbose_name='设备编号')),
+                ('dev_name', models.CharField(max_length=20, verbose_name='设备名')),
+                ('dev_location', models.CharField(max_length=20, verbose_name='设备位置')),
+                ('ip', models.GenericIPAddressField(null=True, unique=True, verbose_name='ip')),
+                ('version', models.CharField(max_length=20, null=True, verbose_name='版本号')),
+                ('register_code', models.CharField(max_length=20, verbose_name='注册码')),
+                ('status', models.IntegerField(choices=[(1, '在线'), (2, '离线'), (3, '未注册')], default=3, verbose_name='状态')),
+                ('registered_time', models.DateTimeField(null=True, verbose_name='注册时间')),
+                ('responsible_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='责任人')),
+            ],
+            options={
+                'verbose_name': '防火墙设备',
+            },
+        ),
+    ]
@@ -0,0 +1,155 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:17
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('firewall', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolicyOverride',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='策略ID')),
+                ('operation', models.CharField(choices=[('include', '加入'), ('exclude', '排除'), ('modify', '修改')], max_length=8, verbose_name='操作')),
+                ('data', models.TextField(blank=True, default='', verbose_name='修改内容')),
+                ('created_time', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('edit_time', models.DateTimeField(auto_now=True, verbose_name='修改时间')),
+            ],
+            options={
+                'verbose_name': '策略调整',
+            },
+        ),
+        migrations.CreateModel(
+            name='PolicyTemplate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='名称')),
+                ('description', models.CharField(blank=True, default='', max_length=256, verbose_name='描述')),
+                ('created_time', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('edit_time', models.DateTimeField(auto_now=True, verbose_name='修改时间')),
+            ],
+            options={
+                'verbose_name': '策略模板',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True, verbose_name='名称')),
+                ('position', models.BigIntegerField(default=0, verbose_name='位置')),
+                ('updated_time', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SecEventRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('minute', '分钟'), ('hour', '小时'), ('day', '天')], max_length=8, verbose_name='粒度')),
+                ('bucket', models.DateTimeField(verbose_name='时间段')),
+                ('risk_level', models.IntegerField(choices=[(0, '低'), (1, '中'), (2, '高')], verbose_name='风险登记')),
+                ('status', models.IntegerField(choices=[(1, '告警'), (2, '丢弃'), (3, '阻断')], verbose_name='事件登记')),
+                ('rule_id', models.IntegerField(verbose_name='规则ID')),
+                ('protocol', models.CharField(blank=True, default='', max_length=32, verbose_name='协议')),
+                ('count', models.IntegerField(default=0, verbose_name='数量')),
+            ],
+            options={
+                'verbose_name': '安全事件统计',
+            },
+        ),
+        migrations.CreateModel(
+            name='StrategyTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=64, verbose_name='模型')),
+                ('object_id', models.IntegerField(verbose_name='对象ID')),
+                ('version', models.IntegerField(db_index=True, verbose_name='版本')),
+                ('deleted_time', models.DateTimeField(auto_now_add=True, verbose_name='删除时间')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StrategyVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_time', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='firewall',
+            name='config_version',
+            field=models.IntegerField(default=0, verbose_name='配置版本'),
+        ),
+        migrations.AlterField(
+            model_name='ipmacbind',
+            name='mac',
+            field=models.CharField(db_index=True, max_length=32, validators=[django.core.validators.RegexValidator(message='Enter a valid MAC address, for example "12:AD:34:EC:4D:1B".', regex='^([0-9A-F]{2}:){5}[0-9A-F]{2}$')], verbose_name='mac'),
+        ),
+        migrations.AlterField(
+            model_name='secevent',
+            name='occurred_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='时间'),
+        ),
+        migrations.AlterField(
+            model_name='sysevent',
+            name='occurred_time',
+            field=models.DateTimeField(db_index=True, verbose_name='时间'),
+        ),
+        migrations.AddIndex(
+            model_name='secevent',
+            index=models.Index(fields=['occurred_time', 'risk_level'], name='firewall_se_occurre_ca9b0b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='secevent',
+            index=models.Index(fields=['occurred_time', 'rule_id'], name='firewall_se_occurre_0c268b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='seceventrollup',
+            index=models.Index(fields=['granularity', 'bucket'], name='firewall_se_granula_dc9a5a_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='seceventrollup',
+            unique_together={('granularity', 'bucket', 'risk_level', 'status', 'rule_id', 'protocol')},
+        ),
+        migrations.AddField(
+            model_name='policytemplate',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='firewall.policytemplate', verbose_name='上级模板'),
+        ),
+        migrations.AddField(
+            model_name='policyoverride',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='策略类型'),
+        ),
+        migrations.AddField(
+            model_name='policyoverride',
+            name='firewall',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='policy_overrides', to='firewall.firewall', verbose_name='设备'),
+        ),
+        migrations.AddField(
+            model_name='policyoverride',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='overrides', to='firewall.policytemplate', verbose_name='模板'),
+        ),
+        migrations.AddField(
+            model_name='firewall',
+            name='policy_template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='firewalls', to='firewall.policytemplate', verbose_name='策略模板'),
+        ),
+        migrations.AddIndex(
+            model_name='policyoverride',
+            index=models.Index(fields=['content_type', 'object_id'], name='firewall_po_content_a89cb2_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='policyoverride',
+            unique_together={('template', 'content_type', 'object_id'), ('firewall', 'content_type', 'object_id')},
+        ),
+    ]
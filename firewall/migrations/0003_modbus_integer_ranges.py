@@ -0,0 +1,76 @@
+import django.core.validators
+from django.db import migrations, models
+
+MODBUS_REGISTER_MAX = 65535
+
+
+def _parse(rule, name, value, maximum):
+    """
+    旧数据以字符串保存， 支持十进制和 0x 开头的十六进制， 无法转换时中止迁移， 需要先手工修正
+    """
+    text = value.strip().lower()
+    try:
+        number = int(text[2:], 16) if text.startswith('0x') else int(text)
+    except ValueError:
+        number = None
+    if number is None or not 0 <= number <= maximum:
+        raise ValueError('Modbus rule {} has an invalid {}: {!r}'.format(rule.rule_id, name, value))
+    return str(number)
+
+
+def convert_modbus_values(apps, schema_editor):
+    model = apps.get_model('firewall', 'IndustryProtocolModbusStrategy')
+    for rule in model.objects.all():
+        rule.func_code = _parse(rule, 'func_code', rule.func_code, 127)
+        rule.reg_start = _parse(rule, 'reg_start', rule.reg_start, MODBUS_REGISTER_MAX)
+        rule.reg_end = _parse(rule, 'reg_end', rule.reg_end, MODBUS_REGISTER_MAX)
+        # 空值表示匹配任意值
+        value = (rule.reg_value or '').strip()
+        rule.reg_value = _parse(rule, 'reg_value', value, MODBUS_REGISTER_MAX) if value else None
+        if int(rule.reg_start) > int(rule.reg_end):
+            raise ValueError('Modbus rule {} has reg_start greater than reg_end.'.format(rule.rule_id))
+        rule.save(update_fields=['func_code', 'reg_start', 'reg_end', 'reg_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('firewall', '0002_policies_versions_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='industryprotocolmodbusstrategy',
+            name='reg_value',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='寄存器值'),
+        ),
+        migrations.RunPython(convert_modbus_values, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='industryprotocolmodbusstrategy',
+            name='func_code',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(127)], verbose_name='功能码'),
+        ),
+        migrations.AlterField(
+            model_name='industryprotocolmodbusstrategy',
+            name='reg_end',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MaxValueValidator(65535)], verbose_name='结束地址'),
+        ),
+        migrations.AlterField(
+            model_name='industryprotocolmodbusstrategy',
+            name='reg_start',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MaxValueValidator(65535)], verbose_name='开始地址'),
+        ),
+        migrations.AlterField(
+            model_name='industryprotocolmodbusstrategy',
+            name='reg_value',
+            field=models.PositiveIntegerField(blank=True, null=True, validators=[django.core.validators.MaxValueValidator(65535)], verbose_name='寄存器值'),
+        ),
+        migrations.AddIndex(
+            model_name='industryprotocolmodbusstrategy',
+            index=models.Index(fields=['func_code', 'reg_start', 'reg_end'], name='firewall_in_func_co_562f69_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='industryprotocolmodbusstrategy',
+            constraint=models.CheckConstraint(check=models.Q(reg_start__lte=models.F('reg_end')), name='modbus_reg_range'),
+        ),
+    ]
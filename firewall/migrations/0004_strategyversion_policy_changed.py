@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('firewall', '0003_modbus_integer_ranges'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strategyversion',
+            name='policy_changed',
+            field=models.BooleanField(default=False, verbose_name='模板或调整变更'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('firewall', '0004_strategyversion_policy_changed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartitionSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True, verbose_name='名称')),
+                ('next_id', models.BigIntegerField(verbose_name='下一个 id')),
+            ],
+        ),
+    ]
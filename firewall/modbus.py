@@ -0,0 +1,151 @@
+"""
+Modbus 规则批量评估。
+
+每个功能码建一个区间索引: 把所有规则的寄存器范围端点排序， 切分成互不重叠的基本区间，
+每个基本区间预先算好命中结果——优先级最高（rule_id 最小）的不限值规则， 以及优先级比它更高、
+限定了寄存器值的规则（值 -> 规则）。 查询时二分定位基本区间， 再查一次字典， 与规则数无关。
+重复出现的请求直接取缓存结果， 回放抓包流量时大部分请求都会命中缓存。
+
+    evaluator = get_evaluator()
+    evaluator.evaluate(3, 40001, 12)                  # ModbusRule 或 None
+    evaluator.evaluate_many([(3, 40001, 12), ...])
+"""
+import bisect
+import threading
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from firewall.models import IndustryProtocolModbusStrategy
+from utils.core.cache import bump_generation, get_generation
+
+MEMO_SIZE = 1000000
+GENERATION_NAME = 'modbus_rules'
+
+ModbusRule = namedtuple('ModbusRule', 'rule_id func_code reg_start reg_end reg_value action')
+
+
+def load_rules():
+    fields = ('rule_id', 'func_code', 'reg_start', 'reg_end', 'reg_value', 'action')
+    return [ModbusRule(*row) for row in IndustryProtocolModbusStrategy.objects.values_list(*fields).iterator()]
+
+
+class _Segment(object):
+    __slots__ = ('wildcard', 'values')
+
+    def __init__(self):
+        self.wildcard = None
+        self.values = {}
+
+    def match(self, value):
+        rule = self.values.get(value)
+        return rule if rule is not None else self.wildcard
+
+
+class IntervalIndex(object):
+    """
+    同一功能码下的规则， 寄存器范围为闭区间 [reg_start, reg_end]
+    """
+
+    def __init__(self, rules):
+        rules = sorted(rules, key=lambda rule: rule.rule_id)
+        bounds = sorted({rule.reg_start for rule in rules} | {rule.reg_end + 1 for rule in rules})
+        self.bounds = bounds
+        self.segments = [_Segment() for _ in bounds]
+        # next_open[i] 指向 i 之后第一个还没有不限值规则的基本区间， 已确定的区间不再访问
+        next_open = list(range(len(bounds) + 1))
+
+        def find(i):
+            root = i
+            while next_open[root] != root:
+                root = next_open[root]
+            while next_open[i] != root:
+                next_open[i], i = root, next_open[i]
+            return root
+
+        for rule in rules:
+            first = bisect.bisect_left(bounds, rule.reg_start)
+            last = bisect.bisect_left(bounds, rule.reg_end + 1)
+            i = find(first)
+            while i < last:
+                segment = self.segments[i]
+                if rule.reg_value is None:
+                    segment.wildcard = rule
+                    next_open[i] = i + 1
+                else:
+                    segment.values.setdefault(rule.reg_value, rule)
+                i = find(i + 1)
+
+    def match(self, address, value):
+        i = bisect.bisect_right(self.bounds, address) - 1
+        if i < 0:
+            return None
+        return self.segments[i].match(value)
+
+
+class ModbusEvaluator(object):
+
+    def __init__(self, rules=(), generation=None):
+        self.generation = generation
+        by_code = {}
+        for rule in rules:
+            by_code.setdefault(rule.func_code, []).append(rule)
+        self.indexes = {func_code: IntervalIndex(items) for func_code, items in by_code.items()}
+        self._memo = {}
+
+    def evaluate(self, func_code, address, value=None):
+        """
+        返回命中的 ModbusRule， 没有命中返回 None
+        """
+        index = self.indexes.get(func_code)
+        if index is None:
+            return None
+        return index.match(address, value)
+
+    def evaluate_many(self, requests):
+        """
+        requests 为 (func_code, address, value) 的可迭代对象， 返回的生成器与输入一一对应
+        """
+        memo = self._memo
+        evaluate = self.evaluate
+        for item in requests:
+            try:
+                yield memo[item]
+            except KeyError:
+                result = evaluate(*item)
+                if len(memo) >= MEMO_SIZE:
+                    memo.clear()
+                memo[item] = result
+                yield result
+
+
+_evaluator = None
+_lock = threading.Lock()
+
+
+def get_evaluator():
+    """
+    返回当前规则的评估器， 规则变更（本进程或其他进程）后重新构建
+    """
+    global _evaluator
+    generation = get_generation(GENERATION_NAME)
+    evaluator = _evaluator
+    if evaluator is not None and evaluator.generation == generation:
+        return evaluator
+    with _lock:
+        if _evaluator is None or _evaluator.generation != generation:
+            _evaluator = ModbusEvaluator(load_rules(), generation)
+        return _evaluator
+
+
+def evaluate_requests(requests):
+    return list(get_evaluator().evaluate_many(requests))
+
+
+@receiver(post_save, sender=IndustryProtocolModbusStrategy)
+@receiver(post_delete, sender=IndustryProtocolModbusStrategy)
+def modbus_rule_changed(sender, using=None, **kwargs):
+    # 提交后再递增， 以免其他进程按新版本号缓存提交前的规则
+    transaction.on_commit(lambda: bump_generation(GENERATION_NAME), using=using)
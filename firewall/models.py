@@ -1,6 +1,12 @@
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.utils import timezone
+
+from firewall.partitions import TimePartitions
 from utils.helper import random_string
 
 # Create your models here.
@@ -21,6 +27,8 @@ STATUS_CHOICES = (
     (STATUS_ENABLE, '开启'),
 )
 
+MODBUS_REGISTER_MAX = 65535
+
 LOGGING_OFF = 0
 LOGGING_ON = 1
 LOGGING_CHOICES = (
@@ -49,6 +57,9 @@ class Firewall(models.Model):
     register_code = models.CharField('注册码', max_length=20)
     status = models.IntegerField('状态', choices=STATUS_CHOICES, default=NOT_REGISTERED)
     registered_time = models.DateTimeField('注册时间', null=True)
+    config_version = models.IntegerField('配置版本', default=0)
+    policy_template = models.ForeignKey('PolicyTemplate', on_delete=models.SET_NULL, null=True, blank=True,
+                                        related_name='firewalls', verbose_name='策略模板')
 
     class Meta:
         verbose_name = '防火墙设备'
@@ -56,10 +67,24 @@ class Firewall(models.Model):
     def __str__(self):
         return '{} {}'.format(self.id, self.dev_name)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Firewall, cls).from_db(db, field_names, values)
+        instance._loaded_template_id = instance.__dict__.get('policy_template_id')
+        return instance
+
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        # 要在添加防火墙时生成一个注册码
-        self.register_code = random_string(REGISTER_CODE_LEN)
+        # 要在添加防火墙时生成一个注册码， 已有注册码的设备保存时不再重新生成
+        if not self.register_code:
+            self.register_code = random_string(REGISTER_CODE_LEN)
+        # 更换模板后设备上的策略不能再按增量同步， 清零配置版本， 下次同步取全量
+        loaded = getattr(self, '_loaded_template_id', self.policy_template_id)
+        if loaded != self.policy_template_id:
+            self.config_version = 0
+            if update_fields is not None:
+                update_fields = set(update_fields) | {'config_version'}
         super(Firewall, self).save(force_insert, force_update, using, update_fields)
+        self._loaded_template_id = self.policy_template_id
 
 
 class BaseStrategy(models.Model):
@@ -161,14 +186,30 @@ class IndustryProtocolModbusStrategy(IndustryProtocolStrategy):
 
     rule_id = models.IntegerField('规则ID', unique=True)
     rule_name = models.CharField('规则名称', max_length=64)
-    func_code = models.CharField('功能码', max_length=64)
-    reg_start = models.CharField('开始地址', max_length=64)
-    reg_end = models.CharField('结束地址', max_length=64)
-    reg_value = models.CharField('寄存器值', max_length=64)
+    func_code = models.PositiveSmallIntegerField('功能码', validators=[MinValueValidator(1), MaxValueValidator(127)])
+    reg_start = models.PositiveIntegerField('开始地址', validators=[MaxValueValidator(MODBUS_REGISTER_MAX)])
+    reg_end = models.PositiveIntegerField('结束地址', validators=[MaxValueValidator(MODBUS_REGISTER_MAX)])
+    # 为空时匹配任意值
+    reg_value = models.PositiveIntegerField('寄存器值', null=True, blank=True,
+                                            validators=[MaxValueValidator(MODBUS_REGISTER_MAX)])
     length = models.IntegerField('长度')
     action = models.IntegerField('动作', choices=ACTION_CHOICES)
     logging = models.IntegerField('记录日志', choices=LOGGING_CHOICES)
 
+    class Meta:
+        ordering = ('-created_time',)
+        indexes = [
+            models.Index(fields=['func_code', 'reg_start', 'reg_end']),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(reg_start__lte=models.F('reg_end')), name='modbus_reg_range'),
+        ]
+
+    def clean(self):
+        super(IndustryProtocolModbusStrategy, self).clean()
+        if self.reg_start is not None and self.reg_end is not None and self.reg_start > self.reg_end:
+            raise ValidationError({'reg_end': 'reg_end must not be less than reg_start.'})
+
 
 class IndustryProtocolS7Strategy(IndustryProtocolStrategy):
 
@@ -215,7 +256,7 @@ class BlackListStrategy(BaseStrategy):
 class IPMacBind(BaseStrategy):
     manufacturer = models.CharField('设备厂商', max_length=64)
     ip = models.GenericIPAddressField('ip')
-    mac = models.CharField('mac', validators=[MAC_VALIDATOR], max_length=32)
+    mac = models.CharField('mac', validators=[MAC_VALIDATOR], max_length=32, db_index=True)
     status = models.IntegerField('启用状态', choices=STATUS_CHOICES)
 
     class Meta:
@@ -255,12 +296,22 @@ class SecEvent(models.Model):
     src_ip = models.GenericIPAddressField('源地址')
     dst_ip = models.GenericIPAddressField('目的地址')
     protocol = models.CharField('协议', max_length=32, blank=True, null=True)
-    occurred_time = models.DateTimeField('时间', auto_now_add=True)
+    # 事件由设备上报， 发生时间以设备为准， 缺省时取入库时间
+    occurred_time = models.DateTimeField('时间', default=timezone.now)
     status = models.IntegerField('事件登记', choices=STATUS_CHOICES)
     risk_level = models.IntegerField('风险登记', choices=RISK_LEVEL_CHOICES)
     action = models.IntegerField('状态', choices=READ_ACTION_CHOICES)
     rule_id = models.IntegerField('规则ID')
 
+    objects = models.Manager()
+    partitions = TimePartitions('occurred_time')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['occurred_time', 'risk_level']),
+            models.Index(fields=['occurred_time', 'rule_id']),
+        ]
+
 
 class SysEvent(models.Model):
 
@@ -304,5 +355,130 @@ class SysEvent(models.Model):
     level = models.IntegerField('事件等级', choices=LEVEL_CHOICES)
     event_type = models.IntegerField('事件类型', choices=EVENT_TYPE_CHOICES)
     content = models.CharField('内容', max_length=10000)
-    occurred_time = models.DateTimeField('时间')
+    occurred_time = models.DateTimeField('时间', db_index=True)
     status = models.IntegerField('事件状态', choices=STATUS_CHOICES)
+
+    objects = models.Manager()
+    partitions = TimePartitions('occurred_time')
+
+
+class SecEventRollup(models.Model):
+    """
+    安全事件按时间段和维度预聚合的计数， 由周期任务增量维护， 供仪表盘查询。
+    """
+
+    GRANULARITY_MINUTE = 'minute'
+    GRANULARITY_HOUR = 'hour'
+    GRANULARITY_DAY = 'day'
+    GRANULARITY_CHOICES = (
+        (GRANULARITY_MINUTE, '分钟'),
+        (GRANULARITY_HOUR, '小时'),
+        (GRANULARITY_DAY, '天'),
+    )
+
+    granularity = models.CharField('粒度', max_length=8, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField('时间段')
+    risk_level = models.IntegerField('风险登记', choices=SecEvent.RISK_LEVEL_CHOICES)
+    status = models.IntegerField('事件登记', choices=SecEvent.STATUS_CHOICES)
+    rule_id = models.IntegerField('规则ID')
+    protocol = models.CharField('协议', max_length=32, blank=True, default='')
+    count = models.IntegerField('数量', default=0)
+
+    class Meta:
+        verbose_name = '安全事件统计'
+        unique_together = ('granularity', 'bucket', 'risk_level', 'status', 'rule_id', 'protocol')
+        indexes = [
+            models.Index(fields=['granularity', 'bucket']),
+        ]
+
+
+class PartitionSequence(models.Model):
+    """
+    分区事件的 id 序列， 主表和同一模型的所有分区共用一个 id 空间， next_id 为下一个可用的 id。
+    """
+    name = models.CharField('名称', max_length=128, unique=True)
+    next_id = models.BigIntegerField('下一个 id')
+
+
+class RollupCheckpoint(models.Model):
+    """
+    增量统计的高水位， 记录每个来源表已统计到的最大 id。
+    """
+    name = models.CharField('名称', max_length=128, unique=True)
+    position = models.BigIntegerField('位置', default=0)
+    updated_time = models.DateTimeField('更新时间', auto_now=True)
+
+
+class StrategyVersion(models.Model):
+    """
+    策略配置版本， 任意策略新增、修改、删除都会生成一个新版本， 版本号即 id， 单调递增。
+    模板或调整的变更生成的版本 policy_changed 为 True。
+    """
+    created_time = models.DateTimeField('创建时间', auto_now_add=True)
+    policy_changed = models.BooleanField('模板或调整变更', default=False)
+
+
+class StrategyTombstone(models.Model):
+    """
+    已删除策略的记录， 用于计算增量
+    """
+    model = models.CharField('模型', max_length=64)
+    object_id = models.IntegerField('对象ID')
+    version = models.IntegerField('版本', db_index=True)
+    deleted_time = models.DateTimeField('删除时间', auto_now_add=True)
+
+
+class PolicyTemplate(models.Model):
+    """
+    策略模板， 设备继承所属模板及其上级模板的策略， 只有与模板不同的部分才按设备保存。
+    """
+    name = models.CharField('名称', max_length=64, unique=True)
+    parent = models.ForeignKey('self', on_delete=models.PROTECT, null=True, blank=True, related_name='children',
+                               verbose_name='上级模板')
+    description = models.CharField('描述', max_length=256, blank=True, default='')
+    created_time = models.DateTimeField('创建时间', auto_now_add=True)
+    edit_time = models.DateTimeField('修改时间', auto_now=True)
+
+    class Meta:
+        verbose_name = '策略模板'
+
+    def __str__(self):
+        return self.name
+
+
+class PolicyOverride(models.Model):
+    """
+    模板或设备对一条策略的调整， template 和 firewall 有且只有一个。
+    object_id 为空时作用于该类型的全部策略（只用于 include / exclude）， modify 的 data 为要修改的字段 JSON。
+    """
+
+    OPERATION_INCLUDE = 'include'
+    OPERATION_EXCLUDE = 'exclude'
+    OPERATION_MODIFY = 'modify'
+    OPERATION_CHOICES = (
+        (OPERATION_INCLUDE, '加入'),
+        (OPERATION_EXCLUDE, '排除'),
+        (OPERATION_MODIFY, '修改'),
+    )
+
+    template = models.ForeignKey(PolicyTemplate, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='overrides', verbose_name='模板')
+    firewall = models.ForeignKey(Firewall, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='policy_overrides', verbose_name='设备')
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name='策略类型')
+    object_id = models.PositiveIntegerField('策略ID', null=True, blank=True)
+    strategy = GenericForeignKey('content_type', 'object_id')
+    operation = models.CharField('操作', max_length=8, choices=OPERATION_CHOICES)
+    data = models.TextField('修改内容', blank=True, default='')
+    created_time = models.DateTimeField('创建时间', auto_now_add=True)
+    edit_time = models.DateTimeField('修改时间', auto_now=True)
+
+    class Meta:
+        verbose_name = '策略调整'
+        unique_together = (
+            ('template', 'content_type', 'object_id'),
+            ('firewall', 'content_type', 'object_id'),
+        )
+        indexes = [
+            models.Index(fields=['content_type', 'object_id']),
+        ]
@@ -0,0 +1,209 @@
+"""
+按时间分区的事件存储。
+
+每个分区是一张独立的子表（如 firewall_secevent_p2026w42）， 结构与主表相同， 由主模型动态生成。
+写入时按 occurred_time 路由到对应分区， 按时间范围查询时只访问范围内的分区，
+过期数据直接 DROP 整个分区， 不再需要大批量 DELETE。
+主表和各分区的 id 由 PartitionSequence 统一分配， 不会重复， 按 (occurred_time, id) 的游标分页
+和按 id 查询在合并多张表时依然有效。 开启分区后事件只能通过 partitions.bulk_create 写入。
+
+开启方式（settings）:
+    EVENT_PARTITIONING = True
+    EVENT_PARTITION_INTERVAL = 'week'    # 'day' 或 'week'
+"""
+import datetime
+
+from django.apps.registry import Apps
+from django.conf import settings
+from django.db import DatabaseError, connection, models, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+INTERVAL_DAY = 'day'
+INTERVAL_WEEK = 'week'
+
+_partition_apps = Apps()
+
+
+class TimePartitions(object):
+    """
+    挂在事件模型上的分区管理器， 通过 `Model.partitions` 访问:
+
+        SecEvent.partitions.bulk_create(events)
+        for qs in SecEvent.partitions.querysets(start, end):
+            ...
+        SecEvent.partitions.drop_before(timezone.now() - timedelta(days=180))
+    """
+
+    def __init__(self, field_name='occurred_time', interval=None):
+        self.field_name = field_name
+        self._interval = interval
+        self._models = {}
+        self._created = set()
+        self.model = None
+
+    def contribute_to_class(self, cls, name):
+        self.model = cls
+        setattr(cls, name, self)
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'EVENT_PARTITIONING', False)
+
+    @property
+    def interval(self):
+        return self._interval or getattr(settings, 'EVENT_PARTITION_INTERVAL', INTERVAL_WEEK)
+
+    @property
+    def table_prefix(self):
+        return '{}_p'.format(self.model._meta.db_table)
+
+    # 分区键 --------------------------------------------------------------
+
+    def key_for(self, value):
+        if timezone.is_aware(value):
+            value = value.astimezone(timezone.utc)
+        day = value.date()
+        if self.interval == INTERVAL_DAY:
+            return day.strftime('%Y%m%d')
+        year, week, _ = day.isocalendar()
+        return '{}w{:02d}'.format(year, week)
+
+    def bounds(self, key):
+        """
+        分区覆盖的 UTC 时间范围 [start, end)
+        """
+        if 'w' in key:
+            # ISO 周从周一开始
+            start = datetime.datetime.strptime(key + '1', '%Gw%V%u')
+            end = start + datetime.timedelta(days=7)
+        else:
+            start = datetime.datetime.strptime(key, '%Y%m%d')
+            end = start + datetime.timedelta(days=1)
+        return start.replace(tzinfo=timezone.utc), end.replace(tzinfo=timezone.utc)
+
+    # 分区表 --------------------------------------------------------------
+
+    def table_name(self, key):
+        return self.table_prefix + key
+
+    def get_model(self, key):
+        """
+        返回分区对应的模型类， 字段与主模型一致， 只在独立的 Apps 中注册， 不参与 migrate。
+        """
+        try:
+            return self._models[key]
+        except KeyError:
+            pass
+        opts = self.model._meta
+        attrs = {'__module__': self.model.__module__}
+        for field in opts.local_fields:
+            attrs[field.name] = field.clone()
+        attrs['Meta'] = type('Meta', (), {
+            'app_label': opts.app_label,
+            'apps': _partition_apps,
+            'db_table': self.table_name(key),
+            # 索引名由子表名生成， 避免与主表冲突
+            'indexes': [models.Index(fields=list(index.fields)) for index in opts.indexes],
+        })
+        partition_model = type('{}_{}'.format(self.model.__name__, key), (models.Model,), attrs)
+        self._models[key] = partition_model
+        return partition_model
+
+    def existing_keys(self):
+        # 分区可能由其他进程创建或删除， 每次都从数据库读取
+        prefix = self.table_prefix
+        return sorted(
+            table[len(prefix):] for table in connection.introspection.table_names()
+            if table.startswith(prefix)
+        )
+
+    def ensure(self, key):
+        partition_model = self.get_model(key)
+        if key in self._created:
+            return partition_model
+        if key not in self.existing_keys():
+            try:
+                with connection.schema_editor() as editor:
+                    editor.create_model(partition_model)
+            except DatabaseError:
+                # 其他进程同时创建了同一个分区
+                if key not in self.existing_keys():
+                    raise
+        self._created.add(key)
+        return partition_model
+
+    def max_id(self):
+        querysets = [self.model.objects.all()] + [self.get_model(key).objects.all() for key in self.existing_keys()]
+        return max(qs.aggregate(value=Max('pk'))['value'] or 0 for qs in querysets)
+
+    def reserve_ids(self, count):
+        """
+        从共享序列中取 count 个连续的 id， 返回第一个， 需要在事务中调用。
+        先 UPDATE 再读取， 并发写入在行锁（SQLite 为写锁）上排队， 不会取到同一段 id。
+        """
+        from firewall.models import PartitionSequence
+        name = self.model._meta.db_table
+        sequences = PartitionSequence.objects.filter(name=name)
+        if not sequences.update(next_id=F('next_id') + count):
+            # 第一次使用时从主表和已有分区的最大 id 之后开始
+            PartitionSequence.objects.get_or_create(name=name, defaults={'next_id': self.max_id() + 1})
+            sequences.update(next_id=F('next_id') + count)
+        return sequences.values_list('next_id', flat=True).get() - count
+
+    # 读写 ----------------------------------------------------------------
+
+    def bulk_create(self, instances, batch_size=None):
+        """
+        按分区键分组后写入各自的子表， 所有分区在同一个事务中提交， 写入后 obj.pk 为分配的 id。
+        SQLite 不允许在事务中建表， 所以缺失的分区要在进入事务前创建。
+        """
+        groups = {}
+        for obj in instances:
+            groups.setdefault(self.key_for(getattr(obj, self.field_name)), []).append(obj)
+        partition_models = {key: self.ensure(key) for key in groups}
+        attnames = [field.attname for field in self.model._meta.concrete_fields if not field.primary_key]
+        with transaction.atomic():
+            first = self.reserve_ids(len(instances)) if instances else 0
+            for pk, obj in enumerate(instances, first):
+                obj.pk = pk
+            for key, objs in groups.items():
+                partition_model = partition_models[key]
+                partition_model.objects.bulk_create(
+                    [partition_model(pk=obj.pk, **{name: getattr(obj, name) for name in attnames}) for obj in objs],
+                    batch_size=batch_size,
+                )
+        return len(instances)
+
+    def querysets(self, start=None, end=None):
+        """
+        返回与 [start, end) 相交的已存在分区的 queryset 列表， 不相交的分区不会被访问。
+        """
+        result = []
+        for key in self.existing_keys():
+            part_start, part_end = self.bounds(key)
+            if start is not None and part_end <= start:
+                continue
+            if end is not None and part_start >= end:
+                continue
+            qs = self.get_model(key).objects.all()
+            if start is not None and start > part_start:
+                qs = qs.filter(**{self.field_name + '__gte': start})
+            if end is not None and end < part_end:
+                qs = qs.filter(**{self.field_name + '__lt': end})
+            result.append(qs)
+        return result
+
+    def drop_before(self, value):
+        """
+        删除结束时间早于 value 的整个分区， 返回被删除的表名。
+        """
+        dropped = []
+        for key in self.existing_keys():
+            if self.bounds(key)[1] > value:
+                continue
+            with connection.schema_editor() as editor:
+                editor.delete_model(self.get_model(key))
+            self._created.discard(key)
+            dropped.append(self.table_name(key))
+        return dropped
@@ -3,7 +3,10 @@ from celery import Celery
 # from uniform_management_platform.celery import app
 from celery.schedules import crontab
 from celery import shared_task
-from .tasks import test
+from django.conf import settings
+
+from .tasks import test, expire_event_partitions, rollup_sec_events, prune_strategy_versions, sweep_heartbeats, \
+    poll_fleet_status
 from uniform_management_platform.celery import app
 
 
@@ -21,4 +24,26 @@ def setup_periodic_tasks(sender, **kwargs):
         test.s('Happy Mondays!'),
     )
 
+    # 每分钟增量统计新入库的安全事件， 积压的任务过期不再执行， 避免多个任务同时统计
+    sender.add_periodic_task(60.0, rollup_sec_events.s(), name='rollup sec events', expires=60)
+
+    sender.add_periodic_task(settings.FIREWALL_HEARTBEAT_INTERVAL, sweep_heartbeats.s(), name='sweep heartbeats')
+
+    # 超过一个周期仍未完成的轮询不再执行
+    sender.add_periodic_task(settings.FIREWALL_POLL_INTERVAL, poll_fleet_status.s(), name='poll fleet status',
+                             expires=settings.FIREWALL_POLL_INTERVAL)
+
+    # 每天凌晨删除过期的事件分区
+    sender.add_periodic_task(
+        crontab(hour=3, minute=0),
+        expire_event_partitions.s(),
+        name='expire event partitions',
+    )
+
+    sender.add_periodic_task(
+        crontab(hour=3, minute=30),
+        prune_strategy_versions.s(),
+        name='prune strategy versions',
+    )
+
 
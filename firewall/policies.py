@@ -0,0 +1,223 @@
+"""
+策略模板与设备的生效策略。
+
+设备的生效策略由根模板、 ...、 设备所属模板、 设备自身的 PolicyOverride 依次叠加得到，
+没有模板（或模板已删除）的设备从全部策略开始叠加:
+    include    加入一条策略， object_id 为空时加入该类型的全部策略
+    exclude    移除一条策略， object_id 为空时清空该类型
+    modify     修改已加入策略的部分字段
+同一层中先处理 object_id 为空的调整。
+
+策略表按类型各读一次， 解析后的模板在进程内缓存。 设备只复制自己调整过的类型（copy-on-write），
+其余类型与模板共用同一份数据， 没有调整的设备直接使用模板的结果， 存储和内存都只随调整条数增长。
+任何模板、 调整或策略变更后缓存失效。
+
+    policy = effective_policy(firewall)     # {'firewall.ipmacbind': [row, ...], ...}
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from django.db.models.signals import post_delete
+
+from firewall.models import PolicyOverride, PolicyTemplate
+from firewall.snapshots import TRACKED_MODELS
+from utils.core.cache import get_generation, get_generations, model_generation_name
+
+POLICY_MODELS = TRACKED_MODELS
+POLICY_LABELS = tuple(model._meta.label_lower for model in POLICY_MODELS)
+DEVICE_MEMO_SIZE = 10000
+
+_GENERATION_NAMES = tuple(model_generation_name(model) for model in (PolicyTemplate, PolicyOverride) + POLICY_MODELS)
+
+
+def _label(app_label, model_name):
+    return '{}.{}'.format(app_label, model_name)
+
+
+def load_overrides(**filters):
+    """
+    返回 {所属模板或设备 id: [(类型, object_id, 操作, 修改内容), ...]}， 按处理顺序排列
+    """
+    owner = 'template_id' if 'template__isnull' in filters else 'firewall_id'
+    rows = PolicyOverride.objects.filter(**filters).values_list(
+        owner, 'content_type__app_label', 'content_type__model', 'object_id', 'operation', 'data', 'id')
+    result = {}
+    for owner_id, app_label, model_name, object_id, operation, data, pk in rows.iterator():
+        if _label(app_label, model_name) not in POLICY_LABELS:
+            continue
+        result.setdefault(owner_id, []).append(
+            (object_id is not None, pk, _label(app_label, model_name), object_id, operation,
+             json.loads(data) if data else {}))
+    return {owner_id: [item[2:] for item in sorted(items)] for owner_id, items in result.items()}
+
+
+def apply_overrides(policy, overrides, table):
+    """
+    在 policy（{类型: {pk: row}}）上叠加调整， 返回新的 policy 和被修改的类型， 不修改传入的 policy。
+    table(类型) 返回该类型全部策略的 {pk: row}。
+    """
+    result = dict(policy)
+    copied = set()
+    for label, object_id, operation, data in overrides:
+        if label not in copied:
+            result[label] = dict(result.get(label, ()))
+            copied.add(label)
+        rows = result[label]
+        if object_id is None:
+            if operation == PolicyOverride.OPERATION_INCLUDE:
+                rows.update(table(label))
+            elif operation == PolicyOverride.OPERATION_EXCLUDE:
+                rows.clear()
+        elif operation == PolicyOverride.OPERATION_INCLUDE:
+            row = table(label).get(object_id)
+            if row is not None:
+                rows[object_id] = row
+        elif operation == PolicyOverride.OPERATION_EXCLUDE:
+            rows.pop(object_id, None)
+        elif operation == PolicyOverride.OPERATION_MODIFY:
+            row = rows.get(object_id)
+            if row is not None:
+                rows[object_id] = dict(row, **data)
+    return result, copied
+
+
+def render(policy, base=None, changed=None):
+    """
+    转换为 {类型: [row, ...]}（按 pk 排序）， 给出 base 时未变化的类型直接使用 base 中的列表
+    """
+    return {
+        label: base[label] if changed is not None and label not in changed and label in base
+        else [rows[pk] for pk in sorted(rows)]
+        for label, rows in policy.items()
+    }
+
+
+# 策略表按各自的数据版本缓存， 与解析结果分开， 调整变化时不需要重新读取
+_tables = {}
+
+
+def load_table(label):
+    model = POLICY_MODELS[POLICY_LABELS.index(label)]
+    generation = get_generation(model_generation_name(model))
+    cached = _tables.get(label)
+    if cached is None or cached[0] != generation:
+        cached = (generation, {row['id']: row for row in model.objects.values().iterator()})
+        _tables[label] = cached
+    return cached[1]
+
+
+class PolicyResolver(object):
+    """
+    某一数据版本下的解析结果， 模板全部缓存， 设备按 LRU 缓存
+    """
+
+    def __init__(self, state=None):
+        self.state = state
+        self.parents = dict(PolicyTemplate.objects.values_list('id', 'parent_id'))
+        self.template_overrides = load_overrides(template__isnull=False)
+        self.devices_with_overrides = set(
+            PolicyOverride.objects.filter(firewall__isnull=False).values_list('firewall_id', flat=True).distinct())
+        self._templates = {None: ({}, {})}
+        self._default = None
+        self._devices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def chain(self, template_id):
+        """
+        从根模板到 template_id 的模板 id 列表
+        """
+        chain = []
+        while template_id is not None and template_id in self.parents and template_id not in chain:
+            chain.append(template_id)
+            template_id = self.parents[template_id]
+        return chain[::-1]
+
+    def template(self, template_id):
+        """
+        返回 (policy, rendered)
+        """
+        cached = self._templates.get(template_id)
+        if cached is not None:
+            return cached
+        cached = self._templates[None]
+        for item in self.chain(template_id):
+            if item in self._templates:
+                cached = self._templates[item]
+                continue
+            policy, changed = apply_overrides(cached[0], self.template_overrides.get(item, ()), load_table)
+            cached = (policy, render(policy, cached[1], changed))
+            self._templates[item] = cached
+        return cached
+
+    def default(self):
+        """
+        没有模板的设备使用全部策略， 返回 (policy, rendered)
+        """
+        if self._default is None:
+            policy = {label: load_table(label) for label in POLICY_LABELS}
+            self._default = (policy, render(policy))
+        return self._default
+
+    def device(self, firewall_id, template_id):
+        policy, rendered = self.template(template_id) if template_id in self.parents else self.default()
+        if firewall_id not in self.devices_with_overrides:
+            return rendered
+        key = (firewall_id, template_id)
+        with self._lock:
+            cached = self._devices.get(key)
+            if cached is not None:
+                self._devices.move_to_end(key)
+                return cached
+        overrides = load_overrides(firewall_id=firewall_id).get(firewall_id, ())
+        device_policy, changed = apply_overrides(policy, overrides, load_table)
+        cached = render(device_policy, rendered, changed)
+        with self._lock:
+            self._devices[key] = cached
+            if len(self._devices) > DEVICE_MEMO_SIZE:
+                self._devices.popitem(last=False)
+        return cached
+
+
+_resolver = None
+_lock = threading.Lock()
+
+
+def current_state():
+    return get_generations(_GENERATION_NAMES)
+
+
+def get_resolver():
+    """
+    返回当前数据版本的解析器， 模板、 调整或策略变更（本进程或其他进程）后重新构建
+    """
+    global _resolver
+    state = current_state()
+    resolver = _resolver
+    if resolver is not None and resolver.state == state:
+        return resolver
+    with _lock:
+        if _resolver is None or _resolver.state != state:
+            _resolver = PolicyResolver(state)
+        return _resolver
+
+
+def template_policy(template_id):
+    return get_resolver().template(template_id)[1]
+
+
+def effective_policy(firewall):
+    """
+    返回设备的生效策略 {类型: [row, ...]}， 返回值在缓存中共用， 调用方不能修改
+    """
+    return get_resolver().device(firewall.pk, firewall.policy_template_id)
+
+
+def strategy_deleted(sender, instance, **kwargs):
+    # 策略删除后对应的调整不再有意义
+    PolicyOverride.objects.filter(content_type__app_label=sender._meta.app_label,
+                                  content_type__model=sender._meta.model_name, object_id=instance.pk).delete()
+
+
+for _model in POLICY_MODELS:
+    post_delete.connect(strategy_deleted, sender=_model, dispatch_uid='policy_override_strategy_deleted')
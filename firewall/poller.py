@@ -0,0 +1,137 @@
+"""
+并发轮询设备状态。
+
+用 asyncio 在单个线程中同时探测全部设备的 GET /api/status， 并发数由信号量限制，
+每个设备探测前随机等待一段时间（jitter）， 避免所有请求在同一时刻发出。
+轮询结果批量写回:
+    version    按版本分组， 每组一条 UPDATE， 只更新发生变化的设备
+    可达性     记入心跳存储， 在线/离线状态由 heartbeat.sweep 统一计算
+
+    summary = poll_fleet()
+"""
+import asyncio
+import json
+import random
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from firewall.heartbeat import get_store
+from firewall.models import Firewall
+from utils.core.cache import touch_models
+
+UPDATE_CHUNK_SIZE = 500
+MAX_FAILURES_IN_SUMMARY = 100
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+async def fetch_status(ip, port, path, timeout, ssl=None):
+    """
+    请求设备状态接口， 返回解析后的 JSON， 失败时抛出 OSError / ValueError / asyncio.TimeoutError
+    """
+    async def request():
+        reader, writer = await asyncio.open_connection(ip, port, ssl=ssl)
+        try:
+            host = '[{}]'.format(ip) if ':' in ip else ip
+            writer.write('GET {} HTTP/1.0\r\nHost: {}\r\nAccept: application/json\r\n\r\n'.format(
+                path, host).encode('ascii'))
+            await writer.drain()
+            return await reader.read()
+        finally:
+            writer.close()
+
+    response = await asyncio.wait_for(request(), timeout)
+    head, _, body = response.partition(b'\r\n\r\n')
+    status_line = head.split(b'\r\n', 1)[0].split()
+    if len(status_line) < 2 or status_line[1] != b'200':
+        raise ValueError('Unexpected response: {}'.format(b' '.join(status_line[1:]).decode('latin-1')))
+    return json.loads(body.decode('utf-8'))
+
+
+async def probe(device, semaphore, port, path, timeout, jitter, ssl=None):
+    if jitter:
+        await asyncio.sleep(random.uniform(0, jitter))
+    async with semaphore:
+        try:
+            data = await fetch_status(device['ip'], port, path, timeout, ssl)
+        except asyncio.TimeoutError:
+            return {'id': device['id'], 'ok': False, 'error': 'timeout'}
+        except (OSError, ValueError) as exc:
+            return {'id': device['id'], 'ok': False, 'error': str(exc) or exc.__class__.__name__}
+    version = data.get('version') if isinstance(data, dict) else None
+    return {'id': device['id'], 'ok': True, 'version': version}
+
+
+async def poll_devices(devices, concurrency=None, timeout=None, jitter=None):
+    """
+    devices 为 [{'id': ..., 'ip': ...}]， 返回每台设备的探测结果
+    """
+    concurrency = concurrency or _setting('FIREWALL_POLL_CONCURRENCY', 200)
+    timeout = _setting('FIREWALL_POLL_TIMEOUT', 3) if timeout is None else timeout
+    jitter = _setting('FIREWALL_POLL_JITTER', 1.0) if jitter is None else jitter
+    port = _setting('FIREWALL_AGENT_PORT', 8080)
+    path = _setting('FIREWALL_AGENT_STATUS_PATH', '/api/status')
+    ssl = True if _setting('FIREWALL_AGENT_SCHEME', 'http') == 'https' else None
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*[
+        probe(device, semaphore, port, path, timeout, jitter, ssl) for device in devices
+    ])
+
+
+def target_devices():
+    return list(Firewall.objects.exclude(status=Firewall.NOT_REGISTERED).exclude(ip=None)
+                .values('id', 'ip', 'version'))
+
+
+def apply_results(devices, results, now=None):
+    """
+    批量写回版本号并记录可达设备， 返回版本发生变化的设备数
+    """
+    now = now or time.time()
+    current = {device['id']: device['version'] for device in devices}
+    changed = {}
+    store = get_store()
+    for result in results:
+        if not result['ok']:
+            continue
+        store.touch(result['id'], now)
+        version = str(result['version'])[:20] if result['version'] else None
+        if version and version != current.get(result['id']):
+            changed.setdefault(version, []).append(result['id'])
+
+    with transaction.atomic():
+        for version, ids in changed.items():
+            for i in range(0, len(ids), UPDATE_CHUNK_SIZE):
+                Firewall.objects.filter(id__in=ids[i:i + UPDATE_CHUNK_SIZE]).update(version=version)
+    count = sum(len(ids) for ids in changed.values())
+    if count:
+        # update() 不发送 signal， 手动使设备列表的响应缓存失效
+        touch_models(Firewall)
+    return count
+
+
+def poll_fleet(concurrency=None, timeout=None, jitter=None):
+    """
+    轮询全部已注册设备， 返回汇总
+    """
+    started = time.time()
+    devices = target_devices()
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(poll_devices(devices, concurrency, timeout, jitter))
+    finally:
+        loop.close()
+    updated = apply_results(devices, results)
+    failures = [result for result in results if not result['ok']]
+    return {
+        'total': len(results),
+        'reachable': len(results) - len(failures),
+        'unreachable': len(failures),
+        'version_updated': updated,
+        'elapsed': round(time.time() - started, 3),
+        'failures': failures[:MAX_FAILURES_IN_SUMMARY],
+    }
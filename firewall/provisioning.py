@@ -0,0 +1,142 @@
+"""
+批量导入防火墙设备。
+
+先完整校验所有行（字段、责任人、IP 在文件内和数据库中是否重复）并一次性报告全部问题，
+再批量生成注册码， 在一个事务中 bulk_create， 不逐条调用 Firewall.save()。
+
+    result = provision_devices(parse_devices(content, 'csv'))
+"""
+import csv
+import io
+import json
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from firewall.ingest import RowError, RowValidator
+from firewall.models import REGISTER_CODE_LEN, Firewall
+from utils.core.cache import touch_models
+from utils.helper import random_strings
+
+DEVICE_FIELDS = ('dev_code', 'dev_name', 'dev_location', 'ip', 'version')
+PROVISION_BATCH_SIZE = 500
+LOOKUP_CHUNK_SIZE = 500
+IP_EXISTS = 'Device with this ip already exists.'
+
+
+class ProvisionError(Exception):
+    pass
+
+
+def parse_devices(content, fmt):
+    """
+    content 为 CSV 或 JSON 文本， 返回行字典列表。 CSV 首行为表头。
+    """
+    if fmt == 'csv':
+        return [dict(row) for row in csv.DictReader(io.StringIO(content))]
+    if fmt == 'json':
+        try:
+            rows = json.loads(content)
+        except ValueError as exc:
+            raise ProvisionError('Invalid JSON - {}'.format(exc))
+        if not isinstance(rows, list):
+            raise ProvisionError('Expected a list of devices.')
+        return rows
+    raise ProvisionError('Unsupported format: {}'.format(fmt))
+
+
+def _resolve_users(rows):
+    """
+    responsible_user 可以是用户 id 或用户名， 一次查询解析全部
+    """
+    keys = {str(row.get('responsible_user', '')).strip() for row in rows if isinstance(row, dict)}
+    ids = {int(key) for key in keys if key.isdigit()}
+    names = {key for key in keys if key and not key.isdigit()}
+    users = {}
+    for user_id in User.objects.filter(id__in=ids).values_list('id', flat=True):
+        users[str(user_id)] = user_id
+    for user_id, username in User.objects.filter(username__in=names).values_list('id', 'username'):
+        users[username] = user_id
+    return users
+
+
+def _existing_ips(ips):
+    ips = list(ips)
+    existing = set()
+    for i in range(0, len(ips), LOOKUP_CHUNK_SIZE):
+        existing.update(Firewall.objects.filter(ip__in=ips[i:i + LOOKUP_CHUNK_SIZE]).values_list('ip', flat=True))
+    return existing
+
+
+def validate_devices(rows):
+    """
+    返回 ([(行号, 设备字段), ...], errors)
+    """
+    validator = RowValidator(Firewall, fields=DEVICE_FIELDS)
+    users = _resolve_users(rows)
+    valid = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            values = validator(row)
+        except RowError as exc:
+            errors.append({'index': index, 'errors': exc.args[0]})
+            continue
+        user_id = users.get(str(row.get('responsible_user', '')).strip())
+        if user_id is None:
+            errors.append({'index': index, 'errors': {'responsible_user': ['User does not exist.']}})
+            continue
+        values['responsible_user_id'] = user_id
+        valid.append((index, values))
+
+    ip_counts = Counter(values['ip'] for _, values in valid if values['ip'])
+    existing = _existing_ips(ip_counts)
+    result = []
+    for index, values in valid:
+        ip = values['ip']
+        if ip and ip in existing:
+            errors.append({'index': index, 'errors': {'ip': [IP_EXISTS]}})
+        elif ip and ip_counts[ip] > 1:
+            errors.append({'index': index, 'errors': {'ip': ['Duplicate ip in import.']}})
+        else:
+            result.append((index, values))
+    errors.sort(key=lambda error: error['index'])
+    return result, errors
+
+
+def provision_devices(rows, skip_invalid=False):
+    """
+    批量创建设备， 默认任一行有错误时不写入任何设备； skip_invalid=True 时只写入通过校验的行。
+    返回 {'created': 数量, 'failed': 数量, 'errors': [...]}
+    """
+    valid, errors = validate_devices(rows)
+    if errors and not skip_invalid:
+        return {'created': 0, 'failed': len(errors), 'errors': errors}
+
+    while True:
+        try:
+            created = _create_devices([values for _, values in valid])
+            break
+        except IntegrityError:
+            # 校验之后其他请求写入了相同 ip， 重新查库， 把冲突行按校验错误报告
+            existing = _existing_ips(values['ip'] for _, values in valid if values['ip'])
+            conflicts = [index for index, values in valid if values['ip'] in existing]
+            if not conflicts:
+                raise
+            errors = sorted(errors + [{'index': index, 'errors': {'ip': [IP_EXISTS]}} for index in conflicts],
+                            key=lambda error: error['index'])
+            if not skip_invalid:
+                return {'created': 0, 'failed': len(errors), 'errors': errors}
+            valid = [(index, values) for index, values in valid if values['ip'] not in existing]
+    return {'created': created, 'failed': len(errors), 'errors': errors}
+
+
+def _create_devices(values):
+    codes = random_strings(len(values), REGISTER_CODE_LEN)
+    devices = [Firewall(register_code=code, **device) for code, device in zip(codes, values)]
+    with transaction.atomic():
+        Firewall.objects.bulk_create(devices, batch_size=PROVISION_BATCH_SIZE)
+        # bulk_create 不发送 signal， 提交后使设备列表的响应缓存失效
+        transaction.on_commit(lambda: touch_models(Firewall))
+    return len(devices)
@@ -0,0 +1,154 @@
+"""
+向防火墙设备并行下发策略。
+
+设备列表按 chunk 切分成 Celery group， 每个 chunk 任务在 worker 内用有限大小的线程池并发推送，
+每台设备收到从自己的 config_version 到当前版本、 按自身生效策略计算的增量（snapshots.build_delta），
+没有模板的设备以全部策略为准。 连接失败、超时、 响应无法解析和 5xx 时按指数退避重试，
+4xx 等设备拒绝的请求不重试。 全部 chunk 完成后由 chord 回调汇总结果。
+设备成功应用后， 其 config_version 通过一次 UPDATE 批量更新， 不走 Firewall.save()。
+
+    result = push_config_to_fleet()          # 返回 chord 的 AsyncResult， result.get() 为汇总
+"""
+import gzip
+import http.client
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from firewall import snapshots
+from firewall.models import Firewall, PolicyOverride
+
+PUSH_CHUNK_SIZE = 50
+MAX_FAILURES_IN_SUMMARY = 100
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def device_url(ip, path):
+    port = _setting('FIREWALL_AGENT_PORT', 8080)
+    if ':' in ip:
+        ip = '[{}]'.format(ip)
+    return '{}://{}:{}{}'.format(_setting('FIREWALL_AGENT_SCHEME', 'http'), ip, port, path)
+
+
+def encode_payload(data):
+    return gzip.compress(json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8'))
+
+
+def send_config(ip, payload, version, timeout):
+    request = urllib.request.Request(
+        device_url(ip, _setting('FIREWALL_AGENT_CONFIG_PATH', '/api/config')),
+        data=payload,
+        method='POST',
+        headers={
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+            'X-Config-Version': str(version),
+        },
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+def is_retryable(exc):
+    """
+    连接失败、超时、 响应无法解析（如 BadStatusLine）和服务端错误（5xx）可以重试，
+    设备拒绝（4xx）和请求本身的错误重试也不会成功
+    """
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code >= 500
+    return isinstance(exc, (urllib.error.URLError, OSError, http.client.HTTPException))
+
+
+def push_with_retry(device, payload, version, retries=None, backoff=None, timeout=None):
+    """
+    推送到单台设备， 失败时按 backoff * 2^n（加随机抖动）重试， 返回结果字典
+    """
+    retries = _setting('FIREWALL_PUSH_RETRIES', 3) if retries is None else retries
+    backoff = _setting('FIREWALL_PUSH_BACKOFF', 0.5) if backoff is None else backoff
+    timeout = _setting('FIREWALL_PUSH_TIMEOUT', 5) if timeout is None else timeout
+    error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            delay = backoff * 2 ** (attempt - 1)
+            time.sleep(delay + random.uniform(0, delay))
+        try:
+            send_config(device['ip'], payload, version, timeout)
+            return {'id': device['id'], 'ok': True, 'attempts': attempt + 1}
+        except (urllib.error.URLError, OSError, http.client.HTTPException, ValueError) as exc:
+            error = str(exc)
+            if not is_retryable(exc):
+                break
+    return {'id': device['id'], 'ok': False, 'attempts': attempt + 1, 'error': error}
+
+
+def push_chunk(device_ids, concurrency=None):
+    """
+    推送一批设备各自的增量， 配置版本和模板相同且没有设备调整的设备共用一份编码结果
+    """
+    concurrency = concurrency or _setting('FIREWALL_PUSH_CONCURRENCY', 16)
+    devices = list(Firewall.objects.filter(id__in=device_ids))
+    version = snapshots.current_version()
+    with_overrides = set(PolicyOverride.objects.filter(firewall_id__in=device_ids)
+                         .values_list('firewall_id', flat=True).distinct())
+    encoded = {}
+    payloads = {}
+    for device in devices:
+        key = (device.config_version, device.policy_template_id,
+               device.pk if device.pk in with_overrides else None)
+        if key not in encoded:
+            delta = snapshots.build_delta(device.config_version, device)
+            encoded[key] = encode_payload(dict(delta, version=version, template=device.policy_template_id))
+        payloads[device.pk] = encoded[key]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(
+            lambda device: push_with_retry({'id': device.pk, 'ip': device.ip}, payloads[device.pk], version),
+            devices,
+        ))
+
+    succeeded = [result['id'] for result in results if result['ok']]
+    if succeeded:
+        Firewall.objects.filter(id__in=succeeded).update(config_version=version)
+    return results
+
+
+def summarize(chunk_results):
+    results = [result for chunk in chunk_results for result in chunk]
+    failures = [result for result in results if not result['ok']]
+    return {
+        'total': len(results),
+        'succeeded': len(results) - len(failures),
+        'failed': len(failures),
+        'retried': sum(1 for result in results if result['attempts'] > 1),
+        'failures': failures[:MAX_FAILURES_IN_SUMMARY],
+    }
+
+
+def target_devices():
+    return Firewall.objects.exclude(ip=None).exclude(status=Firewall.NOT_REGISTERED)
+
+
+def push_config_to_fleet(device_ids=None, chunk_size=PUSH_CHUNK_SIZE):
+    """
+    把设备列表切分为 chunk 并行推送， 返回 chord 的 AsyncResult
+    """
+    from celery import chord, group
+    from firewall.tasks import push_config_chunk, summarize_push
+
+    queryset = target_devices()
+    if device_ids is not None:
+        queryset = queryset.filter(id__in=device_ids)
+    ids = list(queryset.order_by('id').values_list('id', flat=True))
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+    if not chunks:
+        return None
+    return chord(group(push_config_chunk.s(chunk) for chunk in chunks))(summarize_push.s())
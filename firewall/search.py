@@ -0,0 +1,96 @@
+"""
+BlackListStrategy 的全文索引（SQLite FTS5）。
+
+索引是以 firewall_blackliststrategy 为外部内容表的 FTS5 虚拟表， 由数据库触发器在
+INSERT / UPDATE / DELETE 时同步， bulk_create 和 queryset.update/delete 也不会漏掉。
+索引表在 migrate 后自动创建， 已有数据可以用 `manage.py rebuild_search_index` 重建。
+非 SQLite 数据库或 SQLite 未编译 FTS5 时， 搜索退回 SearchFilter 的 LIKE 查询。
+
+默认的 unicode61 分词器不切分中文， 连续的汉字会成为一个词， 只能按前缀搜索。
+SQLite 3.34 以上使用 trigram 分词器， 支持任意位置的子串搜索（至少 3 个字符，
+更短的搜索词由 FullTextSearchFilter 退回 LIKE）； 已有的 unicode61 索引在 migrate 时重建。
+"""
+import logging
+import sqlite3
+
+from django.db import DatabaseError, connection
+
+from firewall.models import BlackListStrategy
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'firewall_blackliststrategy_fts'
+FTS_COLUMNS = ('vulnerability_name', 'content')
+FTS_TOKENIZER = 'trigram' if sqlite3.sqlite_version_info >= (3, 34, 0) else 'unicode61'
+
+
+def _statements():
+    source = BlackListStrategy._meta.db_table
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join('new.' + column for column in FTS_COLUMNS)
+    old_values = ', '.join('old.' + column for column in FTS_COLUMNS)
+    return [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{source}', content_rowid='id', "
+        "tokenize='{tokenizer}')",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN "
+        "INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new}); END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old}); END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {source} BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+        "INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new}); END",
+    ], dict(fts=FTS_TABLE, source=source, columns=columns, new=new_values, old=old_values, tokenizer=FTS_TOKENIZER)
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def index_exists():
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def index_tokenizer():
+    """
+    返回已有索引表使用的分词器， 没有索引表时返回 None
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return 'trigram' if 'trigram' in row[0] else 'unicode61'
+
+
+def ensure_index():
+    """
+    创建索引表和触发器， 新建索引或分词器变化时从源表导入已有数据。 返回索引是否可用。
+    """
+    if not is_supported():
+        return False
+    if BlackListStrategy._meta.db_table not in connection.introspection.table_names():
+        return False
+    tokenizer = index_tokenizer()
+    created = tokenizer != FTS_TOKENIZER
+    statements, context = _statements()
+    try:
+        with connection.cursor() as cursor:
+            if tokenizer is not None and created:
+                cursor.execute('DROP TABLE {}'.format(FTS_TABLE))
+            for statement in statements:
+                cursor.execute(statement.format(**context))
+    except DatabaseError:
+        logger.warning('SQLite FTS5 is not available, blacklist search falls back to LIKE.')
+        return False
+    if created:
+        rebuild_index()
+    return True
+
+
+def rebuild_index():
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO {0}({0}) VALUES ('rebuild')".format(FTS_TABLE))
+
+
+def ensure_index_after_migrate(sender, **kwargs):
+    ensure_index()
@@ -1,5 +1,14 @@
+import json
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from rest_framework import serializers
-from firewall.models import Firewall
+from firewall.models import BlackListStrategy, Firewall, PolicyOverride, PolicyTemplate, SecEvent, SecEventRollup, \
+    SysEvent
+from firewall.policies import POLICY_LABELS, POLICY_MODELS
 
 
 class FirewallSerializer(serializers.ModelSerializer):
@@ -7,11 +16,216 @@ class FirewallSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Firewall
-        fields = ('id', 'dev_name', 'ip', 'version', 'responsible_user', 'status')
+        fields = ('id', 'dev_name', 'ip', 'version', 'responsible_user', 'status', 'policy_template')
 
 
 class FirewallCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Firewall
-        fields = ('dev_name', 'dev_code', 'dev_location', 'responsible_user')
+        fields = ('dev_name', 'dev_code', 'dev_location', 'responsible_user', 'policy_template')
+
+
+class SecEventRollupQuerySerializer(serializers.Serializer):
+    """
+    安全事件统计查询参数， 默认查询最近 24 小时
+    """
+    granularity = serializers.ChoiceField(choices=SecEventRollup.GRANULARITY_CHOICES,
+                                          default=SecEventRollup.GRANULARITY_HOUR)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    by = serializers.ChoiceField(choices=('risk_level', 'status', 'rule_id', 'protocol'), required=False)
+    risk_level = serializers.ChoiceField(choices=SecEvent.RISK_LEVEL_CHOICES, required=False)
+    status = serializers.ChoiceField(choices=SecEvent.STATUS_CHOICES, required=False)
+    rule_id = serializers.IntegerField(required=False)
+    protocol = serializers.CharField(max_length=32, required=False)
+
+    def validate(self, attrs):
+        end = attrs.setdefault('end', timezone.now())
+        attrs.setdefault('start', end - timedelta(days=1))
+        if attrs['start'] >= attrs['end']:
+            raise serializers.ValidationError('start must be earlier than end.')
+        return attrs
+
+
+class SecEventSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = SecEvent
+        fields = ('id', 'src_ip', 'dst_ip', 'protocol', 'occurred_time', 'status', 'risk_level', 'action', 'rule_id')
+
+
+class SysEventSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = SysEvent
+        fields = ('id', 'level', 'event_type', 'content', 'occurred_time', 'status')
+
+
+class RuleMatchSerializer(serializers.Serializer):
+    """
+    tuples 中每一项为 [src_ip, dst_ip, src_port, dst_port, protocol]， 端口和协议可为 null
+    """
+    kind = serializers.ChoiceField(choices=('firewall', 'whitelist'))
+    tuples = serializers.ListField(
+        child=serializers.ListField(min_length=5, max_length=5),
+        max_length=100000,
+    )
+
+
+class ModbusEvaluateSerializer(serializers.Serializer):
+    """
+    requests 中每一项为 [func_code, address, value]， value 可为 null
+    """
+    requests = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField(min_value=0, allow_null=True),
+                                    min_length=3, max_length=3),
+        max_length=100000,
+    )
+
+
+class RuleAnalysisSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=('firewall', 'whitelist'))
+    sync = serializers.BooleanField(default=False)
+
+
+class ConfigPushSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+
+class PolicyAssignSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), min_length=1)
+
+
+class HeartbeatSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    register_code = serializers.CharField(max_length=20)
+
+
+class ArpCompareSerializer(serializers.Serializer):
+    """
+    entries 为 [{"ip", "mac", "manufacturer"}]， 或在 table 中直接提交 arp 命令的输出
+    """
+    entries = serializers.ListField(child=serializers.DictField(), required=False)
+    table = serializers.CharField(required=False, trim_whitespace=False)
+    commit = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        if 'entries' not in attrs and 'table' not in attrs:
+            raise serializers.ValidationError('Either entries or table is required.')
+        return attrs
+
+
+class BlackListStrategySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = BlackListStrategy
+        fields = ('id', 'strategy_name', 'vulnerability_name', 'publish_time', 'level', 'event_process', 'content',
+                  'status', 'created_time', 'edit_time')
+
+
+class PolicyTemplateSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = PolicyTemplate
+        fields = ('id', 'name', 'parent', 'description', 'created_time', 'edit_time')
+
+    def validate_parent(self, value):
+        # 上级模板不能是自己或自己的下级
+        template = value
+        while template is not None:
+            if self.instance is not None and template.pk == self.instance.pk:
+                raise serializers.ValidationError('Template inheritance must not form a cycle.')
+            template = template.parent
+        return value
+
+
+class PolicyOverrideSerializer(serializers.ModelSerializer):
+    """
+    model 为策略类型（如 firewall.ipmacbind）， data 为 modify 要修改的字段
+    """
+    model = serializers.ChoiceField(choices=POLICY_LABELS, source='content_type')
+    data = serializers.DictField(required=False, default=dict)
+
+    # 策略的公共字段不允许按设备修改
+    READONLY_FIELDS = ('id', 'strategy_name', 'created_time', 'edit_time')
+
+    class Meta:
+        model = PolicyOverride
+        fields = ('id', 'template', 'firewall', 'model', 'object_id', 'operation', 'data', 'created_time', 'edit_time')
+        # unique_together 的默认校验会把可为空的 template / firewall 变成必填， 在 validate 中自行检查
+        validators = []
+
+    def to_representation(self, instance):
+        return {
+            'id': instance.id,
+            'template': instance.template_id,
+            'firewall': instance.firewall_id,
+            'model': instance.content_type.model_class()._meta.label_lower,
+            'object_id': instance.object_id,
+            'operation': instance.operation,
+            'data': json.loads(instance.data) if instance.data else {},
+            'created_time': serializers.DateTimeField().to_representation(instance.created_time),
+            'edit_time': serializers.DateTimeField().to_representation(instance.edit_time),
+        }
+
+    def validate(self, attrs):
+        def current(name, default=None):
+            return attrs[name] if name in attrs else getattr(self.instance, name, default)
+
+        if (current('template') is None) == (current('firewall') is None):
+            raise serializers.ValidationError('Exactly one of template and firewall is required.')
+
+        label = attrs.get('content_type')
+        if label is None:
+            model = self.instance.content_type.model_class()
+        else:
+            model = POLICY_MODELS[POLICY_LABELS.index(label)]
+            attrs['content_type'] = ContentType.objects.get_for_model(model)
+        object_id = current('object_id')
+        operation = current('operation')
+        data = attrs.pop('data', None)
+        if data is None:
+            data = json.loads(self.instance.data) if self.instance is not None and self.instance.data else {}
+
+        owner = {'template': current('template')} if current('template') is not None else \
+            {'firewall': current('firewall')}
+        duplicates = PolicyOverride.objects.filter(content_type=ContentType.objects.get_for_model(model),
+                                                   object_id=object_id, **owner)
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError('An override for this strategy already exists.')
+
+        if object_id is None:
+            if operation == PolicyOverride.OPERATION_MODIFY:
+                raise serializers.ValidationError({'object_id': ['This field is required for modify.']})
+        elif not model.objects.filter(pk=object_id).exists():
+            raise serializers.ValidationError({'object_id': ['Strategy does not exist.']})
+
+        if operation != PolicyOverride.OPERATION_MODIFY:
+            if data:
+                raise serializers.ValidationError({'data': ['Only modify accepts data.']})
+            attrs['data'] = ''
+            return attrs
+        if not data:
+            raise serializers.ValidationError({'data': ['This field is required for modify.']})
+
+        errors = {}
+        cleaned = {}
+        for name, value in data.items():
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+            if field is None or not field.concrete or field.is_relation or name in self.READONLY_FIELDS:
+                errors[name] = ['Unknown or read-only field.']
+                continue
+            try:
+                cleaned[field.attname] = field.clean(value, None)
+            except ValidationError as exc:
+                errors[name] = exc.messages
+        if errors:
+            raise serializers.ValidationError({'data': errors})
+        attrs['data'] = json.dumps(cleaned, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return attrs
@@ -0,0 +1,167 @@
+"""
+策略配置版本与增量。
+
+每次策略变更（save/delete）生成一个 StrategyVersion， 删除同时记录 StrategyTombstone。
+设备带着自己的版本号 N 来同步时， 只返回 edit_time 晚于版本 N 的策略和版本 N 之后的删除记录；
+N 早于保留的最早版本时返回全量。
+
+给出设备时按设备的生效策略（policies.effective_policy）计算， 增量只包含生效策略中的行，
+行内容为叠加调整后的结果。 模板和调整（PolicyTemplate / PolicyOverride）的变更同样生成版本，
+版本 N 之后有这类变更时设备收到全量。
+
+    delta = build_delta(since=42)
+    delta = build_delta(since=42, firewall=device)
+"""
+from datetime import timedelta
+
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from firewall.models import (
+    BaseFirewallStrategy, BlackListStrategy, ConfStrategy, IndustryProtocolCustomConfStrategy,
+    IndustryProtocolDefaultConfStrategy, IndustryProtocolModbusStrategy, IndustryProtocolS7Strategy,
+    IPMacBind, PolicyOverride, PolicyTemplate, StrategyTombstone, StrategyVersion, WhiteListStrategy,
+)
+
+TRACKED_MODELS = (
+    ConfStrategy,
+    BaseFirewallStrategy,
+    WhiteListStrategy,
+    BlackListStrategy,
+    IPMacBind,
+    IndustryProtocolDefaultConfStrategy,
+    IndustryProtocolCustomConfStrategy,
+    IndustryProtocolModbusStrategy,
+    IndustryProtocolS7Strategy,
+)
+# 改变设备生效策略组成的模型， 变更生成版本， 但不进入增量
+POLICY_MODELS = (PolicyTemplate, PolicyOverride)
+
+# edit_time 在 save 开始时生成， 与版本创建之间存在时间差， 增量多取一小段时间避免漏掉
+# 并发写入的策略， 重复下发对设备是幂等的
+EDIT_TIME_OVERLAP = timedelta(seconds=5)
+
+
+def current_version():
+    return StrategyVersion.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def oldest_version():
+    return StrategyVersion.objects.order_by('id').values_list('id', flat=True).first() or 0
+
+
+def _rows(model, **filters):
+    return list(model.objects.filter(**filters).order_by('pk').values())
+
+
+def build_full(firewall=None):
+    if firewall is not None:
+        from firewall.policies import effective_policy
+        changed = effective_policy(firewall)
+    else:
+        changed = {model._meta.label_lower: _rows(model) for model in TRACKED_MODELS}
+    return {'full': True, 'version': current_version(), 'changed': changed, 'deleted': {}}
+
+
+def _policy_changed(since):
+    """
+    版本 since 之后是否修改或删除过模板、 调整
+    """
+    return StrategyVersion.objects.filter(id__gt=since, policy_changed=True).exists()
+
+
+def _restrict(changed, policy):
+    """
+    只保留设备生效策略中的行， 并替换为叠加调整后的内容
+    """
+    result = {}
+    for label, rows in changed.items():
+        effective = {row['id']: row for row in policy.get(label, ())}
+        rows = [effective[row['id']] for row in rows if row['id'] in effective]
+        if rows:
+            result[label] = rows
+    return result
+
+
+def build_delta(since, firewall=None):
+    """
+    返回版本 since 之后的变更:
+    {'full': False, 'version': 当前版本, 'changed': {model: [row, ...]}, 'deleted': {model: [id, ...]}}
+    """
+    version = current_version()
+    if since == version:
+        return {'full': False, 'version': version, 'changed': {}, 'deleted': {}}
+    base = StrategyVersion.objects.filter(id=since).values_list('created_time', flat=True).first()
+    if base is None or since > version or since < oldest_version():
+        return build_full(firewall)
+    if firewall is not None and _policy_changed(since):
+        return build_full(firewall)
+
+    changed = {}
+    for model in TRACKED_MODELS:
+        rows = _rows(model, edit_time__gt=base - EDIT_TIME_OVERLAP)
+        if rows:
+            changed[model._meta.label_lower] = rows
+    deleted = {}
+    edited = {label: {row['id']: row['edit_time'] for row in rows} for label, rows in changed.items()}
+    tombstones = StrategyTombstone.objects.filter(version__gt=since).order_by('version')
+    for label, object_id, deleted_time in tombstones.values_list('model', 'object_id', 'deleted_time'):
+        # 删除后 id 被新策略复用时， 只保留新策略
+        edit_time = edited.get(label, {}).get(object_id)
+        if edit_time is not None and edit_time > deleted_time:
+            continue
+        deleted.setdefault(label, []).append(object_id)
+    if firewall is not None:
+        from firewall.policies import effective_policy
+        changed = _restrict(changed, effective_policy(firewall))
+    return {'full': False, 'version': version, 'changed': changed, 'deleted': deleted}
+
+
+def prune(keep_days):
+    """
+    删除 keep_days 天以前的版本和删除记录， 更早的客户端会收到全量
+    """
+    before = timezone.now() - timedelta(days=keep_days)
+    latest = current_version()
+    StrategyTombstone.objects.filter(deleted_time__lt=before).delete()
+    # 始终保留最新版本
+    StrategyVersion.objects.filter(created_time__lt=before).exclude(id=latest).delete()
+
+
+def record_bulk_change():
+    """
+    bulk_create / update() 不发送 signal， 批量写入策略后在同一事务中调用， 生成一个新版本。
+    新增和修改的策略按 edit_time 进入增量， 批量写入时需要同时更新 edit_time。
+    """
+    return StrategyVersion.objects.create()
+
+
+def strategy_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        StrategyVersion.objects.create()
+
+
+def strategy_deleted(sender, instance, **kwargs):
+    version = StrategyVersion.objects.create()
+    StrategyTombstone.objects.create(model=sender._meta.label_lower, object_id=instance.pk, version=version.id)
+
+
+def policy_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        StrategyVersion.objects.create(policy_changed=True)
+
+
+def policy_deleted(sender, instance, **kwargs):
+    # 策略删除时连带删除的调整不影响其余策略， 策略的删除记录已经足够
+    if sender is PolicyOverride and instance.object_id is not None and not \
+            instance.content_type.model_class().objects.filter(pk=instance.object_id).exists():
+        return
+    StrategyVersion.objects.create(policy_changed=True)
+
+
+for _model in TRACKED_MODELS:
+    post_save.connect(strategy_saved, sender=_model, dispatch_uid='strategy_version_saved')
+    post_delete.connect(strategy_deleted, sender=_model, dispatch_uid='strategy_version_deleted')
+for _model in POLICY_MODELS:
+    post_save.connect(policy_saved, sender=_model, dispatch_uid='strategy_version_policy_saved')
+    post_delete.connect(policy_deleted, sender=_model, dispatch_uid='strategy_version_policy_deleted')
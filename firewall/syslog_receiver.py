@@ -0,0 +1,204 @@
+"""
+接收防火墙 syslog 并写入 SecEvent / SysEvent。
+
+日志行格式（RFC3164 / RFC5424 头部之后为 tag 和 key=value 列表， 值可以用双引号包含空格）:
+
+    <134>Oct 18 12:00:00 fw01 secevent: src_ip=10.0.0.1 dst_ip=10.0.0.2 protocol=TCP status=1 risk_level=2 action=1 rule_id=7
+    <131>1 2026-10-18T12:00:00Z fw01 sysevent - - - level=1 event_type=0 status=0 content="interface eth1 down"
+
+缺少 occurred_time 时使用接收时间。 解析后的行用 ingest 的校验器检查， 进入有界队列，
+写入协程按条数或时间攒批， 在单独的线程中调用 write_events， 不阻塞事件循环。
+校验失败的行计入 invalid； 整批写入失败时改为逐行写入， 写不进去的行计入 failed。
+
+队列满时（数据库写入跟不上）: TCP 连接暂停读取， 由 TCP 流控让发送方减速；
+UDP 无法反压， 直接丢弃并计入 dropped。
+"""
+import asyncio
+import logging
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from firewall.ingest import RowError, get_row_validator, write_events
+from firewall.models import SecEvent, SysEvent
+
+logger = logging.getLogger(__name__)
+
+EVENT_TAGS = {
+    'secevent': SecEvent,
+    'sysevent': SysEvent,
+}
+
+_TAG = re.compile(r'\b(?P<tag>secevent|sysevent)(?:\[\d+\])?:?\s')
+_PAIR = re.compile(r'(\w+)=(?:"((?:[^"\\]|\\.)*)"|(\S*))')
+
+
+def parse_line(line, received_time=None):
+    """
+    返回 (model, row)， 不是事件日志时返回 None
+    """
+    match = _TAG.search(line)
+    if match is None:
+        return None
+    row = {}
+    for key, quoted, plain in _PAIR.findall(line[match.end():]):
+        row[key] = quoted.replace('\\"', '"') if quoted else plain
+    row.setdefault('occurred_time', (received_time or timezone.now()).isoformat())
+    return EVENT_TAGS[match.group('tag')], row
+
+
+class SyslogReceiver(object):
+    """
+    receiver = SyslogReceiver(udp_port=5514, tcp_port=5514)
+    await receiver.start()      # 端口为 0 时随机分配， 实际端口见 receiver.udp_port / tcp_port
+    ...
+    await receiver.stop()       # 写入缓冲中剩余的事件
+    """
+
+    def __init__(self, host='0.0.0.0', udp_port=5514, tcp_port=5514, batch_size=500, flush_interval=1.0,
+                 queue_size=10000):
+        self.host = host
+        self.udp_port = udp_port
+        self.tcp_port = tcp_port
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = None
+        self.queue_size = queue_size
+        self.counters = Counter(received=0, parsed=0, invalid=0, dropped=0, written=0, failed=0)
+        self._transport = None
+        self._server = None
+        self._writer = None
+        # Django 数据库连接与线程绑定， 所有写入都在同一个线程中进行
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def start(self):
+        loop = asyncio.get_event_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.udp_port is not None:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _UDPProtocol(self), local_addr=(self.host, self.udp_port))
+            self.udp_port = self._transport.get_extra_info('sockname')[1]
+        if self.tcp_port is not None:
+            self._server = await asyncio.start_server(self._handle_tcp, self.host, self.tcp_port)
+            self.tcp_port = self._server.sockets[0].getsockname()[1]
+        self._writer = loop.create_task(self._write_loop())
+
+    async def stop(self):
+        if self._transport is not None:
+            self._transport.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.queue.put(None)
+        await self._writer
+        self._executor.shutdown()
+
+    def _parse(self, line):
+        self.counters['received'] += 1
+        parsed = parse_line(line)
+        if parsed is None:
+            self.counters['invalid'] += 1
+            return None
+        model, row = parsed
+        try:
+            values = get_row_validator(model)(row)
+        except (RowError, ValueError, OverflowError):
+            # 与 ingest 使用相同的校验， 任何一行的错误都只拒绝这一行， 不影响连接和同批的其他行
+            self.counters['invalid'] += 1
+            return None
+        self.counters['parsed'] += 1
+        return model, values
+
+    def feed_datagram(self, data):
+        for line in data.decode('utf-8', 'replace').splitlines():
+            item = self._parse(line)
+            if item is None:
+                continue
+            try:
+                self.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.counters['dropped'] += 1
+
+    async def _handle_tcp(self, reader, writer):
+        # 一行一条（RFC6587 non-transparent framing）
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                item = self._parse(line.decode('utf-8', 'replace').rstrip('\r\n'))
+                if item is not None:
+                    # 队列满时在这里等待， 不再读取 socket
+                    await self.queue.put(item)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write_loop(self):
+        loop = asyncio.get_event_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                await loop.run_in_executor(self._executor, self._write, batch)
+
+    def _write(self, batch):
+        by_model = {}
+        for model, values in batch:
+            by_model.setdefault(model, []).append(model(**values))
+        close_old_connections()
+        for model, instances in by_model.items():
+            try:
+                self.counters['written'] += write_events(model, instances)
+            except Exception:
+                logger.exception('Failed to write %d %s rows, retrying one by one', len(instances), model.__name__)
+                self._write_rows(model, instances)
+
+    def _write_rows(self, model, instances):
+        # 整批写入失败时逐行写入， 只丢弃写不进去的行
+        for instance in instances:
+            try:
+                self.counters['written'] += write_events(model, [instance])
+            except Exception:
+                logger.warning('Failed to write %s row %r', model.__name__, instance.__dict__, exc_info=True)
+                self.counters['failed'] += 1
+
+
+class _UDPProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, receiver):
+        self.receiver = receiver
+
+    def datagram_received(self, data, addr):
+        self.receiver.feed_datagram(data)
+
+
+async def run(receiver, stats_interval=60):
+    """
+    运行直到被取消， 每 stats_interval 秒记录一次计数
+    """
+    await receiver.start()
+    try:
+        while True:
+            await asyncio.sleep(stats_interval)
+            logger.info('syslog %s queue=%d', dict(receiver.counters), receiver.queue.qsize())
+    finally:
+        await receiver.stop()
+        logger.info('syslog %s', dict(receiver.counters))
@@ -25,3 +25,101 @@ def xsum(numbers):
 @shared_task()
 def test(arg):
     print(arg)
+
+
+@shared_task
+def expire_event_partitions():
+    """
+    按 EVENT_RETENTION_DAYS 删除过期的事件分区
+    """
+    from django.conf import settings
+    from django.utils import timezone
+    from datetime import timedelta
+    from firewall.models import SecEvent, SysEvent
+
+    expire_before = timezone.now() - timedelta(days=settings.EVENT_RETENTION_DAYS)
+    dropped = []
+    for model in (SecEvent, SysEvent):
+        if model.partitions.enabled:
+            dropped.extend(model.partitions.drop_before(expire_before))
+    if dropped:
+        logger.info('dropped event partitions: %s', ', '.join(dropped))
+    return dropped
+
+
+@shared_task
+def rollup_sec_events():
+    """
+    增量统计新入库的安全事件
+    """
+    from firewall.rollups import rollup_sec_events as rollup
+
+    count = rollup()
+    logger.info('rolled up %d sec events', count)
+    return count
+
+
+@shared_task
+def analyze_rules(kind):
+    """
+    规则遮蔽与冲突分析， 结果保存在 result backend 中
+    """
+    from firewall.analysis import analyze_rules as analyze
+
+    return analyze(kind)
+
+
+@shared_task
+def prune_strategy_versions():
+    """
+    清理 STRATEGY_VERSION_KEEP_DAYS 天以前的策略版本和删除记录
+    """
+    from django.conf import settings
+    from firewall.snapshots import prune
+
+    prune(settings.STRATEGY_VERSION_KEEP_DAYS)
+
+
+@shared_task
+def push_config_chunk(device_ids):
+    """
+    向一批设备推送策略， 返回每台设备的结果
+    """
+    from firewall.push import push_chunk
+
+    return push_chunk(device_ids)
+
+
+@shared_task
+def summarize_push(chunk_results):
+    from firewall.push import summarize
+
+    summary = summarize(chunk_results)
+    logger.info('config push finished: %(succeeded)d succeeded, %(failed)d failed', summary)
+    return summary
+
+
+@shared_task
+def sweep_heartbeats():
+    """
+    根据心跳更新设备在线状态
+    """
+    from firewall.heartbeat import sweep
+
+    online, offline = sweep()
+    if online or offline:
+        logger.info('heartbeat sweep: %d online, %d offline', online, offline)
+    return online, offline
+
+
+@shared_task
+def poll_fleet_status():
+    """
+    并发轮询设备版本和可达性
+    """
+    from firewall.poller import poll_fleet
+
+    summary = poll_fleet()
+    logger.info('fleet poll: %d/%d reachable, %d versions updated in %.1fs', summary['reachable'],
+                summary['total'], summary['version_updated'], summary['elapsed'])
+    return summary
@@ -1,41 +1,1036 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from celery import states
+from celery.result import EagerResult
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
 # Create your tests here.
+# 性能基准见 firewall/benchmarks.py， 运行 `python manage.py run_benchmarks`
+
+from firewall import analysis, arp, benchmarks, bundle, heartbeat, matcher, modbus, policies, poller, provisioning, \
+    push, rollups, search, snapshots
+from firewall.fakedevice import MALFORMED, FakeDeviceServer
+from firewall.ingest import ingest_events
+from firewall.partitions import TimePartitions
+from firewall.models import STATUS_ENABLE, BaseFirewallStrategy, BlackListStrategy, Firewall, \
+    IndustryProtocolDefaultConfStrategy, IndustryProtocolModbusStrategy, IndustryProtocolS7Strategy, IPMacBind, \
+    PolicyOverride, PolicyTemplate, RollupCheckpoint, SecEvent, SecEventRollup, StrategyVersion
+from firewall.syslog_receiver import SyslogReceiver
+from utils.core import metrics
+from utils.core.activity import ActivityTracker
+from utils.core.cache import get_generation, model_generation_name
+from utils.core.filters import build_match_query, can_match
+from utils.core.permissions import get_user_roles
+from utils.core.queries import QueryBudgetTestMixin, QueryCounter
+
+
+def reset_process_caches():
+    """
+    测试之间数据库会回滚而不发送 signal， 清空缓存的同时丢弃按数据版本号缓存的进程内结果
+    """
+    cache.clear()
+    matcher._matchers.clear()
+    modbus._evaluator = None
+    policies._resolver = None
+    policies._tables.clear()
+    bundle._local.clear()
+    heartbeat._store = None
+
+
+firewall_settings = override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CACHE_ALLOW_PROCESS_LOCAL=True,
+    FIREWALL_HEARTBEAT_STORE='local://',
+    EVENT_PARTITIONING=False,
+)
+
+
+@firewall_settings
+class FirewallTestCase(TestCase):
+    """
+    测试在单进程中运行， 使用进程内缓存
+    """
+
+    def setUp(self):
+        reset_process_caches()
+
+
+class BenchmarkTests(FirewallTestCase):
+
+    def test_measure(self):
+        calls = []
+        result = benchmarks.measure(lambda: calls.append(1), 5, items=100)
+        self.assertEqual(len(calls), 5)
+        self.assertEqual(result['repeat'], 5)
+        self.assertLessEqual(result['min_ms'], result['median_ms'])
+        self.assertLessEqual(result['median_ms'], result['p95_ms'])
+        self.assertIn('items_per_second', result)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'results': {'a': {'median_ms': 10.0}, 'b': {'median_ms': 10.0}, 'gone': {'median_ms': 1.0}}}
+        current = {'results': {'a': {'median_ms': 11.0}, 'b': {'median_ms': 13.0}, 'new': {'median_ms': 1.0}}}
+        rows = {row['name']: row for row in benchmarks.compare(baseline, current, threshold=0.2)}
+        self.assertEqual(set(rows), {'a', 'b'})
+        self.assertFalse(rows['a']['regression'])
+        self.assertTrue(rows['b']['regression'])
+        self.assertAlmostEqual(rows['b']['change'], 0.3)
+
+    def test_run_cases_small_scale(self):
+        sizes = benchmarks.scaled_sizes(0.01)
+        benchmarks.seed(sizes, 1)
+        results = benchmarks.run_cases(sizes, 1, repeat=1, only=('device_list', 'event_first_page', 'rule_match'))
+        self.assertEqual(set(results), {'device_list', 'event_first_page', 'rule_match'})
+
+
+class RoleCacheTests(FirewallTestCase):
+
+    def test_group_changes_invalidate_roles(self):
+        user = User.objects.create(username='operator')
+        group = Group.objects.create(name='Operator')
+        self.assertEqual(get_user_roles(User.objects.get(pk=user.pk)), frozenset())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.groups.add(group)
+            # 提交前仍使用缓存的结果
+            self.assertEqual(get_user_roles(User.objects.get(pk=user.pk)), frozenset())
+        self.assertEqual(get_user_roles(User.objects.get(pk=user.pk)), {'Operator'})
+        with self.captureOnCommitCallbacks(execute=True):
+            user.groups.remove(group)
+        self.assertEqual(get_user_roles(User.objects.get(pk=user.pk)), frozenset())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            group.user_set.add(user)
+        self.assertEqual(get_user_roles(User.objects.get(pk=user.pk)), {'Operator'})
+        with self.captureOnCommitCallbacks(execute=True):
+            group.user_set.clear()
+        self.assertEqual(get_user_roles(User.objects.get(pk=user.pk)), frozenset())
+
+
+class DeviceCacheTests(FirewallTestCase):
+
+    def test_bulk_provisioning_invalidates_device_list(self):
+        User.objects.create(username='owner')
+        client = APIClient()
+        self.assertEqual(client.get('/api/v1/firewall/').json()['count'], 0)
+
+        rows = [{'dev_code': 'FW{}'.format(i), 'dev_name': 'fw{}'.format(i), 'dev_location': 'room',
+                 'ip': '10.0.0.{}'.format(i + 1), 'responsible_user': 'owner'} for i in range(2)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/v1/firewall/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(client.get('/api/v1/firewall/').json()['count'], 2)
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'other'])
+    def test_device_list_conditional_requests(self):
+        owner = User.objects.create(username='owner')
+        device = Firewall.objects.create(dev_code='FW1', dev_name='fw', dev_location='room', ip='10.0.0.1',
+                                         responsible_user=owner)
+        client = APIClient()
+        response = client.get('/api/v1/firewall/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(client.get('/api/v1/firewall/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(client.get('/api/v1/firewall/', HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+        # 不同 host 的响应分开缓存
+        self.assertNotEqual(client.get('/api/v1/firewall/', HTTP_HOST='other')['ETag'], etag)
+
+        device.dev_name = 'renamed'
+        generation = get_generation(model_generation_name(Firewall))
+        with self.captureOnCommitCallbacks(execute=True):
+            device.save()
+            # 提交前版本号不变
+            self.assertEqual(get_generation(model_generation_name(Firewall)), generation)
+        response = client.get('/api/v1/firewall/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['dev_name'], 'renamed')
+
+
+class ProvisioningTests(FirewallTestCase):
+
+    def test_concurrent_duplicate_ip_reported_as_row_error(self):
+        owner = User.objects.create(username='owner')
+        rows = [{'dev_code': 'FW{}'.format(i), 'dev_name': 'fw{}'.format(i), 'dev_location': 'room',
+                 'ip': '10.0.0.{}'.format(i + 1), 'responsible_user': 'owner'} for i in range(3)]
+        validate = provisioning.validate_devices
+
+        def racing_validate(rows):
+            # 校验通过后另一个请求抢先写入了第 2 行的 ip
+            result = validate(rows)
+            Firewall.objects.create(dev_code='OTHER', dev_name='other', dev_location='room', ip='10.0.0.2',
+                                    responsible_user=owner)
+            return result
+
+        with mock.patch.object(provisioning, 'validate_devices', racing_validate):
+            result = provisioning.provision_devices(rows)
+        self.assertEqual(result['created'], 0)
+        self.assertEqual(result['errors'], [{'index': 1, 'errors': {'ip': [provisioning.IP_EXISTS]}}])
+        self.assertEqual(Firewall.objects.count(), 1)
+
+        Firewall.objects.all().delete()
+        with mock.patch.object(provisioning, 'validate_devices', racing_validate):
+            result = provisioning.provision_devices(rows, skip_invalid=True)
+        self.assertEqual((result['created'], result['failed']), (2, 1))
+        self.assertEqual(sorted(Firewall.objects.values_list('ip', flat=True)), ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+
+
+class ArpImportTests(FirewallTestCase):
+
+    def test_import_records_version_and_invalidates_caches(self):
+        since = StrategyVersion.objects.create().id
+        self.assertEqual(policies.load_table('firewall.ipmacbind'), {})
+
+        report = arp.compare([{'ip': '10.0.0.1', 'mac': '00:11:22:33:44:55', 'manufacturer': 'Siemens'}])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(arp.import_new(report), 1)
+
+        self.assertGreater(snapshots.current_version(), since)
+        delta = snapshots.build_delta(since)
+        self.assertEqual([row['ip'] for row in delta['changed']['firewall.ipmacbind']], ['10.0.0.1'])
+        self.assertEqual(list(policies.load_table('firewall.ipmacbind')),
+                         list(IPMacBind.objects.values_list('id', flat=True)))
+
+
+class StrategyDeltaTests(FirewallTestCase):
+
+    def setUp(self):
+        super(StrategyDeltaTests, self).setUp()
+        owner = User.objects.create(username='owner')
+        self.binds = [IPMacBind.objects.create(strategy_name='b', manufacturer='m', ip='10.0.0.{}'.format(i),
+                                               mac='00:11:22:33:44:0{}'.format(i), status=1) for i in range(3)]
+        self.template = PolicyTemplate.objects.create(name='base')
+        self.content_type = ContentType.objects.get_for_model(IPMacBind)
+        for bind in self.binds[:2]:
+            PolicyOverride.objects.create(template=self.template, content_type=self.content_type,
+                                          object_id=bind.pk, operation=PolicyOverride.OPERATION_INCLUDE)
+        self.device = Firewall.objects.create(dev_code='FW1', dev_name='fw', dev_location='room', ip='10.1.0.1',
+                                              responsible_user=owner, policy_template=self.template)
+        PolicyOverride.objects.create(firewall=self.device, content_type=self.content_type, object_id=self.binds[0].pk,
+                                      operation=PolicyOverride.OPERATION_MODIFY, data=json.dumps({'status': 0}))
+
+    def test_reused_id_is_not_reported_deleted(self):
+        since = snapshots.current_version()
+        pk, deleted_pk = self.binds[2].pk, self.binds[1].pk
+        self.binds[2].delete()
+        self.binds[1].delete()
+        IPMacBind.objects.create(pk=pk, strategy_name='b', manufacturer='m', ip='10.0.0.9', mac='00:11:22:33:44:09',
+                                 status=1)
+
+        delta = snapshots.build_delta(since)
+        self.assertIn(pk, [row['id'] for row in delta['changed']['firewall.ipmacbind']])
+        self.assertEqual(delta['deleted'], {'firewall.ipmacbind': [deleted_pk]})
+
+    def test_device_delta_follows_effective_policy(self):
+        since = snapshots.current_version()
+        for bind in self.binds:
+            bind.save()
+
+        delta = snapshots.build_delta(since, self.device)
+        self.assertFalse(delta['full'])
+        rows = delta['changed']['firewall.ipmacbind']
+        self.assertEqual([row['id'] for row in rows], [bind.pk for bind in self.binds[:2]])
+        self.assertEqual([row['status'] for row in rows], [0, 1])
+        self.assertEqual(len(snapshots.build_delta(since)['changed']['firewall.ipmacbind']), 3)
+
+        # 调整变化后设备取全量
+        since = snapshots.current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            PolicyOverride.objects.filter(firewall=self.device).delete()
+        delta = snapshots.build_delta(since, self.device)
+        self.assertTrue(delta['full'])
+        self.assertEqual([row['status'] for row in delta['changed']['firewall.ipmacbind']], [1, 1])
+
+    def test_changing_template_resets_config_version(self):
+        Firewall.objects.filter(pk=self.device.pk).update(config_version=snapshots.current_version())
+        device = Firewall.objects.get(pk=self.device.pk)
+        device.dev_name = 'renamed'
+        device.save()
+        self.assertNotEqual(Firewall.objects.get(pk=device.pk).config_version, 0)
+
+        device.policy_template = PolicyTemplate.objects.create(name='other')
+        device.save(update_fields=['policy_template'])
+        self.assertEqual(Firewall.objects.get(pk=device.pk).config_version, 0)
+
+    def test_view_filters_by_device(self):
+        since = snapshots.current_version()
+        self.binds[2].save()
+        response = APIClient().get('/api/v1/firewall/strategies/delta/',
+                                   {'since': since, 'firewall': self.device.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(self.binds[2].pk, [row['id'] for row in json.loads(response.content)['changed']
+                                           .get('firewall.ipmacbind', ())])
+        response = APIClient().get('/api/v1/firewall/strategies/delta/', {'since': since, 'firewall': 0})
+        self.assertEqual(response.status_code, 404)
+
+
+class BlackListSearchTests(FirewallTestCase):
+
+    def setUp(self):
+        super(BlackListSearchTests, self).setUp()
+        self.assertTrue(search.ensure_index())
+        for name, content in (('缓冲区溢出漏洞', '远程代码执行'), ('SQL注入', 'login 页面参数未过滤'),
+                              ('Weak password', 'default credentials')):
+            BlackListStrategy.objects.create(strategy_name='s', vulnerability_name=name, publish_time=timezone.now(),
+                                             level=1, event_process=1, content=content, status=1)
+
+    def search(self, term):
+        response = APIClient().get('/api/v1/firewall/blacklist/', {'search': term})
+        return sorted(item['vulnerability_name'] for item in response.json()['results'])
+
+    def test_chinese_substrings(self):
+        self.assertEqual(search.index_tokenizer(), search.FTS_TOKENIZER)
+        self.assertEqual(self.search('溢出'), ['缓冲区溢出漏洞'])
+        self.assertEqual(self.search('注入'), ['SQL注入'])
+        self.assertEqual(self.search('缓冲区'), ['缓冲区溢出漏洞'])
+        self.assertEqual(self.search('区溢出漏'), ['缓冲区溢出漏洞'])
+
+    def test_ascii_terms(self):
+        self.assertEqual(self.search('passw'), ['Weak password'])
+        self.assertEqual(self.search('SQL login'), ['SQL注入'])
+        self.assertEqual(self.search('sql weak'), [])
+
+    def test_match_query(self):
+        self.assertTrue(can_match(['缓冲区', 'SQL'], 'trigram'))
+        self.assertFalse(can_match(['溢出'], 'trigram'))
+        self.assertFalse(can_match(['溢出漏洞'], 'unicode61'))
+        self.assertTrue(can_match(['sql'], 'unicode61'))
+        self.assertEqual(build_match_query(['缓冲区', 'sql'], 'trigram'), '"缓冲区" "sql"')
+        self.assertEqual(build_match_query(['sql'], 'unicode61'), '"sql"*')
+
+
+class PolicyBundleTests(FirewallTestCase):
+
+    def setUp(self):
+        super(PolicyBundleTests, self).setUp()
+        for i, reg_value in enumerate((None, 7)):
+            IndustryProtocolModbusStrategy.objects.create(
+                strategy_name='m', rule_id=i + 1, rule_name='读保持寄存器', func_code=3, reg_start=100 * i,
+                reg_end=100 * i + 9, reg_value=reg_value, length=1, action=1, logging=0)
+        IndustryProtocolS7Strategy.objects.create(strategy_name='s', rule_id=1, rule_name='s7', functype='read',
+                                                  pdu_type='job', action=0, status=1)
+        self.default = IndustryProtocolDefaultConfStrategy.objects.create(strategy_name='d', OPC_default_action=1,
+                                                                          modbus_default_action=0)
+
+    def test_round_trip(self):
+        data = bundle.build_bundle()
+        decoded = bundle.decode_bundle(data)
+        fields = ('rule_id', 'rule_name', 'func_code', 'reg_start', 'reg_end', 'reg_value', 'length', 'action',
+                  'logging')
+        self.assertEqual(decoded['industryprotocolmodbusstrategy'],
+                         list(IndustryProtocolModbusStrategy.objects.order_by('pk').values(*fields)))
+        self.assertEqual(decoded['industryprotocols7strategy'][0]['functype'], 'read')
+        self.assertEqual(decoded['industryprotocoldefaultconfstrategy'][0]['OPC_default_action'], 1)
+
+        with self.assertRaises(bundle.BundleError):
+            bundle.decode_bundle(data[:-1] + bytes([data[-1] ^ 1]))
+
+    def test_digest_is_deterministic(self):
+        first = bundle.build_bundle()
+        reset_process_caches()
+        self.assertEqual(bundle.build_bundle(), first)
+        # 其他策略的变更不影响打包结果
+        IPMacBind.objects.create(strategy_name='b', manufacturer='m', ip='10.0.0.1', mac='00:11:22:33:44:55',
+                                 status=1)
+        self.assertEqual(bundle.build_bundle(), first)
+
+    def test_download(self):
+        client = APIClient()
+        response = client.get('/api/v1/firewall/policies/bundle/')
+        self.assertEqual(response.status_code, 302)
+        url = response['Location']
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # 其他进程（清空进程内缓存）重定向到同一地址
+        data = response.content
+        bundle._local.clear()
+        self.assertEqual(client.get('/api/v1/firewall/policies/bundle/')['Location'], url)
+
+        # 策略变化后新地址不同， 旧地址在缓存过期前内容不变
+        self.default.modbus_default_action = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.default.save()
+        self.assertNotEqual(client.get('/api/v1/firewall/policies/bundle/')['Location'], url)
+        self.assertEqual(client.get(url).content, data)
+        self.assertEqual(client.get('/api/v1/firewall/policies/bundle/{}/'.format('0' * 64)).status_code, 404)
+        self.assertEqual(client.get('/api/v1/firewall/policies/bundle/bad/').status_code, 404)
+
+
+class IngestTests(FirewallTestCase):
+
+    def row(self, **values):
+        row = {'src_ip': '10.0.0.1', 'dst_ip': '10.0.0.2', 'protocol': 'tcp', 'occurred_time': '2026-10-18T12:00:00Z',
+               'status': 1, 'risk_level': 2, 'action': 0, 'rule_id': 7}
+        row.update(values)
+        return row
+
+    def test_invalid_values_are_row_errors(self):
+        rows = [self.row(), self.row(occurred_time='2026-02-30T12:00:00Z'), self.row(rule_id=1.7),
+                self.row(rule_id=10 ** 20), self.row(rule_id=float('inf')), self.row(rule_id=2.0)]
+        result = ingest_events(SecEvent, rows)
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([error['index'] for error in result['errors']], [1, 2, 3, 4])
+        self.assertIn('occurred_time', result['errors'][0]['errors'])
+        self.assertEqual(sorted(SecEvent.objects.values_list('rule_id', flat=True)), [2, 7])
+
+    def test_ndjson_errors_report_source_lines(self):
+        body = '\n'.join([json.dumps(self.row()), '', '{bad', '', json.dumps(self.row(status=9))])
+        response = APIClient().post('/api/v1/firewall/sec-events/ingest/', body,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        errors = response.json()['errors']
+        self.assertEqual([(error['index'], error['line']) for error in errors], [(1, 3), (2, 5)])
+
+
+@firewall_settings
+class SyslogReceiverTests(TransactionTestCase):
+    """
+    写入在接收器的线程中进行， 使用 TransactionTestCase 让数据对该线程可见
+    """
+
+    def setUp(self):
+        reset_process_caches()
+
+    async def receive(self, receiver, tcp_lines, udp_lines):
+        await receiver.start()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.sendto('\n'.join(udp_lines).encode('utf-8'), ('127.0.0.1', receiver.udp_port))
+        sock.close()
+        reader, writer = await asyncio.open_connection('127.0.0.1', receiver.tcp_port)
+        for line in tcp_lines:
+            writer.write(line.encode('utf-8') + b'\n')
+            await writer.drain()
+        writer.close()
+        while receiver.counters['received'] < len(tcp_lines) + len(udp_lines):
+            await asyncio.sleep(0.01)
+        await receiver.stop()
+
+    def test_bad_lines_are_rejected_one_by_one(self):
+        line = '<134>Oct 18 12:00:00 fw01 secevent: src_ip=10.0.0.1 dst_ip=10.0.0.2 protocol=TCP status=1 ' \
+               'risk_level=2 action=1 rule_id={} occurred_time={}'
+        tcp_lines = [line.format(1, '2026-02-30T12:00:00Z'), line.format(10 ** 20, '2026-10-18T12:00:00Z'),
+                     line.format(2, '2026-10-18T12:00:00Z'), 'not an event']
+        udp_lines = [line.format(3, '2026-10-18T12:00:00Z'), line.format(1.5, '2026-10-18T12:00:00Z')]
+        receiver = SyslogReceiver(host='127.0.0.1', udp_port=0, tcp_port=0, flush_interval=0.05)
+        asyncio.run(self.receive(receiver, tcp_lines, udp_lines))
+        self.assertEqual(receiver.counters['invalid'], 4)
+        self.assertEqual(receiver.counters['written'], 2)
+        self.assertEqual(sorted(SecEvent.objects.values_list('rule_id', flat=True)), [2, 3])
+
+    def test_failed_batch_is_written_row_by_row(self):
+        receiver = SyslogReceiver()
+        values = {'src_ip': '10.0.0.1', 'dst_ip': '10.0.0.2', 'protocol': 'tcp', 'occurred_time': timezone.now(),
+                  'status': 1, 'risk_level': 2, 'action': 0}
+        # 未经校验的值， 模拟整批写入失败
+        with self.assertLogs('firewall.syslog_receiver', 'WARNING'):
+            receiver._write([(SecEvent, dict(values, rule_id=1)), (SecEvent, dict(values, rule_id=10 ** 20)),
+                             (SecEvent, dict(values, rule_id=2))])
+        receiver._executor.shutdown()
+        self.assertEqual(receiver.counters['written'], 2)
+        self.assertEqual(receiver.counters['failed'], 1)
+        self.assertEqual(sorted(SecEvent.objects.values_list('rule_id', flat=True)), [1, 2])
+
+
+class ActivityTrackerTests(FirewallTestCase):
+
+    @override_settings(INACTIVITY_TIMEOUT=1800)
+    def test_idle_after_local_records_are_pruned(self):
+        tracker = ActivityTracker(interval=60)
+        tracker.touch('a', now=1000)
+        tracker.flush(now=1000)
+        self.assertFalse(tracker.is_idle('a', 1800, now=2000))
+
+        # 其他 key 的活动触发清理， 'a' 的进程内记录被删除后仍按缓存中的记录判断
+        tracker.touch('b', now=1000 + 3600)
+        self.assertNotIn('a', tracker._seen)
+        self.assertTrue(tracker.is_idle('a', 1800, now=1000 + 3600))
+
+    def test_missing_record_uses_persisted_time(self):
+        tracker = ActivityTracker(interval=60)
+        self.assertTrue(tracker.is_idle('new', 1800, now=5000))
+        self.assertTrue(tracker.is_idle('new', 1800, now=5000, since=lambda: None))
+        self.assertFalse(tracker.is_idle('new', 1800, now=5000, since=lambda: 4000))
+        self.assertTrue(tracker.is_idle('new', 1800, now=5000, since=lambda: 1000))
+
+    def test_pending_touches_are_flushed_without_later_requests(self):
+        tracker = ActivityTracker(interval=0.2)
+        tracker.touch('a')
+        self.assertIsNone(cache.get('a'))
+        deadline = time.time() + 2
+        while cache.get('a') is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(tracker._timer)
+
+
+@override_settings(EVENT_PARTITIONING=True, EVENT_PARTITION_INTERVAL='day')
+@firewall_settings
+class PartitionedEventTests(TransactionTestCase):
+    """
+    SQLite 不能在事务中建表， 分区表在测试结束时删除
+    """
+
+    def setUp(self):
+        reset_process_caches()
+        self.client = APIClient()
+        start = datetime.datetime(2026, 10, 1, 12, tzinfo=datetime.timezone.utc)
+        # 开启分区前写入主表的数据
+        SecEvent.objects.create(src_ip='10.0.0.1', dst_ip='10.0.0.2', occurred_time=start - datetime.timedelta(days=1),
+                                status=1, risk_level=0, action=0, rule_id=0)
+        rows = [{'src_ip': '10.0.0.1', 'dst_ip': '10.0.0.2', 'status': 1, 'risk_level': 0, 'action': 0,
+                 'rule_id': i + 1, 'occurred_time': (start + datetime.timedelta(hours=10 * i)).isoformat()}
+                for i in range(6)]
+        response = self.client.post('/api/v1/firewall/sec-events/ingest/', rows, format='json')
+        self.assertEqual(response.json()['created'], 6)
+
+    def tearDown(self):
+        SecEvent.partitions.drop_before(datetime.datetime.max.replace(tzinfo=datetime.timezone.utc))
+
+    def test_list_reads_partitions(self):
+        self.assertEqual(SecEvent.objects.count(), 1)
+        self.assertEqual(len(SecEvent.partitions.existing_keys()), 3)
+
+        seen = []
+        url = '/api/v1/firewall/sec-events/?page_size=2&with_count=true'
+        while url:
+            data = self.client.get(url).json()
+            self.assertEqual(data['count'], 7)
+            seen.extend(item['rule_id'] for item in data['results'])
+            url = data['next']
+        self.assertEqual(seen, [6, 5, 4, 3, 2, 1, 0])
+        previous = self.client.get(data['previous']).json()
+        self.assertEqual([item['rule_id'] for item in previous['results']], [2, 1])
+
+        data = self.client.get('/api/v1/firewall/sec-events/', {'start': '2026-10-02T00:00:00Z'}).json()
+        self.assertEqual([item['rule_id'] for item in data['results']], [6, 5, 4, 3])
+
+    def test_export_prunes_partitions(self):
+        response = self.client.get('/api/v1/firewall/sec-events/export/',
+                                   {'fmt': 'ndjson', 'start': '2026-10-02T00:00:00Z', 'end': '2026-10-03T00:00:00Z'})
+        with CaptureQueriesContext(connection) as queries:
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['rule_id'] for row in rows], [3, 4])
+        tables = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('firewall_secevent_p20261002', tables)
+        self.assertNotIn('firewall_secevent_p20261001', tables)
+        self.assertNotIn('firewall_secevent_p20261003', tables)
+
+
+    def test_ids_are_shared_across_tables(self):
+        ids = list(SecEvent.objects.values_list('id', flat=True))
+        for qs in SecEvent.partitions.querysets():
+            ids.extend(qs.values_list('id', flat=True))
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(sorted(ids), list(range(ids[0], ids[0] + 7)))
+
+    def test_concurrent_partition_creation(self):
+        partitions = SecEvent.partitions
+        key = partitions.existing_keys()[0]
+        partitions._created.discard(key)
+        # 检查时分区还不存在， 建表时已被其他进程创建
+        with mock.patch.object(TimePartitions, 'existing_keys', side_effect=[[], [key]]):
+            self.assertIs(partitions.ensure(key), partitions.get_model(key))
+        self.assertIn(key, partitions._created)
+
+
+class RollupTests(FirewallTestCase):
+
+    def create_events(self, count, start):
+        SecEvent.objects.bulk_create([
+            SecEvent(src_ip='10.0.0.1', dst_ip='10.0.0.2', occurred_time=start + datetime.timedelta(minutes=i),
+                     status=1, risk_level=i % 2, action=0, rule_id=1) for i in range(count)])
+
+    def test_incremental_rollup(self):
+        start = datetime.datetime(2026, 10, 18, 12, tzinfo=datetime.timezone.utc)
+        self.create_events(5, start)
+        self.assertEqual(rollups.rollup_sec_events(batch_size=2), 5)
+        self.assertEqual(rollups.rollup_sec_events(batch_size=2), 0)
+        self.create_events(3, start)
+        self.assertEqual(rollups.rollup_sec_events(batch_size=2), 3)
+
+        checkpoint = RollupCheckpoint.objects.get(name='secevent_rollup:firewall_secevent')
+        self.assertEqual(checkpoint.position, SecEvent.objects.order_by('-id').values_list('id', flat=True)[0])
+        hour = SecEventRollup.objects.filter(granularity=SecEventRollup.GRANULARITY_HOUR)
+        self.assertEqual(sorted(hour.values_list('risk_level', 'count')), [(0, 5), (1, 3)])
+
+    def test_requires_sqlite(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'), self.assertRaises(ImproperlyConfigured):
+            rollups.rollup_sec_events()
+        self.assertFalse(RollupCheckpoint.objects.exists())
+
+
+class MetricsRegistryTests(FirewallTestCase):
+
+    def setUp(self):
+        super(MetricsRegistryTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def observe(self, registry, count):
+        for _ in range(count):
+            registry.observe('sec-events', 'GET', 200, 0.01, 1, 0.001, 10)
+        registry.flush()
+
+    def test_forked_children_write_their_own_files(self):
+        registry = metrics.MetricsRegistry(directory=self.directory)
+        self.observe(registry, 2)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.observe(registry, 3)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.observe(registry, 1)
+
+        # 子进程已退出， 它的文件被合并进 merged.json
+        series = metrics.collect(self.directory)
+        self.assertEqual(series[('sec-events', 'GET', '200')][0], 6)
+        self.assertEqual(sorted(name for name in os.listdir(self.directory) if name.endswith('.json')),
+                         sorted([metrics.MERGED_FILENAME, registry.filename]))
+
+    def test_dead_process_files_are_merged(self):
+        dead = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], stdout=subprocess.PIPE)
+        for name in ('{}-aaaa.json'.format(int(dead.stdout)), metrics.MERGED_FILENAME):
+            with open(os.path.join(self.directory, name), 'w') as f:
+                json.dump([['sec-events', 'GET', '200', 4] + [0] * 15], f)
+        self.assertEqual(metrics.collect(self.directory)[('sec-events', 'GET', '200')][0], 8)
+        self.assertEqual(metrics.collect(self.directory)[('sec-events', 'GET', '200')][0], 8)
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith('.json')],
+                         [metrics.MERGED_FILENAME])
+
+
+class PushTests(FirewallTestCase):
+
+    def setUp(self):
+        super(PushTests, self).setUp()
+        owner = User.objects.create(username='owner')
+        self.template = PolicyTemplate.objects.create(name='base')
+        self.binds = [IPMacBind.objects.create(strategy_name='b', manufacturer='m', ip='10.0.0.{}'.format(i),
+                                               mac='00:11:22:33:44:0{}'.format(i), status=1) for i in range(3)]
+        content_type = ContentType.objects.get_for_model(IPMacBind)
+        PolicyOverride.objects.create(template=self.template, content_type=content_type,
+                                      operation=PolicyOverride.OPERATION_INCLUDE)
+        # 第 4 台设备没有模板， 使用全部策略
+        self.devices = [Firewall.objects.create(dev_code='FW{}'.format(i), dev_name='fw', dev_location='room',
+                                                ip='127.0.0.{}'.format(i + 1), responsible_user=owner,
+                                                status=Firewall.ONLINE,
+                                                policy_template=self.template if i < 3 else None)
+                        for i in range(4)]
+        PolicyOverride.objects.create(firewall=self.devices[2], content_type=content_type,
+                                      object_id=self.binds[0].pk, operation=PolicyOverride.OPERATION_EXCLUDE)
+        self.server = FakeDeviceServer(('0.0.0.0', 0)).start()
+        self.addCleanup(self.server.stop)
+
+    def push(self, devices, statuses=None):
+        self.server.statuses = statuses or {}
+        self.server.configs.clear()
+        with override_settings(FIREWALL_AGENT_PORT=self.server.port, FIREWALL_PUSH_BACKOFF=0):
+            return {result['id']: result for result in push.push_chunk([device.pk for device in devices])}
+
+    def binds_of(self, ip):
+        return [row['id'] for row in self.server.configs[ip]['changed'].get('firewall.ipmacbind', ())]
+
+    def test_push_effective_policy_and_retry_only_transient_errors(self):
+        results = self.push(self.devices, {'127.0.0.1': [503], '127.0.0.2': [400], '127.0.0.4': [MALFORMED]})
+
+        first, second, third, fourth = self.devices
+        self.assertEqual((results[first.pk]['ok'], results[first.pk]['attempts']), (True, 2))
+        self.assertEqual((results[second.pk]['ok'], results[second.pk]['attempts']), (False, 1))
+        self.assertEqual((results[third.pk]['ok'], results[third.pk]['attempts']), (True, 1))
+        self.assertEqual((results[fourth.pk]['ok'], results[fourth.pk]['attempts']), (True, 2))
+        self.assertEqual(set(Firewall.objects.filter(config_version=snapshots.current_version())
+                             .values_list('id', flat=True)), {first.pk, third.pk, fourth.pk})
+
+        self.assertTrue(self.server.configs['127.0.0.1']['full'])
+        self.assertEqual(self.binds_of('127.0.0.1'), [bind.pk for bind in self.binds])
+        self.assertEqual(self.binds_of('127.0.0.3'), [bind.pk for bind in self.binds[1:]])
+        self.assertEqual(self.server.configs['127.0.0.3']['template'], self.template.pk)
+        self.assertEqual(self.binds_of('127.0.0.4'), [bind.pk for bind in self.binds])
+        self.assertIsNone(self.server.configs['127.0.0.4']['template'])
+
+    def test_devices_without_template_keep_delta_sync(self):
+        self.push(self.devices)
+        deleted_pk = self.binds[0].pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.binds[0].delete()
+            self.binds[1].save()
+        devices = list(Firewall.objects.filter(pk__in=[device.pk for device in self.devices[3:]]))
+        self.push(devices)
+
+        config = self.server.configs['127.0.0.4']
+        self.assertFalse(config['full'])
+        self.assertIn(self.binds[1].pk, self.binds_of('127.0.0.4'))
+        self.assertEqual(config['deleted'], {'firewall.ipmacbind': [deleted_pk]})
+
+        # 模板删除后设备回到全部策略， 而不是清空
+        with self.captureOnCommitCallbacks(execute=True):
+            self.template.delete()
+        self.push(self.devices[:1])
+        self.assertTrue(self.server.configs['127.0.0.1']['full'])
+        self.assertEqual(self.binds_of('127.0.0.1'), [bind.pk for bind in self.binds[1:]])
+
+
+class TaskResultTests(FirewallTestCase):
+
+    def test_non_dict_result(self):
+        with mock.patch('firewall.views.AsyncResult', lambda task_id: EagerResult(task_id, 3, states.SUCCESS)):
+            response = APIClient().get('/api/v1/firewall/tasks/abc/')
+        self.assertEqual(response.json(), {'status': states.SUCCESS, 'result': 3})
+
+        with mock.patch('firewall.views.AsyncResult',
+                        lambda task_id: EagerResult(task_id, {'rule_count': 0}, states.SUCCESS)):
+            response = APIClient().get('/api/v1/firewall/tasks/abc/')
+        self.assertEqual(response.json(), {'rule_count': 0, 'status': states.SUCCESS})
+
+
+@firewall_settings
+class ListQueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    """
+    列表接口的查询条数不随数据量增长
+    """
+
+    def setUp(self):
+        reset_process_caches()
+
+    def create_data(self, count):
+        start = User.objects.count()
+        owners = [User.objects.create(username='owner{}'.format(start + i)) for i in range(count)]
+        template = PolicyTemplate.objects.create(name='t{}'.format(start))
+        content_type = ContentType.objects.get_for_model(IPMacBind)
+        for i, owner in enumerate(owners):
+            n = start + i
+            device = Firewall.objects.create(dev_code='FW{}'.format(n), dev_name='fw', dev_location='room',
+                                             ip='10.1.{}.{}'.format(n // 250, n % 250 + 1), responsible_user=owner,
+                                             policy_template=template)
+            PolicyOverride.objects.create(firewall=device, content_type=content_type,
+                                          operation=PolicyOverride.OPERATION_EXCLUDE)
+            BlackListStrategy.objects.create(strategy_name='s', vulnerability_name='v{}'.format(n),
+                                             publish_time=timezone.now(), level=1, event_process=1, content='c',
+                                             status=1)
+        SecEvent.objects.bulk_create([
+            SecEvent(src_ip='10.0.0.1', dst_ip='10.0.0.2', status=1, risk_level=0, action=0, rule_id=i)
+            for i in range(count)])
+
+    def count_queries(self, url):
+        cache.clear()
+        with QueryCounter() as counter:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return counter.count
+
+    def test_list_budgets(self):
+        budgets = {
+            '/api/v1/firewall/': 2,
+            '/api/v1/firewall/sec-events/': 1,
+            '/api/v1/firewall/blacklist/': 2,
+            '/api/v1/firewall/policy-overrides/': 2,
+        }
+        self.create_data(2)
+        small = {url: self.count_queries(url) for url in budgets}
+        self.create_data(10)
+        for url, budget in budgets.items():
+            with self.assertQueryBudget(budget):
+                cache.clear()
+                self.client.get(url)
+            self.assertEqual(self.count_queries(url), small[url], url)
+
+
+class QueryCountMiddlewareTests(FirewallTestCase):
+
+    def test_streaming_queries_are_counted(self):
+        SecEvent.objects.create(src_ip='10.0.0.1', dst_ip='10.0.0.2', status=1, risk_level=0, action=0, rule_id=1)
+        with self.assertLogs('utils.middlewares', 'DEBUG') as logs:
+            response = APIClient().get('/api/v1/firewall/sec-events/export/')
+            self.assertEqual(logs.output, [])
+            content = b''.join(response.streaming_content)
+        self.assertEqual(len(content.splitlines()), 2)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('GET SecEventView.export: 1 queries', logs.output[0])
+
+
+class KeysetPaginationTests(FirewallTestCase):
+
+    def setUp(self):
+        super(KeysetPaginationTests, self).setUp()
+        start = datetime.datetime(2026, 10, 18, 12, tzinfo=datetime.timezone.utc)
+        # 同一时间的多条事件， 游标需要用 id 区分
+        SecEvent.objects.bulk_create([
+            SecEvent(src_ip='10.0.0.1', dst_ip='10.0.0.2', occurred_time=start + datetime.timedelta(seconds=i // 3),
+                     status=1, risk_level=0, action=0, rule_id=i) for i in range(10)])
+        self.expected = list(SecEvent.objects.order_by('-occurred_time', '-id').values_list('id', flat=True))
+
+    def test_walk_forward_and_back(self):
+        client = APIClient()
+        pages = []
+        data = client.get('/api/v1/firewall/sec-events/', {'page_size': 3}).json()
+        self.assertIsNone(data['previous'])
+        self.assertIsNone(data['count'])
+        while True:
+            pages.append([item['id'] for item in data['results']])
+            if not data['next']:
+                break
+            data = client.get(data['next']).json()
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+
+        for page in reversed(pages[:-1]):
+            data = client.get(data['previous']).json()
+            self.assertEqual([item['id'] for item in data['results']], page)
+        self.assertIsNone(data['previous'])
+
+    def test_count_and_invalid_cursor(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/v1/firewall/sec-events/', {'with_count': 'true'}).json()['count'], 10)
+        self.assertEqual(client.get('/api/v1/firewall/sec-events/', {'cursor': 'bad'}).status_code, 404)
+
+
+class RandomRulesMixin(object):
+    """
+    随机生成的规则， 用于比较索引实现与逐条比较的结果
+    """
+
+    def setUp(self):
+        super(RandomRulesMixin, self).setUp()
+        self.random = random.Random(7)
+
+    def choice(self, *values):
+        return self.random.choice(values)
+
+    def firewall_rules(self, count):
+        rule_ids = self.random.sample(range(1, count * 10), count)
+        return [matcher.Rule(rule_id=rule_id, pk=pk, src_ip=self.choice('10.0.0.1', '10.0.0.2'), dst_ip='10.0.1.1',
+                             src_port=self.choice(None, 1000, 1001), dst_port=self.choice(None, 80, 502),
+                             protocol=self.choice(None, 'tcp', 'udp'), action=self.choice(0, 1))
+                for pk, rule_id in enumerate(rule_ids, 1)]
+
+
+class RuleMatcherTests(RandomRulesMixin, TestCase):
+
+    def test_matches_brute_force(self):
+        rules = self.firewall_rules(60)
+        compiled = matcher.CompiledMatcher(rules)
+        for _ in range(500):
+            packet = (self.choice('10.0.0.1', '10.0.0.2', '10.0.0.3'), '10.0.1.1', self.choice(None, 1000, 1001, 1002),
+                      self.choice(None, 80, 502, 8080), self.choice(None, 'tcp', 'udp'))
+            src_ip, dst_ip, src_port, dst_port, protocol = packet
+            candidates = [rule for rule in rules if rule.src_ip == src_ip and rule.dst_ip == dst_ip
+                          and rule.src_port in (None, src_port) and rule.dst_port in (None, dst_port)
+                          and rule.protocol in (None, protocol)]
+            expected = min(candidates, key=lambda rule: rule.rule_id) if candidates else None
+            self.assertEqual(compiled.match(*packet), expected, packet)
+            self.assertEqual(next(compiled.match_many([packet])), expected, packet)
+
+
+
+class RuleMatcherChangeTests(FirewallTestCase):
+
+    def match(self):
+        return matcher.match_rule(matcher.KIND_FIREWALL, '10.0.0.1', '10.0.0.2', 1000, 80, 'TCP')
+
+    def test_changes_apply_after_commit(self):
+        self.assertIsNone(self.match())
+        name = 'rule_matcher:{}'.format(matcher.KIND_FIREWALL)
+        generation = get_generation(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            rule = BaseFirewallStrategy.objects.create(strategy_name='s', rule_id=1, rule_name='r', src_ip='10.0.0.1',
+                                                       dst_ip='10.0.0.2', protocol='tcp', action=1,
+                                                       status=STATUS_ENABLE)
+            # 提交前其他进程看到的版本号不变
+            self.assertEqual(get_generation(name), generation)
+            self.assertIsNone(self.match())
+        self.assertEqual(self.match().rule_id, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.delete()
+            self.assertEqual(self.match().rule_id, 1)
+        self.assertIsNone(self.match())
+
+
+class RuleAnalysisTests(RandomRulesMixin, TestCase):
+
+    def test_matches_brute_force(self):
+        rules = self.firewall_rules(80)
+        covers = lambda earlier, rule: all(getattr(earlier, name) in (None, getattr(rule, name))
+                                           for name in analysis.DIMENSIONS)
+        overlaps = lambda earlier, rule: all(None in (getattr(earlier, name), getattr(rule, name))
+                                             or getattr(earlier, name) == getattr(rule, name)
+                                             for name in analysis.DIMENSIONS)
+        expected = {'shadowed': [], 'redundant': [], 'conflicts': []}
+        for rule in sorted(rules, key=lambda rule: rule.rule_id):
+            earlier = [other for other in rules if other.rule_id < rule.rule_id and other.src_ip == rule.src_ip
+                       and other.dst_ip == rule.dst_ip]
+            covering = [other for other in earlier if covers(other, rule)]
+            conflicting = [other for other in earlier if overlaps(other, rule) and other.action != rule.action]
+            if covering:
+                first = min(covering, key=lambda other: other.rule_id)
+                kind = 'redundant' if first.action == rule.action else 'shadowed'
+                expected[kind].append({'rule_id': rule.rule_id, 'by': first.rule_id})
+            elif conflicting:
+                first = min(conflicting, key=lambda other: other.rule_id)
+                expected['conflicts'].append({'rule_id': rule.rule_id, 'with': first.rule_id})
+
+        report = analysis.analyze(rules)
+        self.assertEqual(report['rule_count'], len(rules))
+        for name, items in expected.items():
+            self.assertTrue(items, name)
+            self.assertEqual(report[name], items, name)
+
+
+class ModbusEvaluatorTests(RandomRulesMixin, FirewallTestCase):
+
+    def test_matches_brute_force(self):
+        rule_ids = self.random.sample(range(1, 1000), 80)
+        rules = []
+        for rule_id in rule_ids:
+            start = self.random.randrange(0, 100)
+            rules.append(modbus.ModbusRule(rule_id=rule_id, func_code=self.choice(3, 6), reg_start=start,
+                                           reg_end=start + self.random.randrange(0, 20),
+                                           reg_value=self.choice(None, None, 1, 2), action=self.choice(0, 1)))
+        evaluator = modbus.ModbusEvaluator(rules)
+        for func_code in (3, 6, 16):
+            for address in range(-1, 125):
+                for value in (None, 1, 2, 3):
+                    candidates = [rule for rule in rules if rule.func_code == func_code
+                                  and rule.reg_start <= address <= rule.reg_end and rule.reg_value in (None, value)]
+                    expected = min(candidates, key=lambda rule: rule.rule_id) if candidates else None
+                    self.assertEqual(evaluator.evaluate(func_code, address, value), expected,
+                                     (func_code, address, value))
+
+    def test_register_range(self):
+        rule = IndustryProtocolModbusStrategy(strategy_name='modbus', rule_id=1, rule_name='r', func_code=3,
+                                              reg_start=20, reg_end=10, length=1, action=0, logging=0)
+        with self.assertRaises(ValidationError) as context:
+            rule.full_clean()
+        self.assertIn('reg_end', context.exception.message_dict)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            rule.save()
+        rule.reg_end = 20
+        rule.full_clean()
+        rule.save()
 
+    def test_rebuilds_after_commit(self):
+        self.assertEqual(modbus.evaluate_requests([(3, 5, None)]), [None])
+        with self.captureOnCommitCallbacks(execute=True):
+            IndustryProtocolModbusStrategy.objects.create(strategy_name='modbus', rule_id=1, rule_name='r',
+                                                          func_code=3, reg_start=0, reg_end=9, length=1, action=0,
+                                                          logging=0)
+            self.assertEqual(modbus.evaluate_requests([(3, 5, None)]), [None])
+        self.assertEqual([rule.rule_id for rule in modbus.evaluate_requests([(3, 5, None)])], [1])
 
-from timeit import timeit
-from io import StringIO
 
+class PolicyCopyOnWriteTests(FirewallTestCase):
 
-source = ['foo']*1000
+    def setUp(self):
+        super(PolicyCopyOnWriteTests, self).setUp()
+        owner = User.objects.create(username='owner')
+        self.parent = PolicyTemplate.objects.create(name='parent')
+        self.child = PolicyTemplate.objects.create(name='child', parent=self.parent)
+        self.binds = [IPMacBind.objects.create(strategy_name='b', manufacturer='m', ip='10.0.0.{}'.format(i),
+                                               mac='00:11:22:33:44:0{}'.format(i), status=1) for i in range(3)]
+        self.modbus = IndustryProtocolModbusStrategy.objects.create(
+            strategy_name='m', rule_id=1, rule_name='r', func_code=3, reg_start=0, reg_end=9, length=1, action=1,
+            logging=0)
+        bind_type = ContentType.objects.get_for_model(IPMacBind)
+        modbus_type = ContentType.objects.get_for_model(IndustryProtocolModbusStrategy)
+        PolicyOverride.objects.create(template=self.parent, content_type=bind_type,
+                                      operation=PolicyOverride.OPERATION_INCLUDE)
+        PolicyOverride.objects.create(template=self.parent, content_type=modbus_type,
+                                      operation=PolicyOverride.OPERATION_INCLUDE)
+        PolicyOverride.objects.create(template=self.child, content_type=bind_type, object_id=self.binds[2].pk,
+                                      operation=PolicyOverride.OPERATION_EXCLUDE)
+        self.devices = [Firewall.objects.create(dev_code='FW{}'.format(i), dev_name='fw', dev_location='room',
+                                                ip='10.1.0.{}'.format(i + 1), responsible_user=owner,
+                                                policy_template=self.child) for i in range(2)]
+        PolicyOverride.objects.create(firewall=self.devices[1], content_type=bind_type, object_id=self.binds[0].pk,
+                                      operation=PolicyOverride.OPERATION_MODIFY, data=json.dumps({'status': 0}))
 
+    def test_devices_share_unchanged_types(self):
+        parent = policies.template_policy(self.parent.pk)
+        child = policies.template_policy(self.child.pk)
+        plain, adjusted = (policies.effective_policy(device) for device in self.devices)
 
-def str_io():
-    buf = StringIO()
-    for i in source:
-        buf.write(i)
-    final = buf.getvalue()
+        self.assertEqual([row['id'] for row in parent['firewall.ipmacbind']], [bind.pk for bind in self.binds])
+        self.assertEqual([row['id'] for row in child['firewall.ipmacbind']], [bind.pk for bind in self.binds[:2]])
+        # 子模板只复制了调整过的类型
+        self.assertIs(child['firewall.industryprotocolmodbusstrategy'],
+                      parent['firewall.industryprotocolmodbusstrategy'])
 
+        # 没有调整的设备直接使用模板的结果， 有调整的设备只复制调整过的类型
+        self.assertIs(plain, child)
+        self.assertIs(adjusted['firewall.industryprotocolmodbusstrategy'],
+                      child['firewall.industryprotocolmodbusstrategy'])
+        self.assertEqual(adjusted['firewall.ipmacbind'][0]['status'], 0)
+        self.assertEqual(child['firewall.ipmacbind'][0]['status'], 1)
+        self.assertIs(adjusted['firewall.ipmacbind'][1], child['firewall.ipmacbind'][1])
 
-def str_join():
-    out = []
-    for i in source:
-        out.append(i)
-    # final = ''.join(out)
 
+class PollerTests(FirewallTestCase):
 
-def str_concat():
-    out = ""
-    for i in source:
-        out += i
+    def test_poll_fleet(self):
+        owner = User.objects.create(username='owner')
+        devices = [Firewall.objects.create(dev_code='FW{}'.format(i), dev_name='fw', dev_location='room',
+                                           ip='127.0.0.{}'.format(i + 1), responsible_user=owner, version='v1',
+                                           status=Firewall.ONLINE) for i in range(3)]
+        server = FakeDeviceServer(('0.0.0.0', 0), version='v1', statuses={'127.0.0.3': [500]},
+                                  versions={'127.0.0.1': 'v2'}).start()
+        self.addCleanup(server.stop)
+        with override_settings(FIREWALL_AGENT_PORT=server.port), self.captureOnCommitCallbacks(execute=True):
+            summary = poller.poll_fleet(timeout=2, jitter=0)
 
+        self.assertEqual((summary['total'], summary['reachable'], summary['unreachable']), (3, 2, 1))
+        self.assertEqual(summary['version_updated'], 1)
+        self.assertEqual(summary['failures'][0]['id'], devices[2].pk)
+        self.assertEqual(dict(Firewall.objects.values_list('id', 'version')),
+                         {devices[0].pk: 'v2', devices[1].pk: 'v1', devices[2].pk: 'v1'})
+        store = heartbeat.get_store()
+        self.assertIsNotNone(store.last_seen(devices[0].pk))
+        self.assertIsNone(store.last_seen(devices[2].pk))
+        self.assertEqual(server.configs, {})
 
-t = timeit('str_io()', 'from __main__ import str_io', number=10000)
-print(t)
 
-t = timeit('str_join()', 'from __main__ import str_join', number=10000)
-print(t)
-# 1000 loops, best of 3: 9.89 ms per loop
+class HeartbeatSweepTests(FirewallTestCase):
 
+    def test_sweep(self):
+        owner = User.objects.create(username='owner')
+        stale, fresh, unregistered = [
+            Firewall.objects.create(dev_code='FW{}'.format(i), dev_name='fw', dev_location='room',
+                                    ip='10.0.0.{}'.format(i + 1), responsible_user=owner, status=device_status)
+            for i, device_status in enumerate((Firewall.ONLINE, Firewall.OFFLINE, Firewall.NOT_REGISTERED))
+        ]
+        now = 100000
+        self.assertTrue(heartbeat.record_heartbeat(stale.pk, stale.register_code, timestamp=now - 200))
+        self.assertTrue(heartbeat.record_heartbeat(fresh.pk, fresh.register_code, timestamp=now - 10))
+        self.assertTrue(heartbeat.record_heartbeat(unregistered.pk, unregistered.register_code, timestamp=now - 10))
+        self.assertFalse(heartbeat.record_heartbeat(fresh.pk, 'wrong', timestamp=now))
 
-t = timeit('str_concat()', 'from __main__ import str_concat', number=10000)
-print(t)
+        self.assertEqual(heartbeat.sweep(timeout=90, now=now), (1, 1))
+        self.assertEqual(dict(Firewall.objects.values_list('id', 'status')), {
+            stale.pk: Firewall.OFFLINE, fresh.pk: Firewall.ONLINE, unregistered.pk: Firewall.NOT_REGISTERED})
+        # 状态没有变化时不再更新
+        self.assertEqual(heartbeat.sweep(timeout=90, now=now), (0, 0))
+        # 超过 10 倍超时时间的记录被清理
+        store = heartbeat.get_store()
+        self.assertIsNotNone(store.last_seen(stale.pk))
+        heartbeat.sweep(timeout=90, now=now + 1000)
+        self.assertIsNone(store.last_seen(stale.pk))
+        self.assertEqual(Firewall.objects.get(pk=fresh.pk).status, Firewall.OFFLINE)
@@ -4,8 +4,23 @@ from rest_framework.routers import DefaultRouter
 from firewall import views
 
 router = DefaultRouter()
+# 前缀为空的 FirewallDeviceView 必须最后注册， 否则其详情路由会吞掉其他前缀
+router.register('sec-events', views.SecEventView)
+router.register('sys-events', views.SysEventView)
+router.register('blacklist', views.BlackListStrategyView)
+router.register('policy-templates', views.PolicyTemplateView)
+router.register('policy-overrides', views.PolicyOverrideView)
 router.register('', views.FirewallDeviceView)
 
 urlpatterns = [
+    path('rules/match/', views.RuleMatchView.as_view()),
+    path('rules/analysis/', views.RuleAnalysisView.as_view()),
+    path('rules/modbus/evaluate/', views.ModbusEvaluateView.as_view()),
+    path('tasks/<str:task_id>/', views.TaskResultView.as_view()),
+    path('strategies/delta/', views.StrategyDeltaView.as_view()),
+    path('policies/bundle/', views.PolicyBundleView.as_view()),
+    path('policies/bundle/<str:digest>/', views.PolicyBundleView.as_view()),
+    path('heartbeat/', views.HeartbeatView.as_view()),
+    path('ip-mac/arp/', views.ArpCompareView.as_view()),
     path('', include(router.urls)),
 ]
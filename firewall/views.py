@@ -1,15 +1,46 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 
-from firewall.models import Firewall
-from firewall.serializers import FirewallSerializer, FirewallCreateSerializer
-from utils.core.mixins import MultiPermissionViewSetMixin, MultiSerializerViewSetMixin
+import gzip
+import json
+
+from celery.result import AsyncResult
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+
+from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
+
+from firewall import analysis, arp, bundle, export, heartbeat, matcher, modbus, policies, provisioning, push, rollups, \
+    snapshots
+from firewall.filters import SecEventFilter, SysEventFilter
+from firewall.ingest import INGEST_MAX_ROWS, ingest_events
+from firewall.models import BlackListStrategy, Firewall, PolicyOverride, PolicyTemplate, SecEvent, SysEvent
+from firewall.serializers import FirewallSerializer, FirewallCreateSerializer, SecEventRollupQuerySerializer, \
+    SecEventSerializer, SysEventSerializer, RuleMatchSerializer, RuleAnalysisSerializer, ConfigPushSerializer, \
+    HeartbeatSerializer, ArpCompareSerializer, BlackListStrategySerializer, ModbusEvaluateSerializer, \
+    PolicyTemplateSerializer, PolicyOverrideSerializer, PolicyAssignSerializer
+from firewall.search import FTS_TABLE
+from firewall.tasks import analyze_rules
+from utils.core.cache import touch_models
+from utils.core.filters import FullTextSearchFilter
+from utils.core.mixins import CachedResponseViewSetMixin, MultiPermissionViewSetMixin, MultiSerializerViewSetMixin, \
+    RelatedQuerysetViewSetMixin
+from utils.core.pagination import KeysetPagination
+from utils.core.parsers import NDJSONParser
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework.mixins import CreateModelMixin,ListModelMixin,RetrieveModelMixin
-from rest_framework.viewsets import GenericViewSet,ReadOnlyModelViewSet
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.viewsets import GenericViewSet,ModelViewSet,ReadOnlyModelViewSet
 # Create your views here.
 
 
-class FirewallDeviceView(MultiPermissionViewSetMixin, MultiSerializerViewSetMixin,
-                         CreateModelMixin, ListModelMixin, RetrieveModelMixin, GenericViewSet):
+class FirewallDeviceView(CachedResponseViewSetMixin, RelatedQuerysetViewSetMixin, MultiPermissionViewSetMixin,
+                         MultiSerializerViewSetMixin, CreateModelMixin, ListModelMixin, RetrieveModelMixin, GenericViewSet):
     a = 'hello'
     serializer_class = FirewallSerializer
     serializer_action_classes = {
@@ -17,5 +48,399 @@ class FirewallDeviceView(MultiPermissionViewSetMixin, MultiSerializerViewSetMixi
         'retrieve': FirewallSerializer,
         'create': FirewallCreateSerializer
     }
+    select_related_actions = {
+        'list': ('responsible_user',),
+        'retrieve': ('responsible_user',),
+    }
     queryset = Firewall.objects.all()
+    cache_models = (Firewall, User)
+
+    @action(detail=False, methods=['post'])
+    def push(self, request):
+        """
+        向设备下发策略， ids 为空时下发到全部已注册设备， 返回任务 id， 通过 tasks/<task_id>/ 查询汇总
+        """
+        serializer = ConfigPushSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = push.push_config_to_fleet(serializer.validated_data.get('ids'))
+        if result is None:
+            return Response({'detail': 'No device to push.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'task_id': result.id}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        批量导入设备， 请求体为设备 JSON 数组， 或以 file 字段上传 CSV/JSON 文件。
+        查询参数 skip_invalid=true 时跳过校验失败的行。
+        """
+        upload = request.FILES.get('file')
+        try:
+            if upload is not None:
+                fmt = upload.name.rsplit('.', 1)[-1].lower()
+                rows = provisioning.parse_devices(upload.read().decode('utf-8-sig'), fmt)
+            else:
+                rows = request.data
+                if not isinstance(rows, list):
+                    raise provisioning.ProvisionError('Expected a list of devices.')
+        except (provisioning.ProvisionError, UnicodeDecodeError) as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        skip_invalid = request.query_params.get('skip_invalid', '').lower() in ('1', 'true', 'yes')
+        result = provisioning.provision_devices(rows, skip_invalid=skip_invalid)
+        if result['errors'] and not result['created']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+    @action(detail=True)
+    def policy(self, request, pk=None):
+        """
+        设备的生效策略（模板继承并叠加设备自身的调整）
+        """
+        device = self.get_object()
+        return Response({
+            'template': device.policy_template_id,
+            'version': snapshots.current_version(),
+            'policy': policies.effective_policy(device),
+        })
+
+
+class BaseEventView(MultiSerializerViewSetMixin, ListModelMixin, GenericViewSet):
+    """
+    事件列表按 (occurred_time, id) 游标分页， 不做 COUNT(*) 和 OFFSET 扫描。
+    开启 EVENT_PARTITIONING 时列表和导出同时读取主表和分区表。
+
+    事件批量上报， POST 一个 JSON 数组或 NDJSON（Content-Type: application/x-ndjson），
+    校验通过的事件一次性入库， 校验失败的事件按行号返回错误。
+    """
+    parser_classes = (JSONParser, NDJSONParser)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-occurred_time', '-id')
+
+    def get_partitions(self):
+        partitions = getattr(self.get_queryset().model, 'partitions', None)
+        if partitions is not None and partitions.enabled:
+            return partitions
+        return None
+
+    def get_filtered_querysets(self):
+        """
+        主表和已开启分区时的分区表， 使用与列表相同的 filterset。
+        分区表是动态生成的模型， DjangoFilterBackend 会拒绝， 所以直接使用 filterset_class。
+        """
+        filterset = self.filterset_class(self.request.query_params, queryset=self.get_queryset(), request=self.request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        result = [filterset.qs]
+        partitions = self.get_partitions()
+        if partitions is None:
+            return result
+
+        # 只访问与 start / end 相交的分区
+        bounds = filterset.form.cleaned_data
+        for qs in partitions.querysets(bounds.get('start'), bounds.get('end')):
+            result.append(self.filterset_class(self.request.query_params, queryset=qs, request=self.request).qs)
+        return result
+
+    def list(self, request, *args, **kwargs):
+        """
+        开启分区后事件只写入分区表， 列表合并主表（开启分区前的数据）和各分区表分页
+        """
+        if self.get_partitions() is None:
+            return super(BaseEventView, self).list(request, *args, **kwargs)
+        page = self.paginator.paginate_querysets(self.get_filtered_querysets(), request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def export(self, request):
+        """
+        流式导出过滤后的全部事件， 按时间升序。
+        fmt=csv（默认）或 ndjson； gzip=true 时输出 gzip 压缩文件。
+        查询参数名不使用 format， 它被 DRF 用于选择 renderer。
+        """
+        fmt = request.query_params.get('fmt', export.FORMAT_CSV)
+        if fmt not in export.CONTENT_TYPES:
+            return Response({'fmt': ['Expected csv or ndjson.']}, status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+        fields = self.get_serializer_class().Meta.fields
+        stream = export.stream_export(self.get_filtered_querysets(), fields, fmt, compress)
+        filename = '{}.{}'.format(self.get_queryset().model._meta.model_name, fmt)
+        if compress:
+            response = StreamingHttpResponse(stream, content_type='application/gzip')
+            filename += '.gz'
+        else:
+            response = StreamingHttpResponse(stream, content_type=export.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+        return response
+
+    @action(detail=False, methods=['post'])
+    def ingest(self, request):
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = [rows]
+        if not isinstance(rows, list):
+            return Response({'detail': 'Expected a list of events.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > INGEST_MAX_ROWS:
+            return Response({'detail': 'Too many events, at most {} per request.'.format(INGEST_MAX_ROWS)},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        result = ingest_events(self.get_queryset().model, rows)
+        if result['errors'] and not result['created']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
+class SecEventView(BaseEventView):
+    serializer_class = SecEventSerializer
+    queryset = SecEvent.objects.all()
+    filterset_class = SecEventFilter
+
+    def _rollup_params(self, request):
+        serializer = SecEventRollupQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = dict(serializer.validated_data)
+        filters = {name: params.pop(name, None) for name in rollups.DIMENSIONS}
+        return params, filters
+
+    @action(detail=False)
+    def timeseries(self, request):
+        """
+        按时间段统计的事件数， 只查询预聚合表
+        """
+        params, filters = self._rollup_params(request)
+        return Response(rollups.timeseries(params['granularity'], params['start'], params['end'], **filters))
+
+    @action(detail=False)
+    def breakdown(self, request):
+        """
+        按 `by` 维度统计的事件数， 只查询预聚合表
+        """
+        params, filters = self._rollup_params(request)
+        if 'by' not in params:
+            return Response({'by': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(rollups.breakdown(params['by'], params['granularity'], params['start'], params['end'],
+                                          **filters))
+
+
+class SysEventView(BaseEventView):
+    serializer_class = SysEventSerializer
+    queryset = SysEvent.objects.all()
+    filterset_class = SysEventFilter
+
+
+class BlackListStrategyView(CachedResponseViewSetMixin, ReadOnlyModelViewSet):
+    """
+    漏洞黑名单， search 参数走全文索引并按相关度排序， 支持前缀匹配
+    """
+    serializer_class = BlackListStrategySerializer
+    queryset = BlackListStrategy.objects.all()
+    filter_backends = (DjangoFilterBackend, FullTextSearchFilter, OrderingFilter)
+    filterset_fields = ('level', 'event_process', 'status')
+    search_fields = ('vulnerability_name', 'content')
+    search_fts_table = FTS_TABLE
+    cache_models = (BlackListStrategy,)
+    ordering_fields = ('publish_time', 'created_time', 'level')
+
+
+class PolicyTemplateView(ModelViewSet):
+    """
+    策略模板， 删除有下级模板的模板会失败
+    """
+    serializer_class = PolicyTemplateSerializer
+    queryset = PolicyTemplate.objects.order_by('id')
+    filter_backends = (DjangoFilterBackend,)
+    filterset_fields = ('parent',)
+
+    def destroy(self, request, *args, **kwargs):
+        if self.get_object().children.exists():
+            return Response({'detail': 'Template has child templates.'}, status=status.HTTP_400_BAD_REQUEST)
+        return super(PolicyTemplateView, self).destroy(request, *args, **kwargs)
+
+    @action(detail=True)
+    def policy(self, request, pk=None):
+        """
+        模板解析后的策略
+        """
+        return Response({'version': snapshots.current_version(),
+                         'policy': policies.template_policy(self.get_object().pk)})
+
+    @action(detail=True, methods=['post'])
+    def assign(self, request, pk=None):
+        """
+        把设备切换到该模板， ids 为设备 id 列表
+        """
+        template = self.get_object()
+        serializer = PolicyAssignSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = Firewall.objects.filter(id__in=serializer.validated_data['ids']).update(policy_template=template)
+        # update() 不发送 signal， 手动使设备列表的响应缓存失效
+        touch_models(Firewall)
+        return Response({'updated': updated})
+
+
+class PolicyOverrideView(ModelViewSet):
+    """
+    模板或设备的策略调整， 可按 template / firewall / operation 过滤
+    """
+    serializer_class = PolicyOverrideSerializer
+    queryset = PolicyOverride.objects.select_related('content_type').order_by('id')
+    filter_backends = (DjangoFilterBackend,)
+    filterset_fields = ('template', 'firewall', 'operation')
+
+
+class RuleMatchView(APIView):
+    """
+    查询五元组命中的规则， 返回结果与 tuples 一一对应， 未命中为 null
+    """
+
+    def post(self, request):
+        serializer = RuleMatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tuples = [tuple(item) for item in serializer.validated_data['tuples']]
+        try:
+            rules = matcher.match_rules(serializer.validated_data['kind'], tuples)
+        except (TypeError, ValueError) as exc:
+            return Response({'tuples': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response([
+            None if rule is None else {'rule_id': rule.rule_id, 'action': rule.action}
+            for rule in rules
+        ])
+
+
+class ModbusEvaluateView(APIView):
+    """
+    按 Modbus 规则评估请求， 返回结果与 requests 一一对应， 未命中为 null
+    """
+
+    def post(self, request):
+        serializer = ModbusEvaluateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rules = modbus.evaluate_requests(tuple(item) for item in serializer.validated_data['requests'])
+        return Response([
+            None if rule is None else {'rule_id': rule.rule_id, 'action': rule.action}
+            for rule in rules
+        ])
+
+
+class RuleAnalysisView(APIView):
+    """
+    规则遮蔽/冗余/冲突分析。 POST 提交分析任务， 返回 task_id， 之后通过 tasks/<task_id>/ 取结果；
+    规则较少时可以传 sync=true 直接返回报告。
+    """
+
+    def post(self, request):
+        serializer = RuleAnalysisSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        kind = serializer.validated_data['kind']
+        if serializer.validated_data['sync']:
+            return Response(analysis.analyze_rules(kind))
+        result = analyze_rules.delay(kind)
+        return Response({'task_id': result.id}, status=status.HTTP_202_ACCEPTED)
+
+
+class TaskResultView(APIView):
+    """
+    查询异步任务的状态和结果
+    """
+
+    def get(self, request, task_id):
+        result = AsyncResult(task_id)
+        if result.failed():
+            return Response({'status': result.state, 'detail': str(result.result)},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if not result.ready():
+            return Response({'status': result.state}, status=status.HTTP_202_ACCEPTED)
+        if isinstance(result.result, dict):
+            return Response(dict(result.result, status=result.state))
+        return Response({'status': result.state, 'result': result.result})
+
+
+class StrategyDeltaView(APIView):
+    """
+    策略增量同步， GET ?since=<设备当前版本>&firewall=<设备 id>， 不传 since 时返回全量；
+    给出 firewall 时按该设备的生效策略计算。
+    请求头 Accept-Encoding 包含 gzip 时返回压缩后的数据。
+    """
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        firewall = request.query_params.get('firewall')
+        try:
+            since = None if since is None else int(since)
+        except ValueError:
+            return Response({'since': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        if firewall is not None:
+            try:
+                firewall = get_object_or_404(Firewall, pk=int(firewall))
+            except ValueError:
+                return Response({'firewall': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        if since is None:
+            data = snapshots.build_full(firewall)
+        else:
+            data = snapshots.build_delta(since, firewall)
+
+        content = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+        response = HttpResponse(content_type='application/json')
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            content = gzip.compress(content)
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept-Encoding'
+        response.content = content
+        return response
+
+
+class PolicyBundleView(APIView):
+    """
+    工业协议策略二进制包。 GET policies/bundle/ 重定向到当前内容的地址 policies/bundle/<sha256>/，
+    该地址的内容不会变化， 允许长期缓存； 旧地址在缓存过期后返回 404。
+    """
+
+    def get(self, request, digest=None):
+        if digest is None:
+            response = HttpResponseRedirect('{}{}/'.format(request.path, bundle.get_bundle()[1]))
+            response['Cache-Control'] = 'no-cache'
+            return response
+        data = bundle.get_bundle_by_digest(digest)
+        if data is None:
+            return Response({'detail': 'Bundle is out of date.'}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = '"{}"'.format(digest)
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(data, content_type='application/octet-stream')
+            response['Content-Disposition'] = 'attachment; filename="policy-{}.bin"'.format(digest[:12])
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+
+class HeartbeatView(APIView):
+    """
+    设备心跳， 只记录最后上报时间， 在线状态由周期任务统一更新
+    """
+
+    def post(self, request):
+        serializer = HeartbeatSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not heartbeat.record_heartbeat(serializer.validated_data['id'], serializer.validated_data['register_code']):
+            return Response({'detail': 'Invalid device or register code.'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ArpCompareView(APIView):
+    """
+    将 ARP 表与 IP/MAC 绑定比对， 返回匹配、新增、变更和冲突的条目；
+    commit=true 时把新增条目批量导入为绑定。
+    """
 
+    def post(self, request):
+        serializer = ArpCompareSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entries = list(serializer.validated_data.get('entries', []))
+        if 'table' in serializer.validated_data:
+            entries.extend(arp.parse_arp_table(serializer.validated_data['table']))
+        report = arp.compare(entries)
+        report['imported'] = arp.import_new(report) if serializer.validated_data['commit'] else 0
+        return Response(report)
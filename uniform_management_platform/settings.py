@@ -45,11 +45,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'utils.middlewares.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'utils.middlewares.QueryCountMiddleware',
     # 'utils.middlewares.SessionTimeoutMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -141,12 +143,65 @@ STATIC_URL = '/static/'
 
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 
+# 缓存中的数据版本号用于在 web 进程和 Celery worker 之间通知数据变更， 必须使用共享的缓存
+CACHES = {
+    'default': {
+        'BACKEND': 'utils.core.redis_cache.RedisCache',
+        'LOCATION': 'redis://localhost:6379/3',
+    }
+}
+
 #: Only add pickle to this list if your broker is secured
 #: from unwanted access (see userguide/security.html)
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/1'
 CELERY_TASK_SERIALIZER = 'json'
 
+# 事件存储
+# 开启后事件按 occurred_time 写入分区子表（'day' 或 'week'）， 过期分区整表删除
+EVENT_PARTITIONING = False
+EVENT_PARTITION_INTERVAL = 'week'
+EVENT_RETENTION_DAYS = 180
+
+# 策略版本和删除记录保留天数， 更旧版本的设备同步时下发全量
+STRATEGY_VERSION_KEEP_DAYS = 30
+
+# 设备 agent 接口
+FIREWALL_AGENT_SCHEME = 'http'
+FIREWALL_AGENT_PORT = 8080
+FIREWALL_AGENT_CONFIG_PATH = '/api/config'
+# 策略下发: 每个 worker 进程内的并发数、单台设备重试次数、退避基数（秒）、超时（秒）
+FIREWALL_PUSH_CONCURRENCY = 16
+FIREWALL_PUSH_RETRIES = 3
+FIREWALL_PUSH_BACKOFF = 0.5
+FIREWALL_PUSH_TIMEOUT = 5
+
+# 设备心跳: 存储位置（'local://' 仅用于开发测试）、状态刷新周期和超时时间（秒）
+FIREWALL_HEARTBEAT_STORE = 'redis://localhost:6379/2'
+FIREWALL_HEARTBEAT_INTERVAL = 30.0
+FIREWALL_HEARTBEAT_TIMEOUT = 90
+
+# 设备状态轮询: 周期、并发数、单台超时（秒）、请求前随机等待的上限（秒）
+FIREWALL_AGENT_STATUS_PATH = '/api/status'
+FIREWALL_POLL_INTERVAL = 60.0
+FIREWALL_POLL_CONCURRENCY = 200
+FIREWALL_POLL_TIMEOUT = 3
+FIREWALL_POLL_JITTER = 1.0
+
+# 无操作自动登出（SessionTimeoutMiddleware）: 超时时间、活动时间记录间隔、活动记录保留时间、token 用户缓存时间（秒）
+INACTIVITY_TIMEOUT = 30 * 60
+ACTIVITY_TOUCH_INTERVAL = 60
+ACTIVITY_RECORD_TIMEOUT = 7 * 24 * 60 * 60
+TOKEN_USER_CACHE_TIMEOUT = 30
+
+# 单个请求执行的 SQL 超过该条数时记录 warning 日志
+QUERY_COUNT_WARNING = 50
+
+# 请求指标: 各进程数据的写入目录、写入间隔（秒）、允许访问 /metrics/ 的地址
+METRICS_DIR = os.path.join(BASE_DIR, 'run', 'metrics')
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
 
 try:
     from .local_settings import *
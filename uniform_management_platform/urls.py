@@ -16,6 +16,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from utils.core.metrics import metrics_view
+
 urlpatterns = [
     path('admin-3fsW4R1f/', admin.site.urls),
     path('firewall/', include('firewall.urls'))
@@ -23,4 +25,5 @@ urlpatterns = [
 
 urlpatterns = [
     path('api/v1/', include(urlpatterns)),
+    path('metrics/', metrics_view),
 ]
@@ -0,0 +1,125 @@
+"""
+用户活动时间记录， 供 SessionTimeoutMiddleware 判断无操作超时。
+
+活动时间不再写入 session（数据库 session 每个请求都会多一次 UPDATE）， 而是先记在进程内，
+同一个 key 在 ACTIVITY_TOUCH_INTERVAL 秒内只记录一次， 再按同样的间隔用 cache.set_many
+批量写入缓存； 之后没有请求时由后台定时器写入， 进程退出前也会写入一次。 判断超时时先看进程内的记录， 已超时再读缓存确认其他进程是否有更新的活动，
+误差不超过一个间隔。 多进程部署时 CACHES 需要使用 Redis 等共享缓存。
+
+缓存中的记录保留 ACTIVITY_RECORD_TIMEOUT 秒（远大于无操作超时）， 是判断空闲的依据；
+进程内和缓存中都没有记录时使用调用方给出的时间（如 token 的创建时间）， 仍然没有时视为空闲。
+"""
+import atexit
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def activity_key(token):
+    return 'activity:{}'.format(hashlib.sha1(token.encode('utf-8')).hexdigest())
+
+
+class ActivityTracker(object):
+
+    def __init__(self, interval=None):
+        self.interval = interval if interval is not None else getattr(settings, 'ACTIVITY_TOUCH_INTERVAL', 60)
+        self.timeout = getattr(settings, 'INACTIVITY_TIMEOUT', 1800)
+        self.record_timeout = getattr(settings, 'ACTIVITY_RECORD_TIMEOUT', 7 * 24 * 60 * 60)
+        self._seen = {}
+        self._pending = {}
+        self._last_flush = time.time()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def touch(self, key, now=None):
+        now = now or time.time()
+        last = self._seen.get(key)
+        if last is not None and now - last < self.interval:
+            return
+        with self._lock:
+            self._seen[key] = now
+            self._pending[key] = now
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if now - self._last_flush >= self.interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = now or time.time()
+            timer, self._timer = self._timer, None
+            if timer is not None and timer is not threading.current_thread():
+                timer.cancel()
+            # 进程内只需要保留最近一个超时周期内的记录， 更早的活动以缓存中的记录为准
+            expired = self._last_flush - self.timeout - self.interval
+            for key in [key for key, seen in self._seen.items() if seen < expired]:
+                del self._seen[key]
+        if pending:
+            cache.set_many(pending, self.record_timeout)
+
+    def last_activity(self, key):
+        return self._seen.get(key) or cache.get(key)
+
+    def is_idle(self, key, timeout, now=None, since=None):
+        """
+        超过 timeout 秒没有活动时返回 True。
+        没有任何记录时调用 since() 取持久化的时间戳（如 token 的创建时间）， 返回 None 或未给出时视为空闲
+        """
+        now = now or time.time()
+        last = self._seen.get(key)
+        if last is not None and now - last <= timeout:
+            return False
+        latest = max(last or 0, cache.get(key) or 0)
+        if not latest and since is not None:
+            latest = since() or 0
+        return now - latest > timeout
+
+    def forget(self, key):
+        with self._lock:
+            self._seen.pop(key, None)
+            self._pending.pop(key, None)
+        cache.delete(key)
+
+
+class TokenUserCache(object):
+    """
+    token 到 user 的进程内短时缓存， 过期时间 TOKEN_USER_CACHE_TIMEOUT 秒，
+    token 删除或用户被禁用最多延迟这么久生效
+    """
+    max_size = 4096
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout if timeout is not None else getattr(settings, 'TOKEN_USER_CACHE_TIMEOUT', 30)
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        entry = self._users.get(token)
+        if entry is None:
+            return None
+        user, expires = entry
+        if expires < time.time():
+            self.forget(token)
+            return None
+        return user
+
+    def set(self, token, user):
+        with self._lock:
+            if len(self._users) >= self.max_size:
+                self._users.clear()
+            self._users[token] = (user, time.time() + self.timeout)
+
+    def forget(self, token):
+        with self._lock:
+            self._users.pop(token, None)
+
+
+activity_tracker = ActivityTracker()
+token_users = TokenUserCache()
+atexit.register(activity_tracker.flush)
@@ -0,0 +1,17 @@
+from rest_framework.authentication import TokenAuthentication
+
+from utils.core.activity import token_users
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication， 验证通过的 token 在进程内缓存一小段时间， 避免每个请求都查询 token 表
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_users.get(key)
+        if cached is not None:
+            return cached
+        user, token = super(CachedTokenAuthentication, self).authenticate_credentials(key)
+        token_users.set(key, (user, token))
+        return user, token
@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+# 只在单个进程内有效的缓存后端， 数据版本号无法通知到其他 web 进程和 Celery worker
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _generation_key(name):
+    return 'generation:{}'.format(name)
+
+
+def get_generation(name):
+    """
+    取得名为 name 的数据版本号， 数据变更时调用 bump_generation 使其递增，
+    进程内缓存可以通过比较版本号判断是否过期。
+    """
+    key = _generation_key(name)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, 1, None)
+        value = cache.get(key, 1)
+    return value
+
+
+def get_generations(names):
+    """
+    一次取得多个数据版本号， 返回与 names 对应的元组
+    """
+    keys = [_generation_key(name) for name in names]
+    values = cache.get_many(keys)
+    return tuple(values[key] if values.get(key) is not None else get_generation(name)
+                 for key, name in zip(keys, names))
+
+
+def bump_generation(name):
+    key = _generation_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # key 不存在
+        cache.add(key, 2, None)
+        return cache.get(key, 2)
+
+
+def model_generation_name(model):
+    return 'model:{}'.format(model._meta.label_lower)
+
+
+def _bump_model_generation(sender, using=None, **kwargs):
+    name = model_generation_name(sender)
+    transaction.on_commit(lambda: bump_generation(name), using=using)
+
+
+def track_model_changes(*models):
+    """
+    模型保存或删除时递增其数据版本号。 版本号在事务提交后才递增， 否则其他进程可能在提交前
+    按新版本号缓存旧数据。 queryset.update() 和 bulk_create 不发送 signal，
+    调用方需要自己调用 touch_models， 在事务中时放到 transaction.on_commit 里。
+    """
+    for model in models:
+        uid = 'track_model_changes:{}'.format(model._meta.label_lower)
+        post_save.connect(_bump_model_generation, sender=model, dispatch_uid=uid)
+        post_delete.connect(_bump_model_generation, sender=model, dispatch_uid=uid)
+
+
+def touch_models(*models):
+    for model in models:
+        bump_generation(model_generation_name(model))
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    数据版本号依赖所有进程共用的缓存， 默认缓存为进程内缓存时报错，
+    单进程运行（开发、测试）时可以设置 CACHE_ALLOW_PROCESS_LOCAL = True
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend in PROCESS_LOCAL_BACKENDS and not getattr(settings, 'CACHE_ALLOW_PROCESS_LOCAL', False):
+        return [checks.Error(
+            'The default cache backend {} is local to each process.'.format(backend),
+            hint='Cache invalidation is shared through the default cache. Configure a shared backend such as '
+                 'utils.core.redis_cache.RedisCache, or set CACHE_ALLOW_PROCESS_LOCAL = True for '
+                 'single-process development.',
+            id='utils.E001',
+        )]
+    return []
@@ -0,0 +1,80 @@
+import re
+
+from django.db import connection
+from rest_framework.filters import SearchFilter
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+TRIGRAM_LENGTH = 3
+
+
+def search_tokens(terms):
+    return [token for term in terms for token in _TOKEN.findall(term)]
+
+
+def build_match_query(tokens, tokenizer='unicode61'):
+    """
+    把搜索词转换为 FTS5 MATCH 表达式， 多个词之间为 AND。
+    trigram 分词器按子串匹配， 其他分词器每个词按前缀匹配。
+    """
+    template = '"{}"' if tokenizer == 'trigram' else '"{}"*'
+    return ' '.join(template.format(token) for token in tokens)
+
+
+def can_match(tokens, tokenizer):
+    """
+    全文索引能否得到与 LIKE 相同的结果: trigram 要求每个词至少 3 个字符；
+    其他分词器不切分中文等非 ASCII 文本， 只用于 ASCII 的词
+    """
+    if tokenizer == 'trigram':
+        return all(len(token) >= TRIGRAM_LENGTH for token in tokens)
+    return all(token.isascii() for token in tokens)
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    视图声明了 `search_fts_table`（以模型表为外部内容表的 SQLite FTS5 虚拟表）且该表存在时，
+    使用全文索引搜索并按 bm25 相关度排序， 结果带有 search_rank 属性；
+    否则， 或者搜索词无法由该索引准确匹配时（见 can_match）， 退回 SearchFilter 基于 search_fields 的 LIKE 查询。
+    """
+    _tokenizers = {}
+
+    def get_tokenizer(self, table):
+        """
+        返回索引表的分词器， 表不存在时返回 None
+        """
+        if table in self._tokenizers:
+            return self._tokenizers[table]
+        if connection.vendor != 'sqlite':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        tokenizer = 'trigram' if 'trigram' in row[0] else 'unicode61'
+        self._tokenizers[table] = tokenizer
+        return tokenizer
+
+    def filter_queryset(self, request, queryset, view):
+        table = getattr(view, 'search_fts_table', None)
+        terms = self.get_search_terms(request)
+        tokenizer = self.get_tokenizer(table) if terms and table else None
+        tokens = search_tokens(terms)
+        if tokenizer is None or not can_match(tokens, tokenizer):
+            return super(FullTextSearchFilter, self).filter_queryset(request, queryset, view)
+
+        match = build_match_query(tokens, tokenizer)
+        if not match:
+            return queryset
+        quote = connection.ops.quote_name
+        opts = queryset.model._meta
+        return queryset.extra(
+            tables=[table],
+            where=[
+                '{}.rowid = {}.{}'.format(quote(table), quote(opts.db_table), quote(opts.pk.column)),
+                '{} MATCH %s'.format(quote(table)),
+            ],
+            params=[match],
+            select={'search_rank': 'bm25({})'.format(quote(table))},
+            order_by=['search_rank'],
+        )
@@ -0,0 +1,240 @@
+"""
+请求指标: 按路由、方法、状态码统计请求数、耗时分布、SQL 条数和耗时、响应大小。
+
+每个进程在内存中累加， 最多每 METRICS_FLUSH_INTERVAL 秒把本进程的累计值写入
+METRICS_DIR/<pid>-<随机串>.json（先写临时文件再 rename）； 导出时读取目录中所有文件求和，
+输出 Prometheus text format。
+
+文件名在第一次记录时按当前 pid 生成， 每次记录和写入都检查 pid， fork 出的子进程使用自己的文件，
+不继承父进程的累计值。 导出时把已退出进程的文件合并进 merged.json 后删除， 计数保持单调递增，
+文件数不随进程重启增长。
+"""
+import atexit
+import contextlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 每个序列的累计值: count, duration, sql_count, sql_duration, response_bytes, buckets...
+_COUNT, _DURATION, _SQL_COUNT, _SQL_DURATION, _BYTES = range(5)
+_FIELDS = 5
+
+MERGED_FILENAME = 'merged.json'
+_PROCESS_FILE = re.compile(r'^(\d+)-[0-9a-f]+\.json$')
+
+
+def get_metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None) or os.path.join(tempfile.gettempdir(), 'ump_metrics')
+
+
+class MetricsRegistry(object):
+
+    def __init__(self, directory=None, flush_interval=None):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.pid = None
+        self.filename = None
+        self.series = {}
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+        self.dirty = False
+
+    def _check_pid(self):
+        """
+        在持有 lock 时调用。 模块在 fork 前导入时， 子进程丢弃继承的累计值（已计入父进程的文件）并使用新文件
+        """
+        pid = os.getpid()
+        if pid != self.pid:
+            self.pid = pid
+            self.filename = '{}-{}.json'.format(pid, uuid.uuid4().hex[:8])
+            self.series = {}
+            self.dirty = False
+            self.last_flush = 0.0
+
+    def observe(self, route, method, status, duration, sql_count, sql_duration, size):
+        key = (route, method, str(status))
+        with self.lock:
+            self._check_pid()
+            values = self.series.get(key)
+            if values is None:
+                values = self.series[key] = [0] * (_FIELDS + len(BUCKETS))
+            values[_COUNT] += 1
+            values[_DURATION] += duration
+            values[_SQL_COUNT] += sql_count
+            values[_SQL_DURATION] += sql_duration
+            values[_BYTES] += size
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    values[_FIELDS + i] += 1
+            self.dirty = True
+
+    def maybe_flush(self, now=None):
+        now = now or time.time()
+        interval = self.flush_interval if self.flush_interval is not None else \
+            getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+        if self.dirty and now - self.last_flush >= interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        with self.lock:
+            self._check_pid()
+            if not self.dirty:
+                return
+            data = [list(key) + values for key, values in self.series.items()]
+            filename = self.filename
+            self.dirty = False
+            self.last_flush = now or time.time()
+        directory = self.directory or get_metrics_dir()
+        os.makedirs(directory, exist_ok=True)
+        _write_json(os.path.join(directory, filename), data)
+
+
+def _write_json(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge_rows(merged, rows):
+    for row in rows:
+        key, values = tuple(row[:3]), row[3:]
+        total = merged.get(key)
+        if total is None:
+            merged[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                total[i] += value
+    return merged
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush)
+
+
+@contextlib.contextmanager
+def _directory_lock(directory):
+    """
+    多个进程同时导出时用文件锁串行化合并和读取， 不支持 fcntl 的平台上不加锁
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def merge_dead(directory):
+    """
+    把已退出进程的文件合并进 merged.json 并删除， 返回合并的文件数， 调用方需持有目录锁
+    """
+    dead = []
+    for name in os.listdir(directory):
+        match = _PROCESS_FILE.match(name)
+        if match is not None and int(match.group(1)) != os.getpid() and not _pid_alive(int(match.group(1))):
+            dead.append(name)
+    if not dead:
+        return 0
+    path = os.path.join(directory, MERGED_FILENAME)
+    merged = _merge_rows({}, _read_json(path) or [])
+    for name in dead:
+        _merge_rows(merged, _read_json(os.path.join(directory, name)) or [])
+    _write_json(path, [list(key) + values for key, values in merged.items()])
+    for name in dead:
+        os.remove(os.path.join(directory, name))
+    return len(dead)
+
+
+def collect(directory=None):
+    """
+    合并目录中所有进程的数据， 返回 {(route, method, status): values}
+    """
+    directory = directory or get_metrics_dir()
+    merged = {}
+    if not os.path.isdir(directory):
+        return merged
+    with _directory_lock(directory):
+        merge_dead(directory)
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                _merge_rows(merged, _read_json(os.path.join(directory, name)) or [])
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def render(series):
+    metrics = (
+        ('http_requests_total', 'counter', 'Total HTTP requests.', _COUNT),
+        ('http_request_sql_queries_total', 'counter', 'SQL queries executed by HTTP requests.', _SQL_COUNT),
+        ('http_request_sql_duration_seconds_total', 'counter', 'Time spent in SQL by HTTP requests.',
+         _SQL_DURATION),
+        ('http_response_size_bytes_total', 'counter', 'Response body bytes.', _BYTES),
+    )
+    items = sorted(series.items())
+    lines = []
+    for name, kind, help_text, index in metrics:
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for (route, method, status), values in items:
+            lines.append('{}{{route="{}",method="{}",status="{}"}} {}'.format(
+                name, _escape(route), method, status, values[index]))
+
+    name = 'http_request_duration_seconds'
+    lines.append('# HELP {} HTTP request latency.'.format(name))
+    lines.append('# TYPE {} histogram'.format(name))
+    for (route, method, status), values in items:
+        labels = 'route="{}",method="{}",status="{}"'.format(_escape(route), method, status)
+        for i, bound in enumerate(BUCKETS):
+            lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, values[_FIELDS + i]))
+        lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, labels, values[_COUNT]))
+        lines.append('{}_sum{{{}}} {}'.format(name, labels, values[_DURATION]))
+        lines.append('{}_count{{{}}} {}'.format(name, labels, values[_COUNT]))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    只允许 settings.METRICS_ALLOWED_IPS 中的地址访问， 其他地址返回 404
+    """
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404
+    registry.flush()
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
@@ -1,7 +1,16 @@
+import hashlib
+import time
+
 from rest_framework import status
+from rest_framework.response import Response
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
 from django.conf import settings
 
+from utils.core.cache import get_generation, model_generation_name
+
 
 class MultiSerializerViewSetMixin(object):
     def get_serializer_class(self):
@@ -62,3 +71,96 @@ class MultiPermissionViewSetMixin(object):
         except (KeyError, AttributeError):
             return super(MultiPermissionViewSetMixin, self).get_permission_class()
 
+
+
+class RelatedQuerysetViewSetMixin(object):
+    def get_queryset(self):
+        """
+        在self.select_related_actions和self.prefetch_related_actions中找当前action需要预先加载的关联，
+        避免序列化关联字段时每行查询一次
+        i.e.:
+
+        class MyViewSet(RelatedQuerysetViewSetMixin, ViewSet):
+            select_related_actions = {
+               'list': ('owner',),
+               'retrieve': ('owner',),
+            }
+            prefetch_related_actions = {
+               'retrieve': ('tags',),
+            }
+
+        没有对应action的入口时不做处理
+        """
+        queryset = super(RelatedQuerysetViewSetMixin, self).get_queryset()
+        action = getattr(self, 'action', None)
+        select_related = getattr(self, 'select_related_actions', {}).get(action)
+        prefetch_related = getattr(self, 'prefetch_related_actions', {}).get(action)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
+class CachedResponseViewSetMixin(object):
+    """
+    缓存只读 action 的响应数据， 并支持 ETag / Last-Modified 条件请求
+    i.e.:
+
+    class MyViewSet(CachedResponseViewSetMixin, ReadOnlyModelViewSet):
+        cache_models = (MyModel, RelatedModel)
+        cache_actions = ('list', 'retrieve')
+
+    缓存按 cache_models 的数据版本号（utils.core.cache.track_model_changes）区分， 模型变更后
+    旧缓存自然失效。 认证和权限检查仍在 action 之前进行， 只有同一个 host 和 URL 的数据会被复用，
+    响应内容与当前用户相关的视图不要使用。
+    """
+    cache_models = ()
+    cache_actions = ('list', 'retrieve')
+    cache_timeout = 300
+
+    def _cache_state(self, request):
+        generations = ':'.join(str(get_generation(model_generation_name(model))) for model in self.cache_models)
+        # 响应中的链接（如分页的 next）包含 host
+        digest = hashlib.md5('{}|{}|{}|{}'.format(
+            self.__class__.__name__, generations, request.get_host(), request.get_full_path()).encode('utf-8')
+        ).hexdigest()
+        return 'response:{}'.format(digest), '"{}"'.format(digest)
+
+    def _not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and last_modified is not None and int(last_modified) <= if_modified_since
+
+    def _cached_response(self, request, *args, **kwargs):
+        handler = super(CachedResponseViewSetMixin, self)
+        method = getattr(handler, self.action)
+        if request.method not in ('GET', 'HEAD') or self.action not in self.cache_actions or not self.cache_models:
+            return method(request, *args, **kwargs)
+
+        key, etag = self._cache_state(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = method(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = (response.data, time.time())
+            cache.set(key, cached, self.cache_timeout)
+        data, last_modified = cached
+
+        if self._not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(request, *args, **kwargs)
@@ -1,6 +1,18 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import datetime
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from collections import OrderedDict
+from functools import cmp_to_key
 
 # page_size = 10
 
@@ -16,3 +28,151 @@ class CustomPagination(PageNumberPagination):
             ('results', data),
             ('page_count', self.page.paginator.num_pages)
         ]))
+
+
+class KeysetPagination(BasePagination):
+    """
+    基于索引列的游标分页（keyset / seek）， 避免 OFFSET 扫描和每次请求的 COUNT(*)。
+
+    视图通过 `keyset_ordering` 指定排序， 最后一列必须唯一（通常是 id）， 且整体应有索引覆盖:
+
+        class MyViewSet(MultiSerializerViewSetMixin, ListModelMixin, GenericViewSet):
+            pagination_class = KeysetPagination
+            keyset_ordering = ('-occurred_time', '-id')
+
+    返回不透明的 next/previous 游标链接； 只有请求参数 `with_count=true` 时才返回总数，
+    总数按查询语句缓存 count_cache_timeout 秒。
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    count_cache_timeout = 60
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request, view)
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """
+        对字段相同的多个 queryset（如按时间分区的子表）合并分页:
+        每个 queryset 按同样的排序和游标各取一页， 归并后取前 page_size 条。
+        """
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.fields = [querysets[0].model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+        self.page_size = self.get_page_size(request)
+        self.count = sum(self.get_count(queryset) for queryset in querysets) if self.should_count(request) else None
+
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor.get('r'))
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(name[1:] if name.startswith('-') else '-' + name for name in ordering)
+
+        results = []
+        for queryset in querysets:
+            queryset = queryset.order_by(*ordering)
+            if cursor:
+                queryset = queryset.filter(self.seek_filter(ordering, cursor['v']))
+            results.extend(queryset[:self.page_size + 1])
+        if len(querysets) > 1:
+            results.sort(key=cmp_to_key(lambda a, b: self.compare(ordering, a, b)))
+
+        results = results[:self.page_size + 1]
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.next_position = self.prev_position = None
+        if results:
+            if has_more or self.reverse:
+                self.next_position = self.get_position(results[-1])
+            if cursor and (has_more or not self.reverse):
+                self.prev_position = self.get_position(results[0])
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def should_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_count(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        key = 'keyset_count:' + hashlib.md5(repr((sql, params)).encode('utf-8')).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    def seek_filter(self, ordering, values):
+        """
+        (a, b) 按降序时生成 a < va OR (a = va AND b < vb)
+        """
+        condition = Q()
+        equal = {}
+        for name, value in zip(ordering, values):
+            field_name = name.lstrip('-')
+            lookup = '__lt' if name.startswith('-') else '__gt'
+            condition |= Q(**equal) & Q(**{field_name + lookup: value})
+            equal[field_name] = value
+        return condition
+
+    def compare(self, ordering, a, b):
+        for name, field in zip(ordering, self.fields):
+            x, y = getattr(a, field.attname), getattr(b, field.attname)
+            if x != y:
+                result = -1 if x < y else 1
+                return -result if name.startswith('-') else result
+        return 0
+
+    def get_position(self, obj):
+        return [getattr(obj, field.attname) for field in self.fields]
+
+    def encode_cursor(self, position, reverse):
+        # 时间保留到微秒， 否则同一毫秒内的记录会被跳过
+        values = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in position]
+        raw = json.dumps({'v': values, 'r': 1 if reverse else 0}, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+            values = [field.to_python(value) for field, value in zip(self.fields, data['v'])]
+        except (TypeError, ValueError, KeyError, UnicodeError, ValidationError):
+            raise NotFound('Invalid cursor')
+        if len(values) != len(self.fields):
+            raise NotFound('Invalid cursor')
+        return {'v': values, 'r': data.get('r')}
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.prev_position is None:
+            return None
+        return self.encode_cursor(self.prev_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
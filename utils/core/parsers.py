@@ -0,0 +1,57 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class InvalidLine(object):
+    """
+    NDJSON 中无法解析的行， 保留错误信息， 由调用方按行报告错误。
+    """
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+    def __str__(self):
+        return self.error
+
+
+class NDJSONRows(list):
+    """
+    NDJSONParser 的结果， line_numbers[i] 为第 i 条记录在请求体中的行号（从 1 开始）
+    """
+
+    def __init__(self, rows=(), line_numbers=()):
+        super(NDJSONRows, self).__init__(rows)
+        self.line_numbers = list(line_numbers)
+
+
+class NDJSONParser(BaseParser):
+    """
+    解析 NDJSON（每行一个 JSON 对象）， 返回 NDJSONRows。
+    空行被忽略， 无法解析的行以 InvalidLine 占位， 不会导致整个请求失败。
+    空行不占下标， 报告错误时用 line_numbers 对应回源文件的行号。
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            lines = stream.read().decode(encoding).splitlines()
+        except (UnicodeDecodeError, AttributeError) as exc:
+            raise ParseError('NDJSON parse error - %s' % exc)
+
+        data = NDJSONRows()
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data.append(json.loads(line))
+            except ValueError as exc:
+                data.append(InvalidLine('Invalid JSON - %s' % exc))
+            data.line_numbers.append(number)
+        return data
@@ -1,19 +1,92 @@
 import logging
-import traceback
 
 from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from rest_framework.permissions import BasePermission, IsAuthenticated, SAFE_METHODS
 
+from utils.core.cache import bump_generation, get_generation
+
 logger = logging.getLogger(__name__)
 
+# 组成员变化时通过共享缓存立即失效， 过期时间只是兜底， 撤销权限最多延迟这么久
+ROLE_CACHE_TIMEOUT = 60
+ROLE_GENERATION = 'user_roles'
+
+
+def _roles_key(user_id):
+    return 'roles:{}:{}'.format(get_generation(ROLE_GENERATION), user_id)
+
 
-class IsOperator(BasePermission):
+def get_user_roles(user):
     """
-    仅允许操作员.
+    返回用户所属组名的 frozenset， 结果缓存在 cache 和 user 对象上， 组成员变化时失效
     """
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_role_cache', None)
+    if roles is not None:
+        return roles
+    key = _roles_key(user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        cache.set(key, roles, ROLE_CACHE_TIMEOUT)
+    user._role_cache = roles
+    return roles
+
+
+def _user_groups_changed(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # 提交后再失效， 以免其他进程在提交前重新缓存旧的组
+    if not reverse:
+        keys = [instance.pk]
+    elif pk_set:
+        keys = list(pk_set)
+    else:
+        # group.user_set.clear() 不提供受影响的用户
+        keys = None
+    transaction.on_commit(lambda: _invalidate_roles(keys), using=using)
+
+
+def _invalidate_roles(user_ids=None):
+    if user_ids is None:
+        bump_generation(ROLE_GENERATION)
+    else:
+        cache.delete_many([_roles_key(user_id) for user_id in user_ids])
+
+
+def _group_changed(sender, using=None, **kwargs):
+    transaction.on_commit(_invalidate_roles, using=using)
+
+
+def connect_role_signals():
+    """
+    在 AppConfig.ready 中调用
+    """
+    m2m_changed.connect(_user_groups_changed, sender=User.groups.through, dispatch_uid='user_roles_m2m')
+    post_save.connect(_group_changed, sender=Group, dispatch_uid='user_roles_group_save')
+    post_delete.connect(_group_changed, sender=Group, dispatch_uid='user_roles_group_delete')
+
+
+class HasRole(BasePermission):
+    """
+    仅允许属于 role 组的用户， 用户可以属于多个组
+    i.e.:
+
+    class IsAuditor(HasRole):
+        role = 'Auditor'
+    """
+    role = None
 
     def has_permission(self, request, view):
-        try:
-            return request.user.groups.get().name == 'Operator'
-        except (AttributeError, Group.DoesNotExist, Group.MultipleObjectsReturned):
-            logger.error(traceback.format_exc())
+        return self.role in get_user_roles(getattr(request, 'user', None))
+
+
+class IsOperator(HasRole):
+    """
+    仅允许操作员.
+    """
+    role = 'Operator'
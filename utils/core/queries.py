@@ -0,0 +1,76 @@
+"""
+SQL 查询计数和计时。
+
+    with QueryCounter() as counter:
+        ...
+    counter.count, counter.duration, counter.queries
+
+测试中声明接口的查询预算， 超出时失败并列出执行过的 SQL:
+
+    class FirewallApiTest(QueryBudgetTestMixin, APITestCase):
+        def test_list(self):
+            with self.assertQueryBudget(3):
+                self.client.get('/api/v1/firewall/')
+"""
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+class QueryCounter(object):
+    """
+    通过 connection.execute_wrapper 记录所有数据库连接上执行的 SQL， 不依赖 DEBUG
+    """
+
+    def __init__(self, using=None, keep_sql=True):
+        self.using = using
+        self.keep_sql = keep_sql
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.keep_sql:
+                self.queries.append({'sql': sql, 'time': elapsed})
+
+    def __enter__(self):
+        aliases = [self.using] if self.using else connections
+        self._stack = ExitStack()
+        for alias in aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._stack = None
+
+
+@contextmanager
+def assert_max_queries(budget, using=None):
+    """
+    代码块中执行的 SQL 超过 budget 条时抛出 AssertionError
+    """
+    with QueryCounter(using=using) as counter:
+        yield counter
+    if counter.count > budget:
+        raise AssertionError('{} queries executed, budget is {}:\n{}'.format(
+            counter.count, budget, '\n'.join('{}. {}'.format(i, query['sql'])
+                                             for i, query in enumerate(counter.queries, 1))))
+
+
+class QueryBudgetTestMixin(object):
+    """
+    TestCase mixin， 提供 assertQueryBudget
+    """
+
+    def assertQueryBudget(self, budget, using=None):
+        return assert_max_queries(budget, using=using)
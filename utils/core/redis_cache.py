@@ -0,0 +1,134 @@
+"""
+Redis 缓存后端。
+
+进程内缓存（LocMemCache）只在单个进程中有效， 数据版本号（utils.core.cache）需要在 web 进程和
+Celery worker 之间共享， 因此默认缓存使用 Redis。 整数原样保存以支持 INCR， 其他值用 pickle 序列化。
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'utils.core.redis_cache.RedisCache',
+            'LOCATION': 'redis://localhost:6379/3',
+        }
+    }
+"""
+import pickle
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class RedisCache(BaseCache):
+
+    def __init__(self, server, params):
+        super(RedisCache, self).__init__(params)
+        if redis is None:
+            raise ImproperlyConfigured('redis is required for {}'.format(self.__class__.__name__))
+        self._url = server
+        self._client = None
+
+    @property
+    def client(self):
+        # redis-py 的连接池在 fork 后会按 pid 重建， 可以在预加载的进程中共用
+        if self._client is None:
+            self._client = redis.StrictRedis.from_url(self._url)
+        return self._client
+
+    def _key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _timeout(self, timeout):
+        """
+        返回过期秒数， None 表示不过期
+        """
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return None if timeout is None else max(0, int(timeout))
+
+    @staticmethod
+    def _dumps(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(value):
+        try:
+            return int(value)
+        except ValueError:
+            return pickle.loads(value)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        if timeout == 0:
+            return False
+        return bool(self.client.set(self._key(key, version), self._dumps(value), ex=timeout, nx=True))
+
+    def get(self, key, default=None, version=None):
+        value = self.client.get(self._key(key, version))
+        return default if value is None else self._loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        timeout = self._timeout(timeout)
+        if timeout == 0:
+            self.client.delete(key)
+        else:
+            self.client.set(key, self._dumps(value), ex=timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        timeout = self._timeout(timeout)
+        if timeout is None:
+            return bool(self.client.persist(key) or self.client.exists(key))
+        return bool(self.client.expire(key, timeout))
+
+    def delete(self, key, version=None):
+        return bool(self.client.delete(self._key(key, version)))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.client.mget([self._key(key, version) for key in keys])
+        return {key: self._loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        pipe = self.client.pipeline()
+        for key, value in data.items():
+            key = self._key(key, version)
+            if timeout == 0:
+                pipe.delete(key)
+            else:
+                pipe.set(key, self._dumps(value), ex=timeout)
+        pipe.execute()
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def has_key(self, key, version=None):
+        return bool(self.client.exists(self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        # 与其他后端一致， key 不存在时抛出 ValueError
+        if not self.client.exists(key):
+            raise ValueError("Key '{}' not found".format(key))
+        return self.client.incrby(key, delta)
+
+    def clear(self):
+        self.client.flushdb()
+
+    def close(self, **kwargs):
+        # 连接池在进程内复用， 请求结束时不断开
+        pass
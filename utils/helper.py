@@ -1,11 +1,26 @@
 import string
-import random
+import secrets
+
+BASE_STR = string.ascii_letters + string.digits
+# 每个随机字节对应一个字符， 丢弃 >= 248 的字节以保证 62 个字符等概率
+_ACCEPT_LIMIT = 256 - 256 % len(BASE_STR)
 
 
 def random_string(str_length):
-    base_str = string.ascii_letters + string.digits
-    random_str = ''
-    length = len(base_str) - 1
-    for i in range(str_length):
-        random_str += base_str[random.randint(0, length)]
-    return random_str
+    return ''.join(secrets.choice(BASE_STR) for _ in range(str_length))
+
+
+def random_strings(count, str_length):
+    """
+    使用密码学安全的随机数批量生成 count 个互不相同的随机字符串
+    """
+    result = set()
+    while len(result) < count:
+        need = (count - len(result)) * str_length
+        chars = [BASE_STR[b % len(BASE_STR)] for b in secrets.token_bytes(need + need // 8 + str_length)
+                 if b < _ACCEPT_LIMIT]
+        for i in range(0, len(chars) - str_length + 1, str_length):
+            result.add(''.join(chars[i:i + str_length]))
+            if len(result) == count:
+                break
+    return list(result)
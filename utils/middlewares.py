@@ -4,9 +4,13 @@ from django.conf import settings
 from django.http.response import JsonResponse
 from django.contrib.auth import logout
 import time
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
+from utils.core import metrics
+from utils.core.activity import activity_key, activity_tracker, token_users
+from utils.core.authentication import CachedTokenAuthentication
+from utils.core.queries import QueryCounter
+
 
 logger = logging.getLogger(__name__)
 
@@ -15,39 +19,52 @@ class SessionTimeoutMiddleware:
     """
     自动登出无操作的用户
     排除来自本地的用户， 排除带有`MACHINE-PULL`请求头的 request， `MACHINE-PULL`用于前端轮询时携带的请求头。
-    对于普通请求， 检测session 中的`last_touch`时间戳和当前时间戳的时间差， 高于 settings 中的INACTIVITY_TIMEOUT设定时间时自动
+    对于普通请求， 检测 token 最后一次活动的时间戳和当前时间戳的时间差， 高于 settings 中的INACTIVITY_TIMEOUT设定时间时自动
     登出， 并且返回302状态码， 携带 json 数据， 返回的头部中不携带 location信息。
+    活动时间由 utils.core.activity 记录在缓存中， 每个 token 每 ACTIVITY_TOUCH_INTERVAL 秒最多写一次， 不写 session。
+    没有活动记录的 token 按创建时间判断， 不会因为记录丢失而一直保持登录； 超时登出时删除 token。
     """
     def __init__(self, get_response):
         self.get_response = get_response
         self.inactivity_timeout = settings.INACTIVITY_TIMEOUT
 
     def process_view(self, request, view_func, view_args, view_kwargs):
-        session = request.session
         machine_pull = request.META.get('HTTP_MACHINE_PULL')
         has_token = request.META.get('HTTP_AUTHORIZATION')
         if not has_token:
             # 对未登录的用户无处理
             return
         if request.META['REMOTE_ADDR'] != '127.0.0.1' and not machine_pull:
+            key = activity_key(has_token)
             try:
-                if time.time() - session['last_touch'] > self.inactivity_timeout:
-                    try:
-                        # 从 Token 中取出 user
-                        auth = TokenAuthentication()
-                        user, token = auth.authenticate(request)
-                        request.user = user
-                        logout(request)
-                        return JsonResponse(status=302, data={'info': "长时间无操作自动登出， 请重新登录"})
-
-                    except AuthenticationFailed:
-                        # 可能在请求登录接口的时候携带了已经过期的 token
+                # 没有活动记录时（如缓存被清空）以 token 的创建时间为准
+                if activity_tracker.is_idle(key, self.inactivity_timeout, since=lambda: self.token_created(request)):
+                    # 从 Token 中取出 user
+                    auth = CachedTokenAuthentication()
+                    result = auth.authenticate(request)
+                    if result is None:
                         return JsonResponse(status=401, data={'info': "Invalid Token."})
-
-            except KeyError:
-                pass
-
-            session['last_touch'] = time.time()
+                    user, token = result
+                    request.user = user
+                    logout(request)
+                    # 删除 token， 重新登录时生成新的 token； 否则旧 token 的活动记录已清除， 之后按创建时间
+                    # 判断会一直是空闲， 用户无法再登录
+                    token.delete()
+                    activity_tracker.forget(key)
+                    token_users.forget(token.key)
+                    return JsonResponse(status=302, data={'info': "长时间无操作自动登出， 请重新登录"})
+
+            except AuthenticationFailed:
+                # 可能在请求登录接口的时候携带了已经过期的 token
+                return JsonResponse(status=401, data={'info': "Invalid Token."})
+
+            activity_tracker.touch(key)
+
+    @staticmethod
+    def token_created(request):
+        result = CachedTokenAuthentication().authenticate(request)
+        created = getattr(result[1], 'created', None) if result else None
+        return created.timestamp() if created else None
 
     def __call__(self, request):
         response = self.get_response(request)
@@ -76,3 +93,90 @@ class ErrorLogMiddleware:
             logger.error(response.content)
 
         return response
+
+
+class QueryCountMiddleware:
+    """
+    统计每个请求执行的 SQL 条数和耗时， 按 `视图名.action` 记录到日志， 超过
+    settings.QUERY_COUNT_WARNING 条时记为 warning。 DEBUG 模式下在响应头中返回
+    X-Query-Count 和 X-Query-Duration（毫秒）。
+    StreamingHttpResponse 的查询在视图返回后、 消费响应内容时才执行， 这里包装其迭代器继续计数，
+    内容发送完毕后再记录日志； 响应头在此之前已经发出， 流式响应不返回 X-Query-* 响应头。
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.warning_threshold = getattr(settings, 'QUERY_COUNT_WARNING', 50)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # ViewSet.as_view() 返回的函数带有 method 到 action 的映射
+        actions = getattr(view_func, 'actions', None) or {}
+        name = getattr(view_func, '__name__', 'view')
+        action = actions.get(request.method.lower())
+        request.query_label = '{}.{}'.format(name, action) if action else name
+
+    def __call__(self, request):
+        counter = QueryCounter(keep_sql=False)
+        with counter:
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.count_stream(request, response.streaming_content, counter)
+            return response
+
+        self.log(request, counter)
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(counter.count)
+            response['X-Query-Duration'] = '{:.1f}'.format(counter.duration * 1000)
+        return response
+
+    def count_stream(self, request, content, counter):
+        iterator = iter(content)
+        try:
+            while True:
+                with counter:
+                    try:
+                        chunk = next(iterator)
+                    except StopIteration:
+                        break
+                yield chunk
+        finally:
+            self.log(request, counter)
+
+    def log(self, request, counter):
+        request.query_count = counter.count
+        request.query_duration = counter.duration
+        label = getattr(request, 'query_label', request.path)
+        level = logging.WARNING if counter.count > self.warning_threshold else logging.DEBUG
+        logger.log(level, '%s %s: %d queries in %.1f ms', request.method, label, counter.count,
+                   counter.duration * 1000)
+
+
+class MetricsMiddleware:
+    """
+    按解析到的路由（view_name）记录请求耗时、SQL 和响应大小， 见 utils.core.metrics。
+    未匹配路由的请求统一记为 `<unmatched>`， 避免标签随 URL 无限增长。
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with QueryCounter(keep_sql=False) as counter:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        metrics.registry.observe(self.route(request), request.method, response.status_code, duration,
+                                 counter.count, counter.duration, size)
+        metrics.registry.maybe_flush()
+        return response
+
+    @staticmethod
+    def route(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return '<unmatched>'
+        # router 注册的视图为 `basename-list` 这样的 url name， 未命名的视图为视图的完整路径
+        return match.view_name